@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+# Payment views await the Chapa gateway instead of holding a thread on it.
+os.environ.setdefault('ASYNC_PAYMENT_VIEWS', 'true')
 
 application = get_asgi_application()
+
+# Build the search index while the worker waits for its first request.
+if settings.LISTING_SEARCH_WARM_UP:
+    from listings import search
+
+    search.warm_up()
@@ -24,6 +24,33 @@ environ.Env.read_env(os.path.join(BASE_DIR, ".env"))
 SECRET_KEY = env('SECRET_KEY')
 DEBUG = env.bool('DEBUG',default=False)
 CHAPA_SECRET_KEY = env("CHAPA_SECRET_KEY")
+CHAPA_BASE_URL = env("CHAPA_BASE_URL", default="https://api.chapa.co/v1")
+CHAPA_CONNECT_TIMEOUT = env.float("CHAPA_CONNECT_TIMEOUT", default=3.05)
+CHAPA_READ_TIMEOUT = env.float("CHAPA_READ_TIMEOUT", default=10)
+CHAPA_MAX_RETRIES = env.int("CHAPA_MAX_RETRIES", default=3)
+CHAPA_RETRY_BACKOFF = env.float("CHAPA_RETRY_BACKOFF", default=0.5)
+CHAPA_POOL_SIZE = env.int("CHAPA_POOL_SIZE", default=10)
+CHAPA_CIRCUIT_FAILURE_THRESHOLD = env.int("CHAPA_CIRCUIT_FAILURE_THRESHOLD", default=5)
+CHAPA_CIRCUIT_RESET_TIMEOUT = env.float("CHAPA_CIRCUIT_RESET_TIMEOUT", default=30)
+
+# Async payment views (listings.async_views) instead of the DRF ones; asgi.py
+# turns them on. With httpx installed they await the gateway over up to
+# CHAPA_ASYNC_MAX_CONNECTIONS connections, otherwise they call it from a
+# worker thread.
+ASYNC_PAYMENT_VIEWS = env.bool("ASYNC_PAYMENT_VIEWS", default=False)
+CHAPA_ASYNC_MAX_CONNECTIONS = env.int("CHAPA_ASYNC_MAX_CONNECTIONS", default=100)
+
+# "inprocess" (worker threads in each web process) or "database"
+# (drained by `manage.py process_payment_verifications`).
+PAYMENT_VERIFICATION_QUEUE = env("PAYMENT_VERIFICATION_QUEUE", default="inprocess")
+PAYMENT_VERIFICATION_WORKERS = env.int("PAYMENT_VERIFICATION_WORKERS", default=2)
+PAYMENT_VERIFICATION_BATCH_SIZE = env.int("PAYMENT_VERIFICATION_BATCH_SIZE", default=100)
+PAYMENT_VERIFICATION_MAX_ATTEMPTS = env.int("PAYMENT_VERIFICATION_MAX_ATTEMPTS", default=5)
+
+# Largest number of bookings accepted by one POST /api/bookings/batch/.
+BOOKING_BATCH_MAX_SIZE = env.int("BOOKING_BATCH_MAX_SIZE", default=1000)
+# Tries per reservation transaction that hits a deadlock or lock wait timeout.
+BOOKING_RESERVATION_ATTEMPTS = env.int("BOOKING_RESERVATION_ATTEMPTS", default=5)
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -47,10 +74,22 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'listings',
-    'drf_yasg',
 ]
 
+# API documentation (listings.docs). /openapi.json serves the schema written
+# by `manage.py generate_openapi_schema` to API_SCHEMA_PATH. API_DOCS loads
+# drf_yasg in the web process for the Swagger UI at /swagger/; it is off
+# unless DEBUG, which keeps the docs tooling out of production workers.
+API_DOCS = env.bool('API_DOCS', default=DEBUG)
+API_SCHEMA_PATH = env('API_SCHEMA_PATH', default=str(BASE_DIR / 'openapi.json'))
+if API_DOCS:
+    INSTALLED_APPS.append('drf_yasg')
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'openapi-schema',
+}
+
 MIDDLEWARE = [
+    'listings.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +137,69 @@ DATABASES = {
     }
 }
 
+# Read replicas (listings.routing): DATABASE_REPLICA_URLS is a comma-separated
+# list of database URLs, e.g. sqlite:////tmp/replica1.sqlite3 for a local
+# stand-in holding a copy of the primary. List and detail reads of listings
+# and bookings, and exports, go to a healthy replica; clients stay on the
+# primary for REPLICA_STICKY_SECONDS after they write. A replica more than
+# REPLICA_MAX_LAG seconds behind, or failing, is skipped until its next check
+# (every REPLICA_CHECK_INTERVAL seconds).
+
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica{index}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['listings.routing.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+REPLICA_MAX_LAG = env.float('REPLICA_MAX_LAG', default=5)
+REPLICA_CHECK_INTERVAL = env.float('REPLICA_CHECK_INTERVAL', default=5)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Defaults to an in-process LRU (LocMemCache). With several worker processes
+# point CACHE_URL at a shared backend (memcached, redis, filecache://...) so
+# that version bumps reach every worker.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+LISTING_CACHE_ALIAS = 'default'
+LISTING_CACHE_TIMEOUT = env.int('LISTING_CACHE_TIMEOUT', default=300)
+
+# Seconds between checks for listings changed by other processes in the
+# in-memory search index (listings.search).
+LISTING_SEARCH_SYNC_INTERVAL = env.int('LISTING_SEARCH_SYNC_INTERVAL', default=2)
+# Start building the search index in the background when a web worker loads
+# (wsgi.py, asgi.py) instead of on the first search request.
+LISTING_SEARCH_WARM_UP = env.bool('LISTING_SEARCH_WARM_UP', default=True)
+
+# Facet counts returned by GET /api/listings/?facets=true (listings.facets):
+# price bucket boundaries, minimum-rating thresholds and how many locations.
+LISTING_PRICE_FACETS = [100, 200, 300, 500]
+LISTING_RATING_FACETS = [4, 3, 2, 1]
+LISTING_LOCATION_FACETS = 20
+
+# Per-request SQL count, DB/serializer time and Server-Timing headers
+# (listings.instrumentation). Off by default; percentiles cover the last
+# PERFORMANCE_HISTOGRAM_SIZE requests of each endpoint.
+PERFORMANCE_INSTRUMENTATION = env.bool('PERFORMANCE_INSTRUMENTATION', default=False)
+PERFORMANCE_HISTOGRAM_SIZE = env.int('PERFORMANCE_HISTOGRAM_SIZE', default=1000)
+
+# Time-ordered UUIDv7 primary keys for new listings, bookings, reviews and
+# payments (listings.ids), so inserts append to the primary key index instead
+# of landing on random pages. Existing keys stay valid either way.
+TIME_ORDERED_IDS = env.bool('TIME_ORDERED_IDS', default=False)
+
+# Completed and canceled bookings, with their settled payments, are moved to
+# the archive tables by `manage.py archive_bookings` this many days after
+# checkout (listings.archive).
+ARCHIVE_AFTER_DAYS = env.int('ARCHIVE_AFTER_DAYS', default=90)
+
+# Build listing and booking list pages straight from values() rows instead
+# of running the serializers field by field (listings.fastpath).
+FAST_PATH_RENDERING = env.bool('FAST_PATH_RENDERING', default=True)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,7 +244,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'listings.renderers.FastJSONRenderer',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         #'rest_framework.permissions.IsAuthenticated',
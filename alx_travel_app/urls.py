@@ -1,22 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework.documentation import include_docs_urls
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Travel API",
-      default_version='v1',
-      description="API documentation for Listings and Bookings",
-   ),
-   public=True,
-   permission_classes=[permissions.AllowAny],
-)
+from listings import docs
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('listings.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    # /openapi.json, plus /swagger/ when API_DOCS is on.
+    *docs.urlpatterns(),
 ]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
 
 application = get_wsgi_application()
+
+# Build the search index while the worker waits for its first request.
+if settings.LISTING_SEARCH_WARM_UP:
+    from listings import search
+
+    search.warm_up()
@@ -0,0 +1,101 @@
+"""
+Hot/cold split of bookings and payments.
+
+Completed and canceled bookings never change again, yet they would stay in
+the Booking table, and in every index the booking and availability paths
+use, forever. The archive_bookings command moves them, once their checkout
+is ARCHIVE_AFTER_DAYS old, to ArchivedBooking, so the hot tables only grow
+with active business.
+
+A booking always moves together with its payments, in one transaction, so
+a Payment never points at an archived booking and an ArchivedPayment never
+at a live one. Bookings with a payment still Pending stay hot until it is
+verified or reconciled. Deleting an archived booking deletes its archived
+payments, as for live ones.
+
+Archived rows are read-only. The bookings API serves them with
+``?include_archived=true``: the list then pages through live and archived
+bookings together, newest first, by page number.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedPayment, Booking, Payment
+
+
+def archive_cutoff(days=None):
+    """Bookings checked out before this date may be archived."""
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', 90)
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    """Terminal bookings checked out before `cutoff` with every payment settled."""
+    unsettled = Payment.objects.filter(booking=OuterRef('pk')).exclude(status__in=Payment.SETTLED_STATUSES)
+    return Booking.objects.filter(
+        status__in=Booking.TERMINAL_STATUSES, checkout__lt=cutoff,
+    ).filter(~Exists(unsettled))
+
+
+def copy_row(instance, model, **values):
+    """An unsaved `model` with the values of the same-named columns of `instance`."""
+    for field in model._meta.concrete_fields:
+        if field.attname not in values and hasattr(instance, field.attname):
+            values[field.attname] = getattr(instance, field.attname)
+    return model(**values)
+
+
+def archive_bookings(booking_ids, cutoff):
+    """
+    Move those of `booking_ids` still archivable under `cutoff`, with their
+    payments, to the archive. Returns (bookings, payments) moved.
+    """
+    with transaction.atomic():
+        # Re-checked under lock: a booking may have changed or got a new
+        # payment since it was selected.
+        bookings = list(archivable(cutoff).select_for_update().filter(pk__in=booking_ids))
+        if not bookings:
+            return 0, 0
+        payments = list(Payment.objects.select_for_update().filter(booking__in=bookings))
+
+        archived_at = timezone.now()
+        ArchivedBooking.objects.bulk_create([
+            copy_row(booking, ArchivedBooking, archived_at=archived_at) for booking in bookings
+        ])
+        ArchivedPayment.objects.bulk_create([
+            copy_row(payment, ArchivedPayment, archived_at=archived_at) for payment in payments
+        ])
+        Payment.objects.filter(pk__in=[payment.pk for payment in payments]).delete()
+        Booking.objects.filter(pk__in=[booking.pk for booking in bookings]).delete()
+    return len(bookings), len(payments)
+
+
+def booking_keys():
+    """
+    ``{booking_id, created_at, archived}`` of every live and archived booking,
+    newest first, for paginating both tables as one.
+    """
+    live = Booking.objects.order_by().values('booking_id', 'created_at').annotate(archived=Value(False))
+    archived = ArchivedBooking.objects.order_by().values('booking_id', 'created_at').annotate(archived=Value(True))
+    return live.union(archived, all=True).order_by('-created_at', '-booking_id')
+
+
+def load_bookings(keys, **options):
+    """The bookings of `keys`, live or archived, loaded with ``with_related(**options)``, in order."""
+    ids = {True: [], False: []}
+    for key in keys:
+        ids[key['archived']].append(key['booking_id'])
+    loaded = {
+        True: ArchivedBooking.objects.with_related(**options).in_bulk(ids[True]) if ids[True] else {},
+        False: Booking.objects.with_related(**options).in_bulk(ids[False]) if ids[False] else {},
+    }
+    # A booking archived between the two queries is skipped for this page.
+    return [
+        (loaded[key['archived']][key['booking_id']], key['archived'])
+        for key in keys if key['booking_id'] in loaded[key['archived']]
+    ]
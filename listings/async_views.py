@@ -0,0 +1,124 @@
+"""
+Native async payment views for ASGI deployments.
+
+DRF views are synchronous, so under ASGI every request runs in a thread and
+InitiatePaymentView holds its thread for the whole Chapa call. The views here
+await the gateway through chapa.get_async_client() and the database through
+the async ORM instead, so one ASGI worker keeps serving while hundreds of
+payments wait on a slow gateway. Authentication, permissions, error bodies
+and rendering reuse the DRF machinery, so clients see the same responses.
+
+ASYNC_PAYMENT_VIEWS selects these views in listings.urls; asgi.py turns it
+on. Listing reads stay on the DRF viewsets: they spend their time in the
+database, and Django's async ORM runs queries in a thread anyway.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from . import chapa, verification
+from .models import Booking, Payment
+from .renderers import FastJSONRenderer
+from .views import payment_request
+
+
+class AsyncAPIView(View):
+    """A minimal async APIView: DRF authentication, permissions, exception handling and JSON."""
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    renderer_class = FastJSONRenderer
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # CSRF is enforced by SessionAuthentication, as for APIView.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        self.request = request
+        try:
+            # Authentication may hit the database (sessions, users).
+            await sync_to_async(self.check_permissions)(request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            return await handler(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            authenticators = self.request.authenticators
+            header = authenticators[0].authenticate_header(self.request) if authenticators else None
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        response = exception_handler(exc, {'view': self, 'request': self.request})
+        if response is None:
+            raise exc
+        headers = {name: response[name] for name in ('WWW-Authenticate', 'Retry-After') if response.has_header(name)}
+        return self.render(response.data, response.status_code, headers=headers)
+
+    def render(self, data, status_code=status.HTTP_200_OK, headers=None):
+        renderer = self.renderer_class()
+        return HttpResponse(
+            renderer.render(data), status=status_code, headers=headers, content_type=renderer.media_type,
+        )
+
+
+class AsyncInitiatePaymentView(AsyncAPIView):
+    """InitiatePaymentView, awaiting the gateway instead of blocking a thread on it."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    async def post(self, request, booking_id):
+        try:
+            booking = await Booking.objects.aget(booking_id=booking_id, user=request.user)
+        except Booking.DoesNotExist:
+            return self.render({"error": "Booking not found"}, status.HTTP_404_NOT_FOUND)
+
+        data = payment_request(request.user, booking)
+        try:
+            result = await chapa.get_async_client().initialize(data)
+        except chapa.CircuitOpenError:
+            return self.render({"error": "Payment gateway unavailable"}, status.HTTP_503_SERVICE_UNAVAILABLE)
+        except chapa.ChapaError:
+            return self.render({"error": "Payment gateway error"}, status.HTTP_502_BAD_GATEWAY)
+        if result["status"] != "success":
+            return self.render({"error": result}, status.HTTP_400_BAD_REQUEST)
+
+        await Payment.objects.acreate(
+            booking=booking,
+            user=request.user,
+            amount=booking.total_price,
+            transaction_id=result["data"]["tx_ref"],
+            status="Pending",
+        )
+        return self.render({"checkout_url": result["data"]["checkout_url"]})
+
+
+class AsyncVerifyPaymentView(AsyncAPIView):
+    """VerifyPaymentView: queues the tx_ref for the verification workers."""
+    permission_classes = [permissions.AllowAny]  # Webhook callbacks
+
+    async def get(self, request):
+        tx_ref = request.GET.get("tx_ref")
+        if not tx_ref:
+            return self.render({"error": "Missing tx_ref"}, status.HTTP_400_BAD_REQUEST)
+
+        # The database queue writes a row; the in-process one only takes a lock.
+        await sync_to_async(verification.get_queue().enqueue)(tx_ref)
+        return self.render({"message": "Payment verification queued"}, status.HTTP_202_ACCEPTED)
@@ -0,0 +1,160 @@
+"""
+Versioned response cache for the listing endpoints.
+
+Every cached response is keyed on the request URL plus a version counter:
+one per listing for detail responses and one shared by all list pages.
+Booking list validators follow their own counter, which listing writes
+bump as well since every booking embeds its listing.
+Writes never delete entries, they bump the counters, so readers simply stop
+asking for the old keys and the backend's LRU/timeout reclaims them.
+"""
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+
+LIST_VERSION_KEY = 'listings:version:list'
+BOOKING_LIST_VERSION_KEY = 'bookings:version:list'
+
+
+def get_cache():
+    return caches[getattr(settings, 'LISTING_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    from .routing import current_replica
+
+    timeout = getattr(settings, 'LISTING_CACHE_TIMEOUT', 300)
+    if current_replica() is not None:
+        # Built from a replica, an entry may trail the version it is stored
+        # under by up to the replica's lag; keep it no longer than that.
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', 5)
+        return max_lag if timeout is None else min(timeout, max_lag)
+    return timeout
+
+
+def listing_version_key(listing_id):
+    try:
+        listing_id = uuid.UUID(str(listing_id))
+    except ValueError:
+        pass
+    return f'listings:version:{listing_id}'
+
+
+class CacheStats:
+    """Process-local hit/miss counters, used to size the cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+
+stats = CacheStats()
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def _bump_now_and_on_commit(keys):
+    _bump(keys)
+    # Bump again once the write is visible: a reader that fetched the old rows
+    # before commit may have cached them under the version bumped above.
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def bump_listing_version(listing_id):
+    """Invalidate the cached detail response of a listing and every list page."""
+    _bump_now_and_on_commit([listing_version_key(listing_id), LIST_VERSION_KEY, BOOKING_LIST_VERSION_KEY])
+
+
+def bump_booking_list_version():
+    """Invalidate the cached validators of every booking list page."""
+    _bump_now_and_on_commit([BOOKING_LIST_VERSION_KEY])
+
+
+def response_cache_key(request, version):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'listings:response:{version}:{digest}'
+
+
+def cached_validators(version_key, request, compute):
+    """
+    Conditional GET validators for a request (see listings.conditional),
+    computed once per version of `version_key`, so cached reads stay free of
+    queries.
+    """
+    cache = get_cache()
+    key = response_cache_key(request, get_version(version_key)).replace(':response:', ':validators:', 1)
+    validators = cache.get(key)
+    if validators is None:
+        validators = compute()
+        if validators is not None:
+            cache.set(key, validators, timeout=get_timeout())
+    return validators
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve responses from the versioned cache."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(LIST_VERSION_KEY, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(listing_version_key(lookup), super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, version_key, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_cache_key(request, get_version(version_key))
+        data = cache.get(key)
+        if data is not None:
+            stats.record(hit=True)
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        stats.record(hit=False)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=get_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,299 @@
+"""
+HTTP client for the Chapa payment gateway.
+
+All payment views share one pooled keep-alive session, so a payment pays for
+a TLS handshake only when the pool has no idle connection. Every call is
+bounded by connect/read timeouts, idempotent calls (verify) are retried with
+exponential backoff, and a circuit breaker fails fast while the gateway is
+down instead of tying up workers on calls that are going to time out.
+
+AsyncChapaClient does the same for the async payment views on httpx, so a
+payment waiting on the gateway holds no thread. httpx is optional: without
+it, get_async_client() runs the shared ChapaClient in a worker thread.
+"""
+import asyncio
+import threading
+import time
+import weakref
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+class ChapaError(Exception):
+    """The gateway could not be reached or returned an unusable response."""
+
+
+class CircuitOpenError(ChapaError):
+    """The gateway failed repeatedly; calls are refused until the breaker resets."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and refuses calls for
+    `reset_timeout` seconds, then lets a single trial call through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self.trial_in_flight):
+                raise CircuitOpenError('Chapa gateway circuit is open')
+            if state == 'half-open':
+                self.trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+    def release_trial(self):
+        """Let another trial through after a call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self.trial_in_flight = False
+
+
+class ChapaClient:
+    def __init__(self, secret_key, base_url='https://api.chapa.co/v1', connect_timeout=3.05,
+                 read_timeout=10, max_retries=3, backoff_factor=0.5, pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {secret_key}'
+        # Only GETs are retried on read errors and 5xx responses; connection
+        # failures are retried for any method since nothing reached the gateway.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def initialize(self, payload):
+        """Start a transaction; returns Chapa's JSON response."""
+        return self.request('POST', '/transaction/initialize', json=payload)
+
+    def verify(self, tx_ref):
+        """Look up a transaction's status; returns Chapa's JSON response."""
+        return self.request('GET', f'/transaction/verify/{tx_ref}')
+
+    def request(self, method, path, **kwargs):
+        self.breaker.before_call()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            raise ChapaError(f'Chapa request failed: {exc}') from exc
+
+        return parse_response(response, self.breaker)
+
+    def close(self):
+        self.session.close()
+
+
+def parse_response(response, breaker):
+    """
+    The JSON body of a requests or httpx response; 5xx counts as a gateway
+    failure, and 429 as no answer at all.
+    """
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise ChapaError(f'Chapa returned HTTP {response.status_code}')
+    if response.status_code == 429:
+        # Neither proves the gateway healthy nor counts towards opening the circuit.
+        breaker.release_trial()
+        raise ChapaError('Chapa rate limited the request (HTTP 429)')
+    breaker.record_success()
+
+    try:
+        return response.json()
+    except ValueError as exc:
+        raise ChapaError('Chapa returned a non-JSON response') from exc
+
+
+class AsyncChapaClient:
+    """
+    ChapaClient on httpx for async views: the same timeouts, retry rules and
+    circuit breaker. ``max_connections`` bounds concurrent gateway calls.
+    """
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, secret_key, base_url='https://api.chapa.co/v1', connect_timeout=3.05,
+                 read_timeout=10, max_retries=3, backoff_factor=0.5, pool_size=10, max_connections=100,
+                 breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            headers={'Authorization': f'Bearer {secret_key}'},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            # Connection failures are retried for any method by the transport.
+            # The limits go on the transport: AsyncClient ignores its own
+            # limits when given one.
+            transport=httpx.AsyncHTTPTransport(
+                retries=max_retries,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=pool_size),
+            ),
+        )
+
+    async def initialize(self, payload):
+        return await self.request('POST', '/transaction/initialize', json=payload)
+
+    async def verify(self, tx_ref):
+        return await self.request('GET', f'/transaction/verify/{tx_ref}')
+
+    async def request(self, method, path, **kwargs):
+        self.breaker.before_call()
+        # As with ChapaClient, only GETs are retried on read errors and 5xx.
+        retries = self.max_retries if method == 'GET' else 0
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+                try:
+                    response = await self.client.request(method, self.base_url + path, **kwargs)
+                except httpx.HTTPError as exc:
+                    if attempt < retries:
+                        continue
+                    self.breaker.record_failure()
+                    raise ChapaError(f'Chapa request failed: {exc}') from exc
+                if response.status_code not in self.RETRY_STATUSES or attempt == retries:
+                    break
+        except BaseException:
+            # A half-open trial cancelled mid-call (client disconnects) must
+            # not keep the circuit open for good.
+            self.breaker.release_trial()
+            raise
+        return parse_response(response, self.breaker)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class ThreadedChapaClient:
+    """The async client interface over a ChapaClient; each call holds a worker thread."""
+
+    def __init__(self, client):
+        self.sync_client = client
+
+    async def initialize(self, payload):
+        return await asyncio.to_thread(self.sync_client.initialize, payload)
+
+    async def verify(self, tx_ref):
+        return await asyncio.to_thread(self.sync_client.verify, tx_ref)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client_options():
+    return {
+        'base_url': getattr(settings, 'CHAPA_BASE_URL', 'https://api.chapa.co/v1'),
+        'connect_timeout': getattr(settings, 'CHAPA_CONNECT_TIMEOUT', 3.05),
+        'read_timeout': getattr(settings, 'CHAPA_READ_TIMEOUT', 10),
+        'max_retries': getattr(settings, 'CHAPA_MAX_RETRIES', 3),
+        'backoff_factor': getattr(settings, 'CHAPA_RETRY_BACKOFF', 0.5),
+        'pool_size': getattr(settings, 'CHAPA_POOL_SIZE', 10),
+        'breaker': CircuitBreaker(
+            failure_threshold=getattr(settings, 'CHAPA_CIRCUIT_FAILURE_THRESHOLD', 5),
+            reset_timeout=getattr(settings, 'CHAPA_CIRCUIT_RESET_TIMEOUT', 30),
+        ),
+    }
+
+
+def build_client(**overrides):
+    """A new ChapaClient configured from settings, with keyword overrides."""
+    return ChapaClient(settings.CHAPA_SECRET_KEY, **{**client_options(), **overrides})
+
+
+def build_async_client(**overrides):
+    """A new AsyncChapaClient configured from settings, with keyword overrides."""
+    options = {
+        **client_options(),
+        'max_connections': getattr(settings, 'CHAPA_ASYNC_MAX_CONNECTIONS', 100),
+        **overrides,
+    }
+    return AsyncChapaClient(settings.CHAPA_SECRET_KEY, **options)
+
+
+def get_client():
+    """The process-wide ChapaClient, built from settings on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = build_client()
+        return _client
+
+
+# httpx clients are bound to the event loop they were first used on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """The async Chapa client of the running event loop."""
+    if httpx is None:
+        return ThreadedChapaClient(get_client())
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = build_async_client()
+        return client
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    global _client
+    if setting.startswith('CHAPA_'):
+        with _client_lock:
+            if _client is not None:
+                _client.close()
+            _client = None
+            # Closed with their event loop; they cannot be awaited from here.
+            _async_clients.clear()
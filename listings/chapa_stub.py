@@ -0,0 +1,126 @@
+"""
+A local stand-in for the Chapa API, for tests and benchmarks.
+
+    with StubChapaGateway() as gateway:
+        client = ChapaClient('test-key', base_url=gateway.base_url)
+
+``delay`` slows every response down, ``failures`` makes the next N requests
+answer with ``failure_status`` and ``transactions`` maps a tx_ref to the
+status verify reports for it (``success`` by default).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once.
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that is expected here.
+        pass
+
+
+class StubChapaGateway:
+    def __init__(self, delay=0, failures=0, failure_status=503):
+        self.delay = delay
+        self.failures = failures
+        self.failure_status = failure_status
+        self.transactions = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        self.server = _Server(('127.0.0.1', 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _take_failure(self):
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return True
+            return False
+
+    def _handler_class(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; with Nagle on, the
+            # body waits for the client's delayed ACK (~40 ms) on keep-alive.
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def handle_request(self, body=None):
+                with gateway._lock:
+                    gateway.requests.append((self.command, self.path, body))
+                if gateway.delay:
+                    time.sleep(gateway.delay)
+                if gateway._take_failure():
+                    self.send_json(gateway.failure_status, {'status': 'failed', 'message': 'Unavailable'})
+                    return False
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.handle_request(body):
+                    return
+                if self.path != '/v1/transaction/initialize':
+                    self.send_json(404, {'status': 'failed', 'message': 'Not found'})
+                    return
+                tx_ref = body.get('tx_ref')
+                self.send_json(200, {
+                    'status': 'success',
+                    'message': 'Hosted Link',
+                    'data': {
+                        'checkout_url': f'https://checkout.chapa.test/{tx_ref}',
+                        'tx_ref': tx_ref,
+                    },
+                })
+
+            def do_GET(self):
+                if not self.handle_request():
+                    return
+                prefix = '/v1/transaction/verify/'
+                if not self.path.startswith(prefix):
+                    self.send_json(404, {'status': 'failed', 'message': 'Not found'})
+                    return
+                tx_ref = self.path[len(prefix):]
+                self.send_json(200, {
+                    'status': 'success',
+                    'data': {'tx_ref': tx_ref, 'status': gateway.transactions.get(tx_ref, 'success')},
+                })
+
+        return Handler
@@ -0,0 +1,72 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the listing and booking endpoints.
+
+Before a list or detail response is built, the view asks one cheap indexed
+query for the validators of what it would render: ``MAX(updated_at)`` and
+the row count for a list (the count catches deletions, which leave no
+``updated_at`` behind), the ``updated_at`` of the row for a detail. The
+strong ETag hashes those together with the absolute request URL, so every
+page, filter and ordering gets its own tag. When ``If-None-Match`` or
+``If-Modified-Since`` still matches, a 304 goes back without loading or
+serializing anything.
+
+``If-Modified-Since`` has one-second resolution and cannot see deletions;
+clients should prefer ``If-None-Match``. Host and guest profile edits do not
+move ``updated_at`` and are not reflected until the next listing or booking
+write, as with the response cache.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(request, *parts):
+    key = '|'.join(str(part) for part in (request.build_absolute_uri(), *parts))
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def latest(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+class ConditionalGetMixin:
+    """
+    Answer list and retrieve with 304 Not Modified while the client's copy is current.
+
+    Views implement ``list_validators()`` and ``object_validators(pk)``,
+    returning ``(last_modified, *parts)`` or None when there is nothing to
+    validate (e.g. an unknown pk, left to the normal 404).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.list_validators(), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            validators = self.object_validators(lookup)
+        except (TypeError, ValueError, ValidationError):
+            validators = None
+        return self.conditional_response(validators, super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, validators, handler, request, *args, **kwargs):
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        last_modified, *parts = validators
+        etag = make_etag(request, last_modified, *parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Stored copies must be revalidated, which is what makes polling cheap.
+        patch_cache_control(response, no_cache=True)
+        return response
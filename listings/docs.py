@@ -0,0 +1,92 @@
+"""
+API documentation without paying for it at startup.
+
+The OpenAPI schema is generated ahead of time by the
+generate_openapi_schema command into API_SCHEMA_PATH, a build artifact, and
+served from memory at ``/openapi.json``. Web processes import drf_yasg
+(with its inspectors, codecs and templates) only when API_DOCS is on; it
+then serves the Swagger UI at ``/swagger/``, pointed at ``/openapi.json``,
+and builds the schema once per process if none was generated.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, JsonResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import permissions
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Travel API",
+        default_version='v1',
+        description="API documentation for Listings and Bookings",
+    )
+
+
+def generate_schema(url=None):
+    """The OpenAPI document of every endpoint, as JSON bytes."""
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(api_info(), url=url).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def load_schema():
+    """(content, etag) of the schema, read once per process; None when there is none."""
+    global _schema
+    with _schema_lock:
+        if _schema is None:
+            try:
+                with open(settings.API_SCHEMA_PATH, 'rb') as schema_file:
+                    content = schema_file.read()
+            except FileNotFoundError:
+                if not settings.API_DOCS:
+                    return None
+                content = generate_schema()
+            _schema = (content, f'"{hashlib.sha1(content).hexdigest()}"')
+        return _schema
+
+
+@receiver(setting_changed)
+def reset_schema(setting, **kwargs):
+    global _schema
+    if setting in ('API_SCHEMA_PATH', 'API_DOCS'):
+        with _schema_lock:
+            _schema = None
+
+
+def schema_view(request):
+    schema = load_schema()
+    if schema is None:
+        return JsonResponse(
+            {'detail': 'No API schema; run `manage.py generate_openapi_schema`.'}, status=404,
+        )
+    content, etag = schema
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def urlpatterns():
+    patterns = [path('openapi.json', schema_view, name='openapi-schema')]
+    if settings.API_DOCS:
+        from drf_yasg.views import get_schema_view
+
+        swagger = get_schema_view(api_info(), public=True, permission_classes=[permissions.AllowAny])
+        patterns.append(path('swagger/', swagger.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'))
+    return patterns
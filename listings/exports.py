@@ -0,0 +1,145 @@
+"""
+Streaming NDJSON/CSV exports of bookings, listings and payments.
+
+Rows are projected with ``values_list()`` (no model instances, no serializers)
+and read in primary-key keyset chunks, each consumed through
+``QuerySet.iterator()``. Output is produced as the rows arrive, so memory
+stays flat whatever the size of the table.
+"""
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Booking, Listing, Payment
+
+
+EXPORTS = {
+    'bookings': {
+        'model': Booking,
+        'columns': {
+            'booking_id': 'booking_id',
+            'property_id': 'property_id',
+            'property_name': 'property__name',
+            'host_id': 'property__host_id',
+            'user_id': 'user_id',
+            'user_email': 'user__email',
+            'checkin': 'checkin',
+            'checkout': 'checkout',
+            'total_price': 'total_price',
+            'status': 'status',
+            'created_at': 'created_at',
+        },
+        'host_field': 'property__host',
+        'has_status': True,
+    },
+    'listings': {
+        'model': Listing,
+        'columns': {
+            'listing_id': 'listing_id',
+            'host_id': 'host_id',
+            'name': 'name',
+            'location': 'location',
+            'pricepernight': 'pricepernight',
+            'review_count': 'review_count',
+            'avg_rating': 'avg_rating',
+            'created_at': 'created_at',
+            'updated_at': 'updated_at',
+        },
+        'host_field': 'host',
+        'has_status': False,
+    },
+    'payments': {
+        'model': Payment,
+        'columns': {
+            'payment_id': 'payment_id',
+            'booking_id': 'booking_id',
+            'user_id': 'user_id',
+            'amount': 'amount',
+            'transaction_id': 'transaction_id',
+            'status': 'status',
+            'created_at': 'created_at',
+        },
+        'host_field': 'booking__property__host',
+        'has_status': True,
+    },
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def start_of_day(day):
+    """Midnight at the start of `day` in the current time zone."""
+    midnight = datetime.combine(day, time.min)
+    return timezone.make_aware(midnight) if settings.USE_TZ else midnight
+
+
+def export_queryset(resource, since=None, until=None, status=None, host=None):
+    """The filtered queryset behind an export; ``since``/``until`` bound created_at by date."""
+    spec = EXPORTS[resource]
+    queryset = spec['model'].objects.all()
+    # Bounds on the bare column, so the range can use the created_at index.
+    if since:
+        queryset = queryset.filter(created_at__gte=start_of_day(since))
+    if until:
+        queryset = queryset.filter(created_at__lt=start_of_day(until + timedelta(days=1)))
+    if status and spec['has_status']:
+        queryset = queryset.filter(status=status)
+    if host:
+        queryset = queryset.filter(**{spec['host_field']: host})
+    return queryset
+
+
+def iter_rows(resource, queryset, chunk_size=2000):
+    """Yield export rows as dicts, one keyset chunk of `chunk_size` rows per query."""
+    columns = EXPORTS[resource]['columns']
+    names = list(columns)
+    rows = queryset.order_by('pk').values_list('pk', *columns.values())
+    last_pk = None
+    while True:
+        chunk = rows.filter(pk__gt=last_pk) if last_pk is not None else rows
+        count = 0
+        for pk, *values in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+            last_pk = pk
+            count += 1
+            yield dict(zip(names, values))
+        if count < chunk_size:
+            return
+
+
+def csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return value
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render(resource, rows, output='ndjson', lines_per_chunk=500):
+    """Encode rows as NDJSON or CSV, yielding text in blocks of `lines_per_chunk` rows."""
+    buffer = []
+    if output == 'csv':
+        writer = csv.writer(_Echo())
+        buffer.append(writer.writerow(list(EXPORTS[resource]['columns'])))
+        encode = lambda row: writer.writerow([csv_value(value) for value in row.values()])  # noqa: E731
+    else:
+        encode = lambda row: json.dumps(row, cls=DjangoJSONEncoder) + '\n'  # noqa: E731
+
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= lines_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
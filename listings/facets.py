@@ -0,0 +1,91 @@
+"""
+Facet counts for listing search.
+
+All counts come from one ``GROUP BY location`` query with conditional
+aggregates, so the cost does not grow with the number of facet values.
+Facets are disjunctive: each one is counted with every filter applied
+except its own, so selecting "Malibu" still shows how many listings the
+other locations would give. Results are cached per filter combination
+under the shared listing list version, so any listing or review write
+invalidates them.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .cache import LIST_VERSION_KEY, get_cache, get_timeout, get_version
+from .filters import ListingFilter
+from .models import Listing
+
+
+def price_buckets():
+    """[(low, high), ...] from LISTING_PRICE_FACETS boundaries; the last bucket is open-ended."""
+    bounds = [0, *getattr(settings, 'LISTING_PRICE_FACETS', [100, 200, 300, 500])]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def rating_thresholds():
+    return getattr(settings, 'LISTING_RATING_FACETS', [4, 3, 2, 1])
+
+
+def counted(q):
+    """Count('pk') restricted to `q`; an empty Q counts every row."""
+    return Count('pk', filter=q) if q else Count('pk')
+
+
+def compute_facets(filters):
+    price_q = ListingFilter.price_q(filters)
+    rating_q = ListingFilter.rating_q(filters)
+    buckets = price_buckets()
+    thresholds = rating_thresholds()
+
+    aggregates = {'matching': counted(price_q & rating_q)}
+    for index, (low, high) in enumerate(buckets):
+        bucket_q = Q(pricepernight__gte=low) & (Q(pricepernight__lt=high) if high is not None else Q())
+        aggregates[f'price_{index}'] = counted(bucket_q & rating_q)
+    for index, threshold in enumerate(thresholds):
+        aggregates[f'rating_{index}'] = counted(Q(avg_rating__gte=threshold) & price_q)
+    rows = Listing.objects.order_by().values('location').annotate(**aggregates)
+
+    selected = [location.casefold() for location in filters['location']]
+    locations = []
+    totals = dict.fromkeys(aggregates, 0)
+    for row in rows:
+        if row['matching']:
+            locations.append({'value': row['location'], 'count': row['matching']})
+        if not selected or row['location'].casefold().startswith(tuple(selected)):
+            for key in totals:
+                totals[key] += row[key]
+
+    limit = getattr(settings, 'LISTING_LOCATION_FACETS', 20)
+    locations.sort(key=lambda facet: (-facet['count'], facet['value']))
+    return {
+        'count': totals['matching'],
+        'location': locations[:limit],
+        'price': [
+            {'min': low, 'max': high, 'count': totals[f'price_{index}']}
+            for index, (low, high) in enumerate(buckets)
+        ],
+        'rating': [
+            {'min': threshold, 'count': totals[f'rating_{index}']}
+            for index, threshold in enumerate(thresholds)
+        ],
+    }
+
+
+def facet_cache_key(filters, version):
+    canonical = json.dumps(filters, sort_keys=True, default=str)
+    return f'listings:facets:{version}:{hashlib.md5(canonical.encode()).hexdigest()}'
+
+
+def listing_facets(filters):
+    """Facet counts for parsed ListingFilter filters, from the cache when possible."""
+    cache = get_cache()
+    key = facet_cache_key(filters, get_version(LIST_VERSION_KEY))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, timeout=get_timeout())
+    return facets
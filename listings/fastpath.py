@@ -0,0 +1,199 @@
+"""
+Read-only fast path for list endpoints.
+
+Rendering a page through ModelSerializer walks every field of every row
+(``get_attribute``, ``to_representation``, the ``None`` checks ...). For the
+default representation the work is always the same, so RowMapper compiles a
+serializer's fields once into a single function that builds the output dict
+straight from a ``values()`` row, with the same conversions DRF applies:
+UUIDs and decimals as strings, ISO 8601 dates and datetimes (``Z`` for UTC).
+
+Only plain model fields, nested ModelSerializers over foreign keys and the
+computed fields a serializer declares in ``row_fields`` are supported;
+anything else makes the mapper unavailable and the view falls back to the
+serializer. Requests with ``?fields=`` or ``?expand=`` also use the
+serializer. FAST_PATH_RENDERING turns the fast path off entirely.
+"""
+import datetime
+import decimal
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def datetime_converter(field):
+    if (getattr(field, 'format', None) or api_settings.DATETIME_FORMAT).lower() != ISO_8601:
+        raise UnsupportedField(field.field_name)
+
+    def convert(value, current):
+        # DateTimeField.enforce_timezone, then the ISO format with Z for UTC.
+        if current is not None:
+            value = value.astimezone(current) if value.tzinfo else timezone.make_aware(value, current)
+        elif value.tzinfo:
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    convert.needs_timezone = True
+    return convert
+
+
+def date_converter(field):
+    if (getattr(field, 'format', None) or api_settings.DATE_FORMAT).lower() != ISO_8601:
+        raise UnsupportedField(field.field_name)
+    return lambda value: value.isoformat()
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        raise UnsupportedField(field.field_name)
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        return '{:f}'.format(value.quantize(exponent, rounding=field.rounding, context=context))
+    return convert
+
+
+def uuid_converter(field):
+    if field.uuid_format != 'hex_verbose':
+        raise UnsupportedField(field.field_name)
+    return str
+
+
+# Serializer field class -> factory of the value converter; None keeps the
+# database value as it is. Checked in order, so subclasses come first.
+CONVERTERS = [
+    (serializers.DateTimeField, datetime_converter),
+    (serializers.DateField, date_converter),
+    (serializers.DecimalField, decimal_converter),
+    (serializers.UUIDField, uuid_converter),
+    (serializers.ChoiceField, lambda field: None),
+    (serializers.CharField, lambda field: None),
+    (serializers.IntegerField, lambda field: int),
+    (serializers.FloatField, lambda field: float),
+    (serializers.BooleanField, lambda field: bool),
+]
+
+
+class RowMapper:
+    """
+    ``map_rows(rows)`` turns ``values(*columns)`` dicts into what
+    ``serializer`` renders for the same instances.
+    """
+
+    def __init__(self, serializer):
+        self.columns = []
+        self._namespace = {}
+        body = self._compile(serializer, serializer.Meta.model, '')
+        source = f'def map_row(row, current_timezone):\n    return {body}\n'
+        exec(compile(source, f'<RowMapper {type(serializer).__name__}>', 'exec'), self._namespace)
+        self._map_row = self._namespace['map_row']
+
+    def map_rows(self, rows):
+        # Resolved once per page rather than per datetime value.
+        current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        map_row = self._map_row
+        return [map_row(row, current_timezone) for row in rows]
+
+    def _bind(self, value):
+        name = f'_{len(self._namespace)}'
+        self._namespace[name] = value
+        return name
+
+    def _column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return f'row[{path!r}]'
+
+    def _compile(self, serializer, model, prefix):
+        computed = getattr(serializer, 'row_fields', {})
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in computed:
+                sources, func = computed[name]
+                args = ', '.join(self._column(prefix + source) for source in sources)
+                items.append(f'{name!r}: {self._bind(func)}({args})')
+                continue
+            if len(field.source_attrs) != 1:
+                raise UnsupportedField(name)
+            model_field = model._meta.get_field(field.source)
+            if isinstance(field, serializers.ModelSerializer):
+                if not model_field.many_to_one:
+                    raise UnsupportedField(name)
+                nested = self._compile(field, model_field.related_model, f'{prefix}{model_field.name}__')
+                if model_field.null:
+                    nested = f'(None if {self._column(prefix + model_field.attname)} is None else {nested})'
+                items.append(f'{name!r}: {nested}')
+                continue
+            if model_field.is_relation:
+                raise UnsupportedField(name)
+            items.append(f'{name!r}: {self._value(field, model_field, prefix)}')
+        return '{' + ', '.join(items) + '}'
+
+    def _value(self, field, model_field, prefix):
+        for field_class, factory in CONVERTERS:
+            if isinstance(field, field_class):
+                convert = factory(field)
+                break
+        else:
+            raise UnsupportedField(field.field_name)
+        column = self._column(prefix + model_field.name)
+        if convert is None:
+            return column
+        args = f'{column}, current_timezone' if getattr(convert, 'needs_timezone', False) else column
+        call = f'{self._bind(convert)}({args})'
+        return f'(None if {column} is None else {call})' if model_field.null else call
+
+
+_mappers = {}
+_mappers_lock = threading.Lock()
+
+
+def get_mapper(serializer_class):
+    """The RowMapper of a serializer's default representation, or None if it cannot have one."""
+    with _mappers_lock:
+        if serializer_class not in _mappers:
+            try:
+                _mappers[serializer_class] = RowMapper(serializer_class(context={}))
+            except UnsupportedField:
+                _mappers[serializer_class] = None
+        return _mappers[serializer_class]
+
+
+class FastPathMixin:
+    """Render list pages through a RowMapper when the request allows it."""
+
+    def get_row_mapper(self):
+        if not getattr(settings, 'FAST_PATH_RENDERING', True):
+            return None
+        fields, expand = self.get_field_selection()
+        if fields is not None or expand:
+            return None
+        return get_mapper(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def list_response(self, queryset):
+        """The (paginated) list response for an already filtered queryset."""
+        mapper = self.get_row_mapper()
+        if mapper is not None:
+            # values() rows; the prefetches made for the serializer do not apply.
+            queryset = queryset.prefetch_related(None).values(*mapper.columns)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = mapper.map_rows(rows) if mapper is not None else self.get_serializer(rows, many=True).data
+        return self.get_paginated_response(data) if page is not None else Response(data)
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class StableOrderingFilter(OrderingFilter):
+    """OrderingFilter that always ends with the primary key, so ties sort deterministically."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(field.lstrip('-') == 'pk' for field in ordering):
+            ordering = [*ordering, '-pk' if ordering[0].startswith('-') else 'pk']
+        return ordering
+
+
+class ListingFilter(BaseFilterBackend):
+    """
+    Filter listings on price, location and their stored rating aggregates:
+    ``?min_price=100&max_price=250&location=Malibu&min_rating=4``.
+    ``location`` matches the start of the location, case-insensitively, and
+    may be repeated to match any of several.
+    """
+
+    @staticmethod
+    def _number(params, name, cast=float):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            number = cast(value)
+            # NaN and infinities parse, but cannot be compared with in SQL.
+            if not Decimal(number).is_finite():
+                raise ValueError(value)
+            return number
+        except (ValueError, ArithmeticError):
+            raise ValidationError({name: 'A valid number is required.'})
+
+    @classmethod
+    def parse(cls, request):
+        """The listing filters of a request, validated."""
+        params = request.query_params
+        filters = {
+            'min_price': cls._number(params, 'min_price', Decimal),
+            'max_price': cls._number(params, 'max_price', Decimal),
+            'location': sorted({location.strip() for location in params.getlist('location') if location.strip()}),
+            'min_rating': cls._number(params, 'min_rating'),
+        }
+        if filters['min_price'] is not None and filters['max_price'] is not None \
+                and filters['min_price'] > filters['max_price']:
+            raise ValidationError({'min_price': 'Must not be greater than max_price.'})
+        return filters
+
+    @staticmethod
+    def price_q(filters):
+        q = Q()
+        if filters['min_price'] is not None:
+            q &= Q(pricepernight__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            q &= Q(pricepernight__lte=filters['max_price'])
+        return q
+
+    @staticmethod
+    def location_q(filters):
+        q = Q()
+        for location in filters['location']:
+            q |= Q(location__istartswith=location)
+        return q
+
+    @staticmethod
+    def rating_q(filters):
+        return Q(avg_rating__gte=filters['min_rating']) if filters['min_rating'] is not None else Q()
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.parse(request)
+        return queryset.filter(self.price_q(filters), self.location_q(filters), self.rating_q(filters))
@@ -0,0 +1,63 @@
+"""
+Primary keys for the high insert-rate tables.
+
+Random UUIDv4 keys land anywhere in the primary key index, so on InnoDB,
+where rows are clustered by primary key, every insert touches a random
+page, and throughput falls once the table outgrows the buffer pool. With
+TIME_ORDERED_IDS, new rows get UUIDv7 keys (RFC 9562) instead: a millisecond
+timestamp up front, so inserts append to the right edge of the index.
+
+Both are ordinary UUIDs in the same column and the same API format, so the
+setting can be switched at any time: existing rows keep their v4 keys, and
+tables holding both kinds are fine because ordering and keyset pagination go
+by created_at, with the key only breaking ties. v7 keys reveal when a row
+was created, to the millisecond.
+"""
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+_last_ms = 0
+_counter = 0
+_lock = threading.Lock()
+
+
+def uuid7(rng=None):
+    """
+    A UUIDv7: 48-bit Unix time in milliseconds, a 12-bit counter that keeps
+    the keys this process makes within one millisecond increasing, and 62
+    random bits, drawn from `rng` (a random.Random) when given.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now > _last_ms:
+            _last_ms, _counter = now, 0
+        else:
+            # Same millisecond, or the clock stepped back: stay monotonic.
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms, _counter = _last_ms + 1, 0
+        timestamp, counter = _last_ms, _counter
+    if rng is not None:
+        random_bits = rng.getrandbits(62)
+    else:
+        random_bits = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    return uuid.UUID(int=(timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random_bits)
+
+
+def new_uuid(rng=None):
+    """
+    Primary key default: uuid7() with TIME_ORDERED_IDS, uuid4() otherwise.
+    Bulk loaders pass `rng` for the random bits, so a seeded run repeats its
+    v4 keys; v7 keys still carry the current time.
+    """
+    if getattr(settings, 'TIME_ORDERED_IDS', False):
+        return uuid7(rng)
+    if rng is None:
+        return uuid.uuid4()
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
@@ -0,0 +1,175 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware is listed in MIDDLEWARE but only activates when
+PERFORMANCE_INSTRUMENTATION is on; otherwise Django drops it at startup
+(MiddlewareNotUsed), so it costs nothing. When active, each request
+records:
+
+* the number of SQL queries and the time spent in them, through a
+  database execute_wrapper on every connection;
+* the time spent in serializer to_representation (TimedSerializerMixin);
+* the total time spent handling the request.
+
+These go out as a ``Server-Timing`` header and a ``listings.performance``
+log line, and into per-endpoint rolling windows of the last
+PERFORMANCE_HISTOGRAM_SIZE requests. The metrics endpoint reads p50/p95/p99
+from those windows.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+logger = logging.getLogger('listings.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a connection execute_wrapper.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def current_metrics():
+    return _current.get()
+
+
+class TimedSerializerMixin:
+    """Count this serializer's to_representation time towards the request's serializer time."""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        # Nested serializers run inside their parent's timing already.
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializing = False
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class EndpointHistograms:
+    """Rolling windows of the latest request measurements, per endpoint."""
+
+    MEASUREMENTS = ('total_ms', 'db_ms', 'serializer_ms', 'queries')
+
+    def __init__(self, size=1000):
+        self.size = size
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, **values):
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None:
+                window = self._windows[endpoint] = {
+                    'count': 0,
+                    **{name: deque(maxlen=self.size) for name in self.MEASUREMENTS},
+                }
+            window['count'] += 1
+            for name in self.MEASUREMENTS:
+                window[name].append(values[name])
+
+    def snapshot(self):
+        with self._lock:
+            windows = {
+                endpoint: (window['count'], {name: sorted(window[name]) for name in self.MEASUREMENTS})
+                for endpoint, window in self._windows.items()
+            }
+        return {
+            endpoint: {
+                'count': count,
+                **{
+                    name: {
+                        'p50': round(percentile(values, 0.50), 3),
+                        'p95': round(percentile(values, 0.95), 3),
+                        'p99': round(percentile(values, 0.99), 3),
+                    }
+                    for name, values in measurements.items()
+                },
+            }
+            for endpoint, (count, measurements) in windows.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._windows = {}
+
+
+histograms = EndpointHistograms()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} {match.view_name if match else request.path_info}"
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        histograms.size = getattr(settings, 'PERFORMANCE_HISTOGRAM_SIZE', 1000)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        values = {
+            'total_ms': round(total * 1000, 3),
+            'db_ms': round(metrics.db_time * 1000, 3),
+            'serializer_ms': round(metrics.serializer_time * 1000, 3),
+            'queries': metrics.queries,
+        }
+        endpoint = endpoint_name(request)
+        histograms.record(endpoint, **values)
+        response['Server-Timing'] = (
+            f'db;dur={values["db_ms"]};desc="{metrics.queries} queries", '
+            f'serializer;dur={values["serializer_ms"]}, '
+            f'total;dur={values["total_ms"]}'
+        )
+        logger.info(
+            'endpoint="%s" status=%s queries=%d db_ms=%.3f serializer_ms=%.3f total_ms=%.3f',
+            endpoint, response.status_code, metrics.queries,
+            values['db_ms'], values['serializer_ms'], values['total_ms'],
+            extra={'performance': {'endpoint': endpoint, 'status': response.status_code, **values}},
+        )
+        return response
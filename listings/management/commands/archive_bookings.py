@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from listings.archive import archivable, archive_bookings, archive_cutoff
+import time
+
+
+class Command(BaseCommand):
+    help = 'Move old completed and canceled bookings, with their settled payments, to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=settings.ARCHIVE_AFTER_DAYS,
+            help='Only archive bookings checked out at least this many days ago'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of bookings to move per transaction'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after moving about this many bookings'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the bookings that would be archived without moving them'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['older_than'])
+        candidates = archivable(cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} bookings checked out before {cutoff} would be archived.')
+            return
+
+        ids = candidates.order_by('pk').values_list('pk', flat=True)
+        bookings = payments = 0
+        last_pk = None
+        start = time.perf_counter()
+
+        while options['limit'] is None or bookings < options['limit']:
+            batch = ids.filter(pk__gt=last_pk) if last_pk else ids
+            batch = list(batch[:options['batch_size']])
+            if not batch:
+                break
+            moved_bookings, moved_payments = archive_bookings(batch, cutoff)
+            bookings += moved_bookings
+            payments += moved_payments
+            last_pk = batch[-1]
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'Archived {bookings} bookings and {payments} payments - {bookings / elapsed:.0f} bookings/s'
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully archived {bookings} bookings and {payments} payments!')
+        )
@@ -0,0 +1,630 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from listings import chapa, search
+from listings.async_views import AsyncInitiatePaymentView
+from listings.chapa_stub import StubChapaGateway
+from listings.fastpath import get_mapper
+from listings.renderers import FastJSONRenderer
+from listings.models import User, Listing, Booking, Review
+from listings.serializers import ListingSerializer, BookingSerializer
+from listings.views import InitiatePaymentView, ListingViewSet
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import django
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+
+LOCATIONS = [
+    'New York, NY', 'Malibu, CA', 'Aspen, CO', 'Los Angeles, CA', 'Boston, MA',
+    'Miami, FL', 'Portland, OR', 'Seattle, WA', 'Lake Tahoe, CA', 'Phoenix, AZ',
+]
+
+NAME_WORDS = [
+    'Cozy', 'Modern', 'Rustic', 'Sunny', 'Quiet', 'Luxury', 'Charming', 'Spacious',
+    'Cabin', 'Loft', 'Villa', 'Cottage', 'Apartment', 'Bungalow', 'Studio', 'Chalet',
+]
+DESCRIPTION_WORDS = [
+    'beach', 'ocean', 'view', 'mountain', 'lake', 'downtown', 'garden', 'pool', 'hot', 'tub',
+    'fireplace', 'kitchen', 'balcony', 'terrace', 'parking', 'wifi', 'pets', 'family', 'quiet',
+    'walk', 'park', 'trail', 'ski', 'surf', 'sunset', 'patio', 'bbq', 'workspace', 'gym', 'spa',
+]
+
+# Per-listing booking and review counts follow a Pareto distribution: most
+# listings get a few, a handful get dozens.
+SKEW = 1.5
+SKEW_CAP = 50
+
+# Most queries one request of each `api` endpoint may issue, whatever the
+# dataset size. The command fails when an endpoint goes over. Reads include
+# the conditional GET validators query (listings.conditional).
+QUERY_BUDGETS = {
+    'api.listing_list': 3,
+    'api.listing_detail': 2,
+    'api.booking_list': 3,
+    'api.booking_create': 6,
+    'api.payment_initiate': 2,
+}
+
+SCENARIOS = {}
+
+# Run in a fresh interpreter by the startup scenario.
+# Peak RSS comes from VmHWM: on Linux ru_maxrss survives exec, so it would
+# report the (larger) benchmark process that spawned the probe.
+STARTUP_PROBE = '''
+import resource, sys, time
+start = time.perf_counter()
+from alx_travel_app.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+try:
+    with open('/proc/self/status') as status:
+        peak_kib = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except OSError:
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, peak_kib, 'drf_yasg' in sys.modules)
+'''
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def timed(func, repeat, clock=time.perf_counter):
+    """Run func `repeat` times and return the durations in milliseconds, wall-clock by default."""
+    durations = []
+    for _ in range(repeat):
+        start = clock()
+        func()
+        durations.append((clock() - start) * 1000)
+    return durations
+
+
+def summarize(durations):
+    ordered = sorted(durations)
+    return {
+        'runs': len(ordered),
+        'per_second': round(len(ordered) / (sum(ordered) / 1000), 1),
+        'p50_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[max(0, int(len(ordered) * 0.95) - 1)], 3),
+        'p99_ms': round(ordered[max(0, int(len(ordered) * 0.99) - 1)], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def skewed(rng, mean):
+    """A count averaging about `mean`, drawn from a long-tailed distribution."""
+    return min(int(rng.paretovariate(SKEW) * mean * (SKEW - 1) / SKEW), int(mean * SKEW_CAP))
+
+
+def populate(rng, listings, bookings_per_listing, reviews_per_listing=0, batch_size=5000):
+    """
+    Bulk-insert a synthetic dataset of hosts, listings, reviews and bookings.
+
+    Booking and review counts per listing are skewed around the given means.
+    Rating aggregates are computed here, since bulk_create skips the signals
+    that maintain them.
+    """
+    password = make_password('password123')
+    users = User.objects.bulk_create([
+        User(username=f'bench_user_{i}', email=f'bench{i}@example.com',
+             first_name='Bench', last_name=str(i), password=password)
+        for i in range(100)
+    ])
+
+    rows = []
+    reviews = []
+    for i in range(listings):
+        listing = Listing(
+            host=rng.choice(users), name=f'{rng.choice(NAME_WORDS[:8])} {rng.choice(NAME_WORDS[8:])} {i}',
+            description=' '.join(rng.choices(DESCRIPTION_WORDS, k=12)), location=rng.choice(LOCATIONS),
+            pricepernight=Decimal(rng.randint(50, 500)),
+        )
+        ratings = rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 6, 8], k=skewed(rng, reviews_per_listing))
+        listing.review_count = len(ratings)
+        listing.rating_sum = sum(ratings)
+        listing.avg_rating = listing.rating_sum / len(ratings) if ratings else 0
+        reviews.extend(
+            Review(property=listing, user=rng.choice(users), rating=rating, comment='Benchmark review')
+            for rating in ratings
+        )
+        rows.append(listing)
+        if len(rows) >= batch_size:
+            Listing.objects.bulk_create(rows)
+            Review.objects.bulk_create(reviews, batch_size=batch_size)
+            rows = []
+            reviews = []
+    Listing.objects.bulk_create(rows)
+    Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+    today = date.today()
+    rows = []
+    for listing_id in Listing.objects.values_list('listing_id', flat=True).iterator(chunk_size=batch_size):
+        for _ in range(skewed(rng, bookings_per_listing)):
+            checkin = today + timedelta(days=rng.randint(0, 90))
+            nights = rng.randint(1, 14)
+            rows.append(Booking(
+                property_id=listing_id, user=rng.choice(users), checkin=checkin,
+                checkout=checkin + timedelta(days=nights), total_price=Decimal(100 * nights),
+                status=rng.choice(['pending', 'confirmed', 'canceled', 'completed']),
+            ))
+        if len(rows) >= batch_size:
+            Booking.objects.bulk_create(rows)
+            rows = []
+    Booking.objects.bulk_create(rows)
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
+
+
+@scenario('availability')
+def availability(command, rng, options):
+    """Date-range availability search through ListingViewSet.available."""
+    factory = APIRequestFactory(HTTP_HOST='localhost')
+    view = ListingViewSet.as_view({'get': 'available'})
+    today = date.today()
+
+    def search():
+        checkin = today + timedelta(days=rng.randint(0, 90))
+        params = {
+            'checkin': checkin.isoformat(),
+            'checkout': (checkin + timedelta(days=rng.randint(1, 7))).isoformat(),
+            'location': rng.choice(LOCATIONS).split(',')[0],
+            'max_price': rng.choice([150, 300, 500]),
+        }
+        response = view(factory.get('/api/listings/available/', params))
+        response.render()
+        assert response.status_code == 200, response.data
+
+    return {'search': summarize(timed(search, options['repeat']))}
+
+
+@scenario('search')
+def text_search(command, rng, options):
+    """Location autocomplete and text search from the in-memory index."""
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    search.reset_index()
+    index = search.build_index()
+    command.stdout.write(
+        f'Indexed {len(index)} listings in {time.perf_counter() - start:.1f}s '
+        f'(peak RSS +{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024:.0f} MB)'
+    )
+    prefixes = [location[:length] for location in LOCATIONS for length in (1, 2, 3, 5)]
+    words = [word.lower() for word in NAME_WORDS] + DESCRIPTION_WORDS
+
+    factory = APIRequestFactory(HTTP_HOST='localhost')
+    view = ListingViewSet.as_view({'get': 'search'})
+
+    def endpoint():
+        response = view(factory.get('/api/listings/search/', {'q': ' '.join(rng.sample(words, 2))}))
+        response.render()
+        assert response.status_code == 200, response.data
+
+    repeat = options['repeat']
+    return {
+        'autocomplete': summarize(timed(lambda: index.autocomplete(rng.choice(prefixes)), repeat)),
+        'one_term': summarize(timed(lambda: index.search(rng.choice(words)), repeat)),
+        'two_terms': summarize(timed(lambda: index.search(' '.join(rng.sample(words, 2))), repeat)),
+        'three_terms': summarize(timed(lambda: index.search(' '.join(rng.sample(words, 3))), repeat)),
+        'endpoint': summarize(timed(endpoint, repeat)),
+    }
+
+
+@scenario('render')
+def render(command, rng, options):
+    """
+    CPU time to turn 1,000 listings and 1,000 bookings into JSON bytes: the
+    serializers with JSONRenderer against values() rows through the fast
+    path's RowMapper and FastJSONRenderer.
+    """
+    results = {}
+    for name, model, serializer_class in [
+        ('listings', Listing, ListingSerializer),
+        ('bookings', Booking, BookingSerializer),
+    ]:
+        queryset = model.objects.with_related(**serializer_class.loading_options()).order_by('-created_at')[:1000]
+        mapper = get_mapper(serializer_class)
+
+        def serializers():
+            JSONRenderer().render(serializer_class(queryset.all(), many=True, context={}).data)
+
+        def fast_path():
+            FastJSONRenderer().render(mapper.map_rows(queryset.prefetch_related(None).values(*mapper.columns)))
+
+        results[f'{name}_serializer'] = summarize(timed(serializers, options['repeat'], time.process_time))
+        results[f'{name}_fast_path'] = summarize(timed(fast_path, options['repeat'], time.process_time))
+        speedup = results[f'{name}_serializer']['p50_ms'] / results[f'{name}_fast_path']['p50_ms']
+        results[f'{name}_fast_path']['speedup'] = round(speedup, 1)
+    return results
+
+
+@scenario('api')
+def api(command, rng, options):
+    """
+    Listing list/detail, booking list/create and payment initiate through the
+    full URL and middleware stack. The listing response cache is bypassed, so
+    every read hits the database, and payments go to a local Chapa stub.
+    """
+    client = APIClient()
+    guest = User.objects.create(username='bench_guest', email='bench_guest@example.com')
+    listing_ids = list(Listing.objects.values_list('pk', flat=True))
+    prices = dict(Listing.objects.values_list('pk', 'pricepernight'))
+    repeat = options['repeat']
+    # Far enough ahead that created bookings do not clash with the dataset's.
+    start_day = date.today() + timedelta(days=365)
+
+    # One unpaid booking per payment initiate call, plus one to count queries.
+    payable = Booking.objects.bulk_create([
+        Booking(
+            property_id=rng.choice(listing_ids), user=guest, checkin=start_day,
+            checkout=start_day + timedelta(days=2), total_price=Decimal(200), status='pending',
+        )
+        for _ in range(repeat + 1)
+    ])
+
+    def expect(response, *statuses):
+        assert response.status_code in statuses, (response.status_code, response.content[:500])
+
+    def listing_list():
+        params = {'location': rng.choice(LOCATIONS).split(',')[0]}
+        if rng.random() < 0.5:
+            params['ordering'] = rng.choice(['pricepernight', '-avg_rating', '-review_count'])
+        expect(client.get('/api/listings/', params), 200)
+
+    def listing_detail():
+        expect(client.get(f'/api/listings/{rng.choice(listing_ids)}/'), 200)
+
+    def booking_list():
+        expect(client.get('/api/bookings/', {'pagination': 'cursor'}), 200)
+
+    def booking_create():
+        listing_id = rng.choice(listing_ids)
+        checkin = start_day + timedelta(days=rng.randint(10, 3650))
+        response = client.post('/api/bookings/', {
+            'property_id': str(listing_id),
+            'checkin': checkin.isoformat(),
+            'checkout': (checkin + timedelta(days=2)).isoformat(),
+            'total_price': str(prices[listing_id] * 2),
+        }, format='json')
+        expect(response, 201, 409)
+
+    def payment_initiate():
+        booking = payable.pop()
+        expect(client.post(f'/payments/initiate/{booking.pk}/'), 200)
+
+    endpoints = {
+        'listing_list': listing_list,
+        'listing_detail': listing_detail,
+        'booking_list': booking_list,
+        'booking_create': booking_create,
+        'payment_initiate': payment_initiate,
+    }
+    results = {}
+    with StubChapaGateway() as gateway, override_settings(
+        CACHES={'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        LISTING_CACHE_ALIAS='benchmark',
+        CHAPA_BASE_URL=gateway.base_url,
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+    ):
+        client.force_authenticate(guest)
+        for name, func in endpoints.items():
+            # Counted outside the timed runs, which capturing would slow down.
+            queries = count_queries(func)
+            results[name] = {**summarize(timed(func, repeat)), 'queries': queries}
+    return results
+
+
+@scenario('gateway')
+def gateway(command, rng, options):
+    """
+    --concurrency payment initiations arriving at once while the Chapa stub
+    takes --gateway-delay seconds per call: the DRF view on --wsgi-threads
+    threads, as in a threaded WSGI worker, then the async view on one event
+    loop, as in an ASGI worker. Latencies run from the common start, so they
+    include queueing. Both modes share one database connection; the database
+    work is the same in each, only the gateway waits can overlap.
+    """
+    guest = User.objects.create(username='bench_payer', email='bench_payer@example.com')
+    listing_ids = list(Listing.objects.values_list('pk', flat=True))
+    concurrency = options['concurrency']
+    factory = APIRequestFactory()
+
+    def payable():
+        checkin = date.today() + timedelta(days=365)
+        return Booking.objects.bulk_create([
+            Booking(
+                property_id=rng.choice(listing_ids), user=guest, checkin=checkin,
+                checkout=checkin + timedelta(days=2), total_price=Decimal(200), status='pending',
+            )
+            for _ in range(concurrency)
+        ])
+
+    def initiate_request(booking):
+        request = factory.post(f'/payments/initiate/{booking.pk}/')
+        force_authenticate(request, guest)
+        return request
+
+    def report(latencies, wall):
+        assert len(latencies) == concurrency
+        return {**summarize(latencies), 'per_second': round(concurrency / wall, 1), 'wall_s': round(wall, 3)}
+
+    def wsgi():
+        view = InitiatePaymentView.as_view()
+        shared = connections['default']
+        bookings = payable()
+
+        def serve(booking):
+            connections['default'] = shared
+            response = view(initiate_request(booking), booking_id=booking.pk).render()
+            assert response.status_code == 200, (response.status_code, response.content[:500])
+            return (time.perf_counter() - start) * 1000
+
+        shared.inc_thread_sharing()
+        try:
+            with ThreadPoolExecutor(options['wsgi_threads']) as pool:
+                start = time.perf_counter()
+                latencies = list(pool.map(serve, bookings))
+        finally:
+            shared.dec_thread_sharing()
+        return report(latencies, time.perf_counter() - start)
+
+    async def asgi():
+        view = AsyncInitiatePaymentView.as_view()
+        bookings = await sync_to_async(payable)()
+
+        async def serve(booking):
+            response = await view(initiate_request(booking), booking_id=booking.pk)
+            assert response.status_code == 200, (response.status_code, response.content[:500])
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(serve(booking) for booking in bookings))
+        return report(latencies, time.perf_counter() - start)
+
+    with StubChapaGateway(delay=options['gateway_delay']) as stub, override_settings(CHAPA_BASE_URL=stub.base_url):
+        results = {'wsgi': wsgi(), 'asgi': async_to_sync(asgi)()}
+    results['wsgi']['threads'] = options['wsgi_threads']
+    results['asgi']['async_client'] = 'httpx' if chapa.httpx else 'thread'
+    return results
+
+
+@scenario('inserts')
+def inserts(command, rng, options):
+    """
+    Bulk insert throughput of --rows bookings with random (uuid4) and then
+    time-ordered (uuid7, TIME_ORDERED_IDS) primary keys, each on top of the
+    generated dataset and rolled back before the next. Rates are also
+    reported for the first and last tenth of the rows, where a primary key
+    index that has outgrown the cache shows as a falling rate.
+    """
+    guest = User.objects.create(username='bench_inserter', email='bench_inserter@example.com')
+    listing_ids = list(Listing.objects.values_list('pk', flat=True))
+    rows, batch_size = options['rows'], 5000
+    segment = max(rows // 10, batch_size)
+    checkin = date.today() + timedelta(days=365)
+
+    def insert():
+        rates, inserted, segment_start, start = [], 0, time.perf_counter(), time.perf_counter()
+        while inserted < rows:
+            count = min(batch_size, rows - inserted)
+            Booking.objects.bulk_create([
+                Booking(
+                    property_id=rng.choice(listing_ids), user=guest, checkin=checkin,
+                    checkout=checkin + timedelta(days=2), total_price=Decimal(200), status='completed',
+                )
+                for _ in range(count)
+            ])
+            inserted += count
+            if inserted % segment == 0 or inserted == rows:
+                now = time.perf_counter()
+                rates.append((inserted - len(rates) * segment) / (now - segment_start))
+                segment_start = now
+        elapsed = time.perf_counter() - start
+        return {
+            'rows': rows,
+            'seconds': round(elapsed, 1),
+            'rows_per_second': round(rows / elapsed),
+            'first_tenth_rows_per_second': round(rates[0]),
+            'last_tenth_rows_per_second': round(rates[-1]),
+        }
+
+    results = {}
+    for name, time_ordered in (('uuid4', False), ('uuid7', True)):
+        savepoint = transaction.savepoint()
+        with override_settings(TIME_ORDERED_IDS=time_ordered):
+            results[name] = insert()
+        transaction.savepoint_rollback(savepoint)
+    return results
+
+
+@scenario('startup')
+def startup(command, rng, options):
+    """
+    Cold start of a web worker: a fresh interpreter loading the WSGI
+    application and the URLconf, as a gunicorn worker does before its first
+    request, with API_DOCS off and on. RSS is the peak resident set in MiB.
+    """
+    results = {}
+    for name, api_docs in (('docs_off', 'false'), ('docs_on', 'true')):
+        # The search index warm-up would build in the background during the probe.
+        env = {**os.environ, 'API_DOCS': api_docs, 'LISTING_SEARCH_WARM_UP': 'false'}
+        durations, rss = [], []
+        for _ in range(options['repeat']):
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_PROBE], env=env, cwd=settings.BASE_DIR,
+                check=True, capture_output=True, text=True,
+            ).stdout
+            seconds, maxrss, docs_loaded = output.split()
+            durations.append(float(seconds) * 1000)
+            rss.append(int(maxrss) / 1024)
+        results[name] = {
+            **summarize(durations),
+            'rss_mib': round(statistics.median(rss), 1),
+            'drf_yasg_loaded': docs_loaded == 'True',
+        }
+    return results
+
+
+class Command(BaseCommand):
+    help = 'Run a performance benchmark against a generated dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenario',
+            choices=sorted(SCENARIOS),
+            help='Benchmark scenario to run'
+        )
+        parser.add_argument(
+            '--listings',
+            type=int,
+            nargs='+',
+            default=[10000],
+            help='Number of listings to generate; several values run the scenario at each scale'
+        )
+        parser.add_argument(
+            '--bookings-per-listing',
+            type=int,
+            default=3,
+            help='Average number of bookings to generate per listing'
+        )
+        parser.add_argument(
+            '--reviews-per-listing',
+            type=int,
+            default=2,
+            help='Average number of reviews to generate per listing'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Number of timed runs'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the generated dataset and requests'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=200,
+            help='Requests in flight at once (gateway scenario)'
+        )
+        parser.add_argument(
+            '--wsgi-threads',
+            type=int,
+            default=8,
+            help='Threads of the simulated WSGI worker (gateway scenario)'
+        )
+        parser.add_argument(
+            '--gateway-delay',
+            type=float,
+            default=0.5,
+            help='Seconds the Chapa stub takes to answer (gateway scenario)'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000000,
+            help='Rows to insert with each kind of primary key (inserts scenario)'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the generated data instead of rolling it back'
+        )
+        parser.add_argument(
+            '--json',
+            help='Also write the results as JSON to this file'
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Free-form label stored with the JSON results, e.g. the commit being measured'
+        )
+
+    def handle(self, *args, **options):
+        if options['keep'] and len(options['listings']) > 1:
+            raise CommandError('--keep only works with a single --listings value')
+
+        runs = [self.run(dict(options, listings=listings)) for listings in options['listings']]
+
+        if options['json']:
+            report = {
+                'scenario': options['scenario'],
+                'label': options['label'],
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'options': {
+                    key: options[key] for key in ('bookings_per_listing', 'reviews_per_listing', 'repeat', 'seed')
+                },
+                'runs': runs,
+            }
+            with open(options['json'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['json']}")
+
+        over_budget = [
+            f"{name} ran {summary['queries']} queries at {run['listings']} listings (budget {QUERY_BUDGETS[name]})"
+            for run in runs
+            for name, summary in run['results'].items()
+            if summary.get('queries', 0) > QUERY_BUDGETS.get(name, float('inf'))
+        ]
+        if over_budget:
+            raise CommandError('Query budget exceeded: ' + '; '.join(over_budget))
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            self.stdout.write(
+                f"Generating {options['listings']} listings with about "
+                f"{options['bookings_per_listing']} bookings and "
+                f"{options['reviews_per_listing']} reviews each..."
+            )
+            start = time.perf_counter()
+            populate(rng, options['listings'], options['bookings_per_listing'], options['reviews_per_listing'])
+            run = {
+                'listings': options['listings'],
+                'bookings': Booking.objects.count(),
+                'reviews': Review.objects.count(),
+                'populate_s': round(time.perf_counter() - start, 1),
+            }
+            self.stdout.write(f"Dataset ready in {run['populate_s']}s")
+
+            results = SCENARIOS[options['scenario']](self, rng, options)
+            for name, summary in results.items():
+                self.stdout.write(self.style.SUCCESS(
+                    f"{options['scenario']}.{name}: " +
+                    ', '.join(f'{key}={value}' for key, value in summary.items())
+                ))
+            run['results'] = {f"{options['scenario']}.{name}": summary for name, summary in results.items()}
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+        return run
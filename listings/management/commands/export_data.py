@@ -0,0 +1,88 @@
+from datetime import date
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from listings import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream bookings, listings or payments to NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'resource',
+            choices=sorted(exports.EXPORTS),
+            help='What to export'
+        )
+        parser.add_argument(
+            '--output',
+            choices=sorted(exports.FORMATS),
+            default='ndjson',
+            help='Output format'
+        )
+        parser.add_argument(
+            '--file',
+            help='Write to this file instead of stdout'
+        )
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='Only rows created on or after this date (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--until',
+            type=date.fromisoformat,
+            help='Only rows created on or before this date (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--status',
+            help='Only rows with this status (bookings and payments)'
+        )
+        parser.add_argument(
+            '--host',
+            help='Only rows belonging to listings of this host (user id)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of rows fetched per query'
+        )
+
+    def handle(self, *args, **options):
+        resource = options['resource']
+        if options['since'] and options['until'] and options['since'] > options['until']:
+            raise CommandError('--since must not be after --until')
+        if options['host']:
+            try:
+                options['host'] = uuid.UUID(options['host'])
+            except ValueError:
+                raise CommandError(f"--host must be a user id, not {options['host']!r}")
+
+        queryset = exports.export_queryset(
+            resource,
+            since=options['since'],
+            until=options['until'],
+            status=options['status'],
+            host=options['host'],
+        )
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        rows = counted(exports.iter_rows(resource, queryset, chunk_size=options['chunk_size']))
+        if options['file']:
+            with open(options['file'], 'w', newline='', encoding='utf-8') as out:
+                for block in exports.render(resource, rows, options['output']):
+                    out.write(block)
+        else:
+            for block in exports.render(resource, rows, options['output']):
+                self.stdout.write(block, ending='')
+
+        # Reported on stderr so that it never ends up in exported data.
+        self.stderr.write(
+            self.style.SUCCESS(f'Successfully exported {exported} {resource}!')
+        )
@@ -0,0 +1,33 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from listings import docs
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema served at /openapi.json to API_SCHEMA_PATH'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Write to this file instead of API_SCHEMA_PATH; "-" for stdout'
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of the API recorded in the schema, e.g. https://api.example.com'
+        )
+
+    def handle(self, *args, **options):
+        content = docs.generate_schema(url=options['url'])
+        output = options['output'] or settings.API_SCHEMA_PATH
+        if output == '-':
+            self.stdout.write(content.decode())
+            return
+
+        # Written aside and renamed, so running workers never read half a file.
+        partial = f'{output}.partial'
+        with open(partial, 'wb') as schema_file:
+            schema_file.write(content)
+        os.replace(partial, output)
+        self.stdout.write(self.style.SUCCESS(f'Wrote the API schema ({len(content)} bytes) to {output}'))
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from listings.verification import DatabaseVerificationQueue
+import time
+
+
+class Command(BaseCommand):
+    help = 'Drain the database-backed payment verification queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.PAYMENT_VERIFICATION_BATCH_SIZE,
+            help='Number of transactions to claim per batch'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=settings.PAYMENT_VERIFICATION_MAX_ATTEMPTS,
+            help='Give up on a transaction after this many verification attempts'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        verification_queue = DatabaseVerificationQueue(
+            batch_size=options['batch_size'], max_attempts=options['max_attempts'],
+        )
+        while True:
+            processed = verification_queue.drain()
+            if processed:
+                self.stdout.write(f'Processed {processed} payment verifications')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored review_count, rating_sum and avg_rating of every listing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of listings to update per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Listing.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_pk = None
+
+        while True:
+            batch = ids.filter(pk__gt=last_pk) if last_pk else ids
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += Listing.objects.filter(pk__in=batch).rebuild_ratings()
+            last_pk = batch[-1]
+            self.stdout.write(f'Rebuilt ratings for {updated} listings...')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt ratings for {updated} listings!')
+        )
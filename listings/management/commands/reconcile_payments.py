@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from listings import chapa
+from listings.models import Payment
+from listings.verification import apply_outcomes, payment_status
+import time
+
+
+class Command(BaseCommand):
+    help = 'Re-verify stale Pending payments against Chapa and apply the outcomes in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=30,
+            help='Only reconcile payments pending for at least this many minutes'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of payments to load and update per chunk'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=16,
+            help='Maximum number of verify calls in flight at once'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Verify payments but do not update them'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        pending = Payment.objects.filter(status='Pending', created_at__lt=cutoff)
+        total = pending.count()
+        self.stdout.write(f'Reconciling {total} pending payments...')
+
+        # One pooled connection per worker thread, so connections are reused.
+        client = chapa.build_client(pool_size=options['concurrency'])
+        counts = {'Completed': 0, 'Failed': 0, 'unverified': 0}
+        processed = 0
+        start = time.perf_counter()
+
+        def verify(tx_ref):
+            try:
+                return tx_ref, payment_status(client.verify(tx_ref))
+            except chapa.ChapaError:
+                return tx_ref, None
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for chunk in self.stream_chunks(pending, options['chunk_size']):
+                outcomes = {'Completed': [], 'Failed': []}
+                for tx_ref, new_status in pool.map(verify, chunk):
+                    if new_status is None:
+                        counts['unverified'] += 1
+                    else:
+                        outcomes[new_status].append(tx_ref)
+                        counts[new_status] += 1
+                if not options['dry_run']:
+                    apply_outcomes(outcomes)
+
+                processed += len(chunk)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'{processed}/{total} verified '
+                    f"(completed {counts['Completed']}, failed {counts['Failed']}, "
+                    f"unverified {counts['unverified']}) - {processed / elapsed:.0f} payments/s"
+                )
+        client.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully reconciled {processed} payments!')
+        )
+
+    def stream_chunks(self, queryset, chunk_size):
+        """Yield transaction ids in primary-key order, one chunk per query."""
+        rows = queryset.order_by('pk').values_list('pk', 'transaction_id')
+        last_pk = None
+        while True:
+            chunk = list((rows.filter(pk__gt=last_pk) if last_pk else rows)[:chunk_size])
+            if not chunk:
+                return
+            last_pk = chunk[-1][0]
+            yield [tx_ref for _, tx_ref in chunk]
@@ -1,8 +1,101 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from listings.ids import new_uuid
 from listings.models import User, Listing, Booking, Review
 from decimal import Decimal
 from datetime import date, timedelta
+import multiprocessing
 import random
+import time
+
+
+REVIEW_COMMENTS = [
+    "Great place to stay! Very clean and comfortable.",
+    "Amazing location with beautiful views. Highly recommend!",
+    "Host was very responsive and helpful. Will stay again.",
+    "Perfect for a weekend getaway. Everything was as described.",
+    "Exceeded expectations! The property was even better than the photos.",
+    "Good value for money. Clean and well-maintained.",
+    "Lovely place with all necessary amenities. Very peaceful.",
+    "Great experience overall. The host went above and beyond.",
+    "Beautiful property in a fantastic location. Five stars!",
+    "Comfortable stay with easy check-in and check-out process."
+]
+
+FAST_LOCATIONS = [
+    'New York, NY', 'Malibu, CA', 'Aspen, CO', 'Los Angeles, CA', 'Boston, MA',
+    'Miami, FL', 'Portland, OR', 'Seattle, WA', 'Lake Tahoe, CA', 'Phoenix, AZ',
+]
+
+BOOKING_STATUSES = ['pending', 'confirmed', 'canceled', 'completed']
+
+# Filled in by FastSeeder before worker processes are forked, so children
+# inherit the id tables instead of having them pickled to each task.
+_shared = {}
+
+
+def insert_in_batches(model, build, count, batch_size):
+    """Insert `count` rows produced by build(i) with one bulk_create per batch."""
+    for start in range(0, count, batch_size):
+        rows = [build(i) for i in range(start, min(start + batch_size, count))]
+        with transaction.atomic():
+            model.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def seed_bookings(seed, count, batch_size):
+    rng = random.Random(seed)
+    user_ids, listings = _shared['user_ids'], _shared['listings']
+    today = date.today()
+
+    def build(i):
+        listing_id, host_id, price = rng.choice(listings)
+        user_id = rng.choice(user_ids)
+        while user_id == host_id:
+            user_id = rng.choice(user_ids)
+        checkin = today + timedelta(days=rng.randint(-30, 60))
+        nights = rng.randint(1, 14)
+        return Booking(
+            booking_id=new_uuid(rng), property_id=listing_id, user_id=user_id,
+            checkin=checkin, checkout=checkin + timedelta(days=nights),
+            total_price=price * nights, status=rng.choice(BOOKING_STATUSES),
+        )
+
+    insert_in_batches(Booking, build, count, batch_size)
+    return count
+
+
+def seed_reviews(seed, count, batch_size):
+    rng = random.Random(seed)
+    user_ids, listings = _shared['user_ids'], _shared['listings']
+    seen = set()
+
+    def build(i):
+        while True:
+            listing_index = rng.randrange(len(listings))
+            user_index = rng.randrange(len(user_ids))
+            listing_id, host_id, _ = listings[listing_index]
+            if user_ids[user_index] != host_id and (listing_index, user_index) not in seen:
+                break
+        seen.add((listing_index, user_index))
+        return Review(
+            review_id=new_uuid(rng), property_id=listing_id, user_id=user_ids[user_index],
+            rating=rng.randint(3, 5), comment=rng.choice(REVIEW_COMMENTS),
+        )
+
+    insert_in_batches(Review, build, count, batch_size)
+    return count
+
+
+def run_worker(task):
+    func, seed, count, batch_size = task
+    # Forked children must not share the parent's database connection.
+    connections.close_all()
+    try:
+        return func(seed, count, batch_size)
+    finally:
+        connections.close_all()
 
 
 class Command(BaseCommand):
@@ -38,6 +131,29 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing data before seeding'
         )
+        parser.add_argument(
+            '--fast',
+            action='store_true',
+            help='Insert generated rows with bulk_create in batches (for large datasets)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for reproducible output'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows per bulk_create batch in --fast mode'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes used to insert bookings and reviews in --fast mode'
+        )
 
     def handle(self, *args, **options):
         if options['clear']:
@@ -49,6 +165,13 @@ class Command(BaseCommand):
             Listing.objects.all().delete()
             User.objects.filter(is_superuser=False).delete()
 
+        if options['fast']:
+            FastSeeder(self, options).run()
+            return
+
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
         self.create_users(options['users'])
         self.create_listings(options['listings'])
         self.create_bookings(options['bookings'])
@@ -242,19 +365,6 @@ class Command(BaseCommand):
             )
             return
 
-        review_comments = [
-            "Great place to stay! Very clean and comfortable.",
-            "Amazing location with beautiful views. Highly recommend!",
-            "Host was very responsive and helpful. Will stay again.",
-            "Perfect for a weekend getaway. Everything was as described.",
-            "Exceeded expectations! The property was even better than the photos.",
-            "Good value for money. Clean and well-maintained.",
-            "Lovely place with all necessary amenities. Very peaceful.",
-            "Great experience overall. The host went above and beyond.",
-            "Beautiful property in a fantastic location. Five stars!",
-            "Comfortable stay with easy check-in and check-out process."
-        ]
-
         created_reviews = set()
         attempts = 0
         max_attempts = count * 3
@@ -274,6 +384,103 @@ class Command(BaseCommand):
                     property=listing,
                     user=user,
                     rating=random.randint(3, 5),  # Bias towards higher ratings
-                    comment=random.choice(review_comments)
+                    comment=random.choice(REVIEW_COMMENTS)
                 )
-                created_reviews.add(review_key)
\ No newline at end of file
+                created_reviews.add(review_key)
+
+
+class FastSeeder:
+    """
+    Bulk seeding for load-test sized datasets.
+
+    Passwords are hashed once, primary keys come from the seeded RNG and rows
+    are built and inserted one batch at a time, so memory stays bounded by
+    the batch size plus the user and listing id tables.
+    """
+
+    def __init__(self, command, options):
+        self.command = command
+        self.options = options
+        self.seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.batch_size = options['batch_size']
+
+    def log(self, message):
+        self.command.stdout.write(message)
+
+    def timed(self, label, count, func, *args):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        self.log(f'Created {count} {label} in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def run(self):
+        self.log(f'Fast seeding with --seed {self.seed}...')
+        options = self.options
+        self.timed('users', options['users'], self.create_users, options['users'])
+        user_ids = list(User.objects.order_by('username').values_list('pk', flat=True))
+        if len(user_ids) < 2:
+            self.log(self.command.style.ERROR('At least two users are needed.'))
+            return
+
+        self.timed('listings', options['listings'], self.create_listings, options['listings'], user_ids)
+        listings = list(
+            Listing.objects.order_by('pk').values_list('pk', 'host_id', 'pricepernight')
+        )
+        if not listings:
+            self.log(self.command.style.ERROR('No listings found.'))
+            return
+
+        _shared.update(user_ids=user_ids, listings=listings)
+        self.timed('bookings', options['bookings'], self.fan_out, seed_bookings, options['bookings'])
+        # Each guest reviews a listing at most once (per worker process).
+        reviews = min(options['reviews'], len(listings) * (len(user_ids) - 1))
+        self.timed('reviews', reviews, self.fan_out, seed_reviews, reviews)
+        _shared.clear()
+
+        # bulk_create skips the Review signals that maintain listing ratings.
+        call_command('rebuild_ratings', stdout=self.command.stdout)
+        self.log(self.command.style.SUCCESS('Successfully seeded the database!'))
+
+    def create_users(self, count):
+        password = make_password('password123')
+        rng = self.rng
+
+        def build(i):
+            return User(
+                user_id=new_uuid(rng), username=f'user_{i + 1}', email=f'user{i + 1}@example.com',
+                first_name='User', last_name=str(i + 1), phone_number=f'+1{i + 1:010d}',
+                password=password,
+            )
+
+        for start in range(0, count, self.batch_size):
+            rows = [build(i) for i in range(start, min(start + self.batch_size, count))]
+            User.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def create_listings(self, count, user_ids):
+        rng = self.rng
+
+        def build(i):
+            return Listing(
+                listing_id=new_uuid(rng), host_id=rng.choice(user_ids),
+                name=f'Property {i + 1}', description=f'Description for property {i + 1}',
+                location=rng.choice(FAST_LOCATIONS), pricepernight=Decimal(rng.randint(50, 300)),
+            )
+
+        insert_in_batches(Listing, build, count, self.batch_size)
+
+    def fan_out(self, func, count):
+        """Split `count` rows across worker processes, each with its own derived seed."""
+        workers = max(1, min(self.options['workers'], count // self.batch_size or 1))
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite allows a single writer; extra processes would only contend for the lock.
+            self.log(self.command.style.WARNING('SQLite detected, inserting from a single process.'))
+            workers = 1
+        shares = [count // workers + (1 if i < count % workers else 0) for i in range(workers)]
+        tasks = [(func, self.rng.getrandbits(64), share, self.batch_size) for share in shares]
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            return sum(func(seed, share, batch_size) for func, seed, share, batch_size in tasks)
+
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            return sum(pool.map(run_worker, tasks))
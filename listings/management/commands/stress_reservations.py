@@ -0,0 +1,117 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from listings.models import User, Listing, Booking
+from listings.reservations import BookingConflict, reserve
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Reserve overlapping dates from many threads at once and check for double bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Number of concurrent booking threads'
+        )
+        parser.add_argument(
+            '--listings',
+            type=int,
+            default=4,
+            help='Number of listings the threads compete for'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Total number of reservation attempts'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Width of the date window reservations are drawn from'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the requested dates'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        run = f'{time.time_ns():x}'
+        host = User.objects.create(username=f'stress_host_{run}', email=f'stress_host_{run}@example.com')
+        guest = User.objects.create(username=f'stress_guest_{run}', email=f'stress_guest_{run}@example.com')
+        listings = [
+            Listing.objects.create(
+                host=host, name=f'Stress property {i}', description='Reservation stress test',
+                location='Stress, ST', pricepernight=Decimal('100.00'),
+            ).pk
+            for i in range(options['listings'])
+        ]
+        start_day = date.today() + timedelta(days=1)
+        requests = []
+        for _ in range(options['requests']):
+            checkin = start_day + timedelta(days=rng.randrange(options['days']))
+            requests.append((rng.choice(listings), checkin, checkin + timedelta(days=rng.randint(1, 3))))
+
+        def work(share):
+            outcomes = Counter()
+            try:
+                for listing_id, checkin, checkout in share:
+                    try:
+                        reserve(listing_id, guest, checkin, checkout, status='confirmed')
+                        outcomes['booked'] += 1
+                    except BookingConflict:
+                        outcomes['conflict'] += 1
+                    except OperationalError:
+                        outcomes['gave up'] += 1
+            finally:
+                # Each thread has its own connection; do not leak them.
+                connection.close()
+            return outcomes
+
+        threads = options['threads']
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = sum(pool.map(work, [requests[i::threads] for i in range(threads)]), Counter())
+            elapsed = time.perf_counter() - started
+
+            double_booked = self.count_double_bookings(listings)
+            self.stdout.write(
+                f"{options['requests']} attempts from {options['threads']} threads in {elapsed:.2f}s: "
+                f"{outcomes['booked']} booked, {outcomes['conflict']} conflicts, "
+                f"{outcomes['gave up']} gave up - {options['requests'] / elapsed:.0f} attempts/s, "
+                f"{outcomes['booked'] / elapsed:.0f} bookings/s"
+            )
+        finally:
+            Listing.objects.filter(pk__in=listings).delete()
+            User.objects.filter(pk__in=[host.pk, guest.pk]).delete()
+
+        if double_booked:
+            raise CommandError(f'{double_booked} double bookings detected')
+        self.stdout.write(self.style.SUCCESS('No double bookings'))
+
+    def count_double_bookings(self, listings):
+        """Active bookings that overlap an earlier booking of the same listing."""
+        rows = Booking.objects.active().filter(property_id__in=listings).order_by(
+            'property_id', 'checkin'
+        ).values_list('property_id', 'checkin', 'checkout')
+        overlaps = 0
+        last_listing = last_checkout = None
+        for listing_id, checkin, checkout in rows:
+            if listing_id == last_listing and checkin < last_checkout:
+                overlaps += 1
+                last_checkout = max(last_checkout, checkout)
+            else:
+                last_listing, last_checkout = listing_id, checkout
+        return overlaps
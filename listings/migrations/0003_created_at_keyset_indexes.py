@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_payment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'booking_id'], name='booking_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['created_at', 'listing_id'], name='listing_created_idx'),
+        ),
+    ]
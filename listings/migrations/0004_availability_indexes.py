@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_created_at_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['property', 'checkin', 'checkout', 'status'], name='booking_overlap_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['location', 'pricepernight'], name='listing_location_price_idx'),
+        ),
+    ]
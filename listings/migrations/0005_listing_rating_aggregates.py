@@ -0,0 +1,48 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_ratings(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    reviews = Review.objects.filter(property=OuterRef('pk')).order_by().values('property')
+    review_count = Coalesce(Subquery(reviews.annotate(total=Count('pk')).values('total')), 0)
+    rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+    Listing.objects.update(
+        avg_rating=Coalesce(Cast(rating_sum, models.FloatField()) / NullIf(review_count, 0), 0.0),
+        review_count=review_count,
+        rating_sum=rating_sum,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['avg_rating', 'listing_id'], name='listing_rating_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
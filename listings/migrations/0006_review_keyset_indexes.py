@@ -0,0 +1,21 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['property', 'created_at'], name='review_property_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['property', 'rating', 'created_at'], name='review_property_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.2 on 2026-10-18 17:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_review_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentVerification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tx_ref', models.CharField(max_length=100, unique=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('enqueued_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['available_at'], name='verification_available_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_payment_verification_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['updated_at'], name='listing_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['location', 'pricepernight', 'avg_rating'], name='listing_facet_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listing_location_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['location', 'created_at', 'listing_id'], name='listing_location_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['pricepernight', 'listing_id'], name='listing_price_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-18 18:58
+
+import listings.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_replicaheartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.UUIDField(default=listings.ids.new_uuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='listing_id',
+            field=models.UUIDField(default=listings.ids.new_uuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_id',
+            field=models.UUIDField(default=listings.ids.new_uuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='review_id',
+            field=models.UUIDField(default=listings.ids.new_uuid, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
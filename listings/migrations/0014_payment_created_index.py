@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_booking_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'payment_id'], name='payment_created_idx'),
+        ),
+    ]
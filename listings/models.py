@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 import uuid
 
+from .ids import new_uuid
+
 
 class User(AbstractUser):
     user_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -16,8 +21,62 @@ class User(AbstractUser):
         return self.username
 
 
+class ListingQuerySet(models.QuerySet):
+    def with_related(self, host=True, reviews=True, columns=None):
+        """
+        Load what ListingSerializer renders in a fixed number of queries.
+
+        ``host`` and ``reviews`` toggle the joined host and prefetched reviews;
+        ``columns`` restricts the listing columns fetched (None for all).
+        """
+        queryset = self
+        if host:
+            queryset = queryset.select_related('host')
+        if reviews:
+            queryset = queryset.prefetch_related(
+                Prefetch('reviews', queryset=Review.objects.select_related('user'))
+            )
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def available(self, checkin, checkout):
+        """Listings with no pending or confirmed booking overlapping [checkin, checkout)."""
+        clashes = Booking.objects.active().overlapping(checkin, checkout).filter(property=OuterRef('pk'))
+        return self.filter(~Exists(clashes))
+
+    def apply_review_delta(self, listing_id, count_delta, rating_delta):
+        """Atomically shift a listing's stored rating aggregates by one review's worth."""
+        review_count = F('review_count') + count_delta
+        rating_sum = F('rating_sum') + rating_delta
+        # avg_rating is assigned first: MySQL evaluates SET clauses left to
+        # right, so later assignments would otherwise see the new counts.
+        return self.filter(pk=listing_id).update(
+            avg_rating=Coalesce(Cast(rating_sum, models.FloatField()) / NullIf(review_count, 0), 0.0),
+            review_count=review_count,
+            rating_sum=rating_sum,
+            updated_at=timezone.now(),
+        )
+
+    def touch(self, listing_id):
+        """Mark a listing as changed, for writes that alter how it renders without changing its row."""
+        return self.filter(pk=listing_id).update(updated_at=timezone.now())
+
+    def rebuild_ratings(self):
+        """Recompute the stored rating aggregates of every listing in this queryset."""
+        reviews = Review.objects.filter(property=OuterRef('pk')).order_by().values('property')
+        review_count = Coalesce(Subquery(reviews.annotate(total=Count('pk')).values('total')), 0)
+        rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+        return self.update(
+            avg_rating=Coalesce(Cast(rating_sum, models.FloatField()) / NullIf(review_count, 0), 0.0),
+            review_count=review_count,
+            rating_sum=rating_sum,
+            updated_at=timezone.now(),
+        )
+
+
 class Listing(models.Model):
-    listing_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    listing_id = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     host = models.ForeignKey('User', related_name='listings', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -25,10 +84,66 @@ class Listing(models.Model):
     pricepernight = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained incrementally by the Review signals in listings.signals.
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    avg_rating = models.FloatField(default=0, editable=False)
+
+    objects = ListingQuerySet.as_manager()
+
+    RATING_FIELDS = ('review_count', 'rating_sum', 'avg_rating')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'listing_id'], name='listing_created_idx'),
+            # Covers the facet aggregate (listings.facets) and location + price filters.
+            models.Index(fields=['location', 'pricepernight', 'avg_rating'], name='listing_facet_idx'),
+            models.Index(fields=['location', 'created_at', 'listing_id'], name='listing_location_created_idx'),
+            models.Index(fields=['pricepernight', 'listing_id'], name='listing_price_idx'),
+            models.Index(fields=['avg_rating', 'listing_id'], name='listing_rating_idx'),
+            models.Index(fields=['updated_at'], name='listing_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Listing {self.name} - ${self.pricepernight}/night"
 
+    def save(self, *args, **kwargs):
+        # Never write back rating aggregates read earlier; a review saved in
+        # the meantime would be lost.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class BookingQuerySet(models.QuerySet):
+    def with_related(self, user=True, listing=True, columns=None):
+        """
+        Load what BookingSerializer renders in a fixed number of queries.
+
+        ``listing`` is False to skip the property, True to load it in full or a
+        dict of Listing.objects.with_related() options.
+        """
+        queryset = self
+        if user:
+            queryset = queryset.select_related('user')
+        if listing:
+            options = listing if isinstance(listing, dict) else {}
+            queryset = queryset.prefetch_related(
+                Prefetch('property', queryset=Listing.objects.with_related(**options))
+            )
+        if columns is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def active(self):
+        return self.filter(status__in=Booking.ACTIVE_STATUSES)
+
+    def overlapping(self, checkin, checkout):
+        return self.filter(checkin__lt=checkout, checkout__gt=checkin)
+
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -37,8 +152,13 @@ class Booking(models.Model):
         ('canceled', 'Canceled'),
         ('completed', 'Completed'),
     ]
+    # Bookings in these states hold the listing's dates.
+    ACTIVE_STATUSES = ('pending', 'confirmed')
+    # Bookings in these states never change again and are moved to
+    # ArchivedBooking once old enough (listings.archive).
+    TERMINAL_STATUSES = ('completed', 'canceled')
     
-    booking_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    booking_id = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     property = models.ForeignKey(Listing, related_name='bookings', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='bookings', on_delete=models.CASCADE)
     checkin = models.DateField()
@@ -46,22 +166,50 @@ class Booking(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'booking_id'], name='booking_created_idx'),
+            models.Index(fields=['property', 'checkin', 'checkout', 'status'], name='booking_overlap_idx'),
+            models.Index(fields=['updated_at'], name='booking_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Booking {self.booking_id} - {self.property.name}"
 
 
 class Review(models.Model):
-    review_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    review_id = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     property = models.ForeignKey(Listing, related_name='reviews', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='reviews', on_delete=models.CASCADE)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['property', 'created_at'], name='review_property_created_idx'),
+            models.Index(fields=['property', 'rating', 'created_at'], name='review_property_rating_idx'),
+        ]
+
     def __str__(self):
         return f"Review {self.review_id} by {self.user.username} - {self.rating} stars"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the rating signals can undo the old rating on update.
+        instance._loaded_rating = (instance.__dict__.get('property_id'), instance.__dict__.get('rating'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the review and its listing's aggregates in one transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 
 class Payment(models.Model):
@@ -71,7 +219,7 @@ class Payment(models.Model):
         ("Failed", "Failed"),
     ]
 
-    payment_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    payment_id = models.UUIDField(primary_key=True, default=new_uuid, editable=False)
     booking = models.ForeignKey(Booking, related_name="payments", on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name="payments", on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -79,7 +227,79 @@ class Payment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Payments in these states are settled and may be archived with their booking.
+    SETTLED_STATUSES = ("Completed", "Failed")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'payment_id'], name='payment_created_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.status}"
 
+
+class ArchivedBooking(models.Model):
+    """A terminal Booking moved out of the hot table by listings.archive, with the same columns."""
+    booking_id = models.UUIDField(primary_key=True, editable=False)
+    property = models.ForeignKey(Listing, related_name='archived_bookings', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='archived_bookings', on_delete=models.CASCADE)
+    checkin = models.DateField()
+    checkout = models.DateField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'booking_id'], name='archived_booking_created_idx'),
+            models.Index(fields=['archived_at'], name='archived_booking_archived_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived booking {self.booking_id}"
+
+
+class ArchivedPayment(models.Model):
+    """A settled Payment, archived together with its booking."""
+    payment_id = models.UUIDField(primary_key=True, editable=False)
+    booking = models.ForeignKey(ArchivedBooking, related_name="payments", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name="archived_payments", on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_id = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Archived payment {self.transaction_id} - {self.status}"
+
+
+class PaymentVerification(models.Model):
+    """A Chapa transaction waiting to be verified by the database-backed queue."""
+    tx_ref = models.CharField(max_length=100, unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at'], name='verification_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Verification {self.tx_ref} (attempt {self.attempts})"
+
+
+class ReplicaHeartbeat(models.Model):
+    """Written on the primary by the replica health check; its copy on a replica shows that replica's lag."""
+    beat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Heartbeat {self.beat_at}"
+
 # Create your models here.
\ No newline at end of file
@@ -0,0 +1,153 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination on created_at.
+
+    Each page is a range scan on the (created_at, pk) index, so latency does
+    not depend on how deep the client has paged and no COUNT(*) is issued.
+    The cursor holds only the created_at of the page boundary (DRF's
+    CursorPagination keys on ``ordering[0]``), plus an offset past the rows
+    that share it. ``-pk`` is not part of the keyset; it only fixes the
+    order of rows created in the same instant, so that offset is stable.
+    """
+    ordering = ('-created_at', '-pk')
+
+
+class FlexiblePagination(BasePagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Clients opt into keyset paging with ``?pagination=cursor``; the ``next``
+    and ``previous`` links carry the opaque cursor (and the mode) from then on.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    page_number_class = PageNumberPagination
+    cursor_class = KeysetPagination
+
+    def get_paginator(self, request):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode == self.cursor_mode or self.cursor_class.cursor_query_param in request.query_params:
+            return self.cursor_class()
+        return self.page_number_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+
+class ReviewPagination(BasePagination):
+    """
+    Forward-only keyset pagination for a listing's reviews.
+
+    ``?sort=newest`` (default) or ``?sort=rating``. The cursor holds the full
+    sort key of the last review served, so each page is a range scan on the
+    (property, created_at) or (property, rating, created_at) index with no
+    OFFSET, however many reviews the listing has.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    sort_query_param = 'sort'
+    orderings = {
+        'newest': ('-created_at', '-review_id'),
+        'rating': ('-rating', '-created_at', '-review_id'),
+    }
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, request):
+        sort = request.query_params.get(self.sort_query_param, 'newest')
+        if sort not in self.orderings:
+            raise ValidationError({self.sort_query_param: f'Must be one of: {", ".join(self.orderings)}.'})
+        return self.orderings[sort]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def after(self, position):
+        """Rows sorting strictly after `position` under self.ordering."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors come from clients: every value must parse as its column's type.
+        try:
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            position.append(value if isinstance(value, int) else str(value))
+        encoded = urlsafe_b64encode(json.dumps(position).encode()).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
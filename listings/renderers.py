@@ -0,0 +1,73 @@
+"""
+JSON rendering through orjson, byte for byte the same as DRF's JSONRenderer.
+
+orjson is optional: without it, or for anything it cannot encode the way the
+stock renderer would (indented output, oversized integers, non-str keys,
+floats it formats differently, ...), rendering falls back to JSONRenderer
+itself.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Dates, times and dataclasses go through the DRF encoder, which formats them
+# differently from orjson; UUIDs, dicts, lists and str/int subclasses match.
+# Non-str keys are left to raise: json.dumps converts them differently.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+
+
+def float_differs(value):
+    """
+    Whether orjson writes `value` differently from json.dumps: it drops the
+    ``+`` and leading zeros of exponents, writes small numbers without one and
+    NaN/Infinity as null. Both agree where repr() uses fixed notation.
+    """
+    return value != 0 and not 1e-4 <= abs(value) < 1e16
+
+
+def has_differing_float(data):
+    """Whether `data` holds a float, at any depth, for which float_differs()."""
+    stack = [[data]]
+    while stack:
+        container = stack.pop()
+        for value in container.values() if isinstance(container, dict) else container:
+            kind = type(value)
+            # Cheap exits for what pages are mostly made of.
+            if kind is str or kind is int or value is None:
+                continue
+            if isinstance(value, float):
+                if float_differs(value):
+                    return True
+            elif isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            or has_differing_float(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class()
+
+        def default(obj):
+            # The encoder turns Decimals into floats, among others.
+            value = encoder.default(obj)
+            if has_differing_float(value):
+                raise TypeError
+            return value
+
+        try:
+            ret = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, so the output stays a strict JavaScript subset.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
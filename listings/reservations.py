@@ -0,0 +1,229 @@
+"""
+Booking reservation.
+
+Every write that can take dates on a listing first row-locks that listing
+(``SELECT ... FOR UPDATE``), then checks for overlapping active bookings and
+writes inside the same short transaction. Two reservations for the same
+listing therefore run one after the other, while reservations on different
+listings never wait for each other. A transaction that loses a deadlock or
+lock wait is retried with jittered backoff.
+
+A batch is validated item by item, then checked for date conflicts with one
+range query covering every affected listing: for each listing only bookings
+between the batch's earliest check-in and latest check-out on it are read.
+Items are accepted in request order, so the first of two overlapping items
+in a batch wins. Accepted bookings are inserted with a single bulk_create in
+one transaction.
+"""
+from bisect import bisect_left
+from functools import reduce
+from operator import or_
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Q
+from rest_framework import exceptions, serializers
+
+from .cache import bump_booking_list_version
+from .models import Booking, Listing, User
+from .serializers import BookingBatchItemSerializer
+
+
+CONFLICT_QUERY_LISTINGS = 200
+RETRY_BACKOFF = 0.02
+
+
+class BookingConflict(exceptions.APIException):
+    status_code = 409
+    default_detail = 'The listing is already booked for these dates.'
+    default_code = 'booking_conflict'
+
+
+def run_with_retry(func):
+    """
+    Run func in a transaction, retrying deadlocks and lock timeouts up to
+    BOOKING_RESERVATION_ATTEMPTS times. Inside an outer transaction the
+    error is raised as is, since only the outermost block can be retried.
+    """
+    attempts = getattr(settings, 'BOOKING_RESERVATION_ATTEMPTS', 5)
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError:
+            if attempt + 1 >= attempts or transaction.get_connection().in_atomic_block:
+                raise
+            time.sleep(RETRY_BACKOFF * 2 ** attempt * (0.5 + random.random()))
+
+
+def lock_listings(listing_ids):
+    """Row-lock listings in primary-key order, so concurrent lockers cannot deadlock."""
+    return dict(
+        Listing.objects.select_for_update().filter(pk__in=listing_ids).order_by('pk')
+        .values_list('pk', 'pricepernight')
+    )
+
+
+def hold(listing_id, checkin, checkout, status, write, exclude=None):
+    """
+    Run ``write(pricepernight)`` while holding the listing's lock, once
+    nothing active overlaps [checkin, checkout) there. `exclude` is the
+    booking being changed, which does not conflict with itself.
+    """
+    def attempt():
+        locked = lock_listings([listing_id])
+        if listing_id not in locked:
+            raise exceptions.NotFound('Listing not found.')
+        if status in Booking.ACTIVE_STATUSES:
+            clashes = Booking.objects.active().filter(property_id=listing_id).overlapping(checkin, checkout)
+            if exclude is not None:
+                clashes = clashes.exclude(pk=exclude)
+            if clashes.exists():
+                raise BookingConflict()
+        return write(locked[listing_id])
+    return run_with_retry(attempt)
+
+
+def reserve(listing_id, user, checkin, checkout, status='pending', total_price=None):
+    """Create a booking, priced from the listing unless `total_price` is given."""
+    def write(pricepernight):
+        return Booking.objects.create(
+            property_id=listing_id,
+            user=user,
+            checkin=checkin,
+            checkout=checkout,
+            total_price=total_price if total_price is not None else pricepernight * (checkout - checkin).days,
+            status=status,
+        )
+    return hold(listing_id, checkin, checkout, status, write)
+
+
+class Calendar:
+    """
+    The occupied nights of one listing as sorted, non-overlapping intervals.
+
+    With disjoint intervals sorted by start, the last one starting before a
+    check-out also ends last, so a conflict check is a single bisect.
+    """
+
+    def __init__(self, ranges=()):
+        self.starts = []
+        self.ends = []
+        for checkin, checkout in sorted(ranges):
+            if self.ends and checkin < self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], checkout)
+            else:
+                self.starts.append(checkin)
+                self.ends.append(checkout)
+
+    def conflicts(self, checkin, checkout):
+        index = bisect_left(self.starts, checkout)
+        return index > 0 and self.ends[index - 1] > checkin
+
+    def add(self, checkin, checkout):
+        index = bisect_left(self.starts, checkin)
+        self.starts.insert(index, checkin)
+        self.ends.insert(index, checkout)
+
+
+def booked_calendars(windows):
+    """Calendars of active bookings for {listing_id: (earliest checkin, latest checkout)}."""
+    ranges = {listing_id: [] for listing_id in windows}
+    listing_ids = list(windows)
+    for start in range(0, len(listing_ids), CONFLICT_QUERY_LISTINGS):
+        chunk = listing_ids[start:start + CONFLICT_QUERY_LISTINGS]
+        condition = reduce(or_, (
+            Q(property_id=listing_id, checkin__lt=windows[listing_id][1], checkout__gt=windows[listing_id][0])
+            for listing_id in chunk
+        ))
+        rows = Booking.objects.active().filter(condition).values_list('property_id', 'checkin', 'checkout')
+        for listing_id, checkin, checkout in rows:
+            ranges[listing_id].append((checkin, checkout))
+    return {listing_id: Calendar(booked) for listing_id, booked in ranges.items()}
+
+
+def create_bookings(items, user):
+    """
+    Create the valid, conflict-free bookings of a batch made by `user`.
+
+    Returns one result per item, in order: ``{'index', 'status': 'created',
+    'booking_id'}`` or ``{'index', 'status': 'error', 'errors'}``. Only staff
+    may book on behalf of another user.
+    """
+    item_serializer = BookingBatchItemSerializer()
+    results = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        try:
+            data = item_serializer.run_validation(item)
+        except serializers.ValidationError as exc:
+            results[index] = {'index': index, 'status': 'error', 'errors': exc.detail}
+            continue
+        candidates.append((index, data))
+
+    listings = dict(
+        Listing.objects.filter(pk__in={data['property'] for _, data in candidates})
+        .values_list('pk', 'pricepernight')
+    )
+    guest_ids = {data['user'] for _, data in candidates if 'user' in data} - {user.pk}
+    known_guests = set(User.objects.filter(pk__in=guest_ids).values_list('pk', flat=True)) if guest_ids else set()
+
+    def reject(index, field, message):
+        results[index] = {'index': index, 'status': 'error', 'errors': {field: [message]}}
+
+    windows = {}
+    accepted = []
+    for index, data in candidates:
+        guest_id = data.get('user', user.pk)
+        if data['property'] not in listings:
+            reject(index, 'property', 'Listing not found.')
+        elif guest_id != user.pk and not user.is_staff:
+            reject(index, 'user', 'Only staff can book on behalf of another user.')
+        elif guest_id != user.pk and guest_id not in known_guests:
+            reject(index, 'user', 'User not found.')
+        else:
+            data['user'] = guest_id
+            accepted.append((index, data))
+            if data['status'] in Booking.ACTIVE_STATUSES:
+                earliest, latest = windows.get(data['property'], (data['checkin'], data['checkout']))
+                windows[data['property']] = (min(earliest, data['checkin']), max(latest, data['checkout']))
+
+    def insert():
+        outcomes = {}
+        bookings = []
+        lock_listings(windows)
+        calendars = booked_calendars(windows) if windows else {}
+        for index, data in accepted:
+            listing_id = data['property']
+            if data['status'] in Booking.ACTIVE_STATUSES:
+                calendar = calendars[listing_id]
+                if calendar.conflicts(data['checkin'], data['checkout']):
+                    outcomes[index] = None
+                    continue
+                calendar.add(data['checkin'], data['checkout'])
+
+            nights = (data['checkout'] - data['checkin']).days
+            booking = Booking(
+                property_id=listing_id,
+                user_id=data['user'],
+                checkin=data['checkin'],
+                checkout=data['checkout'],
+                total_price=data.get('total_price', listings[listing_id] * nights),
+                status=data['status'],
+            )
+            bookings.append(booking)
+            outcomes[index] = booking.booking_id
+        Booking.objects.bulk_create(bookings)
+        if bookings:
+            # bulk_create sends no post_save.
+            bump_booking_list_version()
+        return outcomes
+
+    for index, booking_id in run_with_retry(insert).items():
+        if booking_id is None:
+            reject(index, 'non_field_errors', BookingConflict.default_detail)
+        else:
+            results[index] = {'index': index, 'status': 'created', 'booking_id': booking_id}
+    return results
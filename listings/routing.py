@@ -0,0 +1,230 @@
+"""
+Read-replica routing for the safe reads of the listings API.
+
+Replicas are the DATABASE_REPLICAS aliases. Reads only leave the primary
+inside ``replica_reads()``, which ReplicaReadMixin opens around the
+``replica_actions`` (list and retrieve) of a view; exports pick their
+database with ``read_database()``. One replica serves all the reads of a
+request. Everything else, including every read made while handling a write,
+stays on ``default``.
+
+A client that has just written is pinned to the primary for
+REPLICA_STICKY_SECONDS, so it reads its own writes while the replicas catch
+up: a short-lived cookie, plus a cache entry per user for clients that drop
+cookies.
+
+Each replica is checked at most every REPLICA_CHECK_INTERVAL seconds. The
+check writes a ReplicaHeartbeat row on the primary and reads it back from
+the replica; a replica that errors or whose heartbeat trails the primary's
+by more than REPLICA_MAX_LAG seconds gets no reads until a later check
+passes. With no healthy replica, reads fall back to the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import get_cache
+from .models import ReplicaHeartbeat
+
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_pin'
+
+_replica = ContextVar('replica', default=None)
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads made inside to one healthy replica, if there is any."""
+    token = _replica.set(get_replicas().choose())
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def current_replica():
+    """The replica serving this context's reads, or None for the primary."""
+    return _replica.get()
+
+
+def pin_cache_key(user_id):
+    return f'replica:pinned:{user_id}'
+
+
+def is_pinned(request):
+    """Whether the client wrote within the last REPLICA_STICKY_SECONDS."""
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and get_cache().get(pin_cache_key(user.pk)))
+
+
+def pin_to_primary(request, response):
+    seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    user = getattr(request, 'user', None)
+    if user and user.is_authenticated:
+        get_cache().set(pin_cache_key(user.pk), True, timeout=seconds)
+
+
+def read_database(request):
+    """The alias a safe read for `request` should use right now."""
+    if not get_replicas().aliases or is_pinned(request):
+        return 'default'
+    return get_replicas().choose() or 'default'
+
+
+class ReplicaSet:
+    """Round-robin over the replicas whose last health check passed."""
+
+    def __init__(self, aliases, max_lag=5, check_interval=5):
+        self.aliases = list(aliases)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cycle = itertools.count()
+        self._lock = threading.Lock()
+        # alias -> (healthy, checked at, lag in seconds or None)
+        self._status = {}
+
+    def choose(self):
+        healthy = self.healthy()
+        return healthy[next(self._cycle) % len(healthy)] if healthy else None
+
+    def healthy(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                alias for alias in self.aliases
+                if alias not in self._status or now - self._status[alias][1] >= self.check_interval
+            ]
+            # Claimed before checking, so concurrent requests do not check too.
+            for alias in due:
+                self._status[alias] = (self._status.get(alias, (False,))[0], now, None)
+        for alias in due:
+            self.check(alias)
+        with self._lock:
+            return [alias for alias in self.aliases if self._status[alias][0]]
+
+    def check(self, alias):
+        try:
+            lag = self.measure_lag(alias)
+        except DatabaseError as exc:
+            logger.warning('Replica %s failed its health check: %s', alias, exc)
+            healthy, lag = False, None
+        else:
+            healthy = lag is not None and lag <= self.max_lag
+            if not healthy:
+                logger.warning('Replica %s is lagging (%s s behind); reading from the primary', alias, lag)
+        with self._lock:
+            self._status[alias] = (healthy, time.monotonic(), lag)
+        return healthy
+
+    def measure_lag(self, alias):
+        """
+        Seconds between the primary's previous heartbeat and the replica's
+        copy of it, or None if the replica has none. The beat written now
+        is only compared at the next check, so the check interval itself
+        is not counted as lag.
+        """
+        primary = ReplicaHeartbeat.objects.using('default')
+        previous = primary.filter(pk=1).values_list('beat_at', flat=True).first()
+        if not primary.filter(pk=1).update(beat_at=timezone.now()):
+            primary.create(pk=1, beat_at=timezone.now())
+        if previous is None:
+            return 0.0
+        replicated = ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('beat_at', flat=True).first()
+        if replicated is None:
+            return None
+        return max(0.0, (previous - replicated).total_seconds())
+
+    def status(self):
+        with self._lock:
+            return {
+                alias: {'healthy': healthy, 'lag': lag}
+                for alias, (healthy, _, lag) in self._status.items()
+            }
+
+
+_replicas = None
+_replicas_lock = threading.Lock()
+
+
+def get_replicas():
+    """The process-wide ReplicaSet of DATABASE_REPLICAS."""
+    global _replicas
+    with _replicas_lock:
+        if _replicas is None:
+            _replicas = ReplicaSet(
+                getattr(settings, 'DATABASE_REPLICAS', []),
+                max_lag=getattr(settings, 'REPLICA_MAX_LAG', 5),
+                check_interval=getattr(settings, 'REPLICA_CHECK_INTERVAL', 5),
+            )
+        return _replicas
+
+
+@receiver(setting_changed)
+def reset_replicas(setting, **kwargs):
+    global _replicas
+    if setting == 'DATABASE_REPLICAS' or setting.startswith('REPLICA_'):
+        with _replicas_lock:
+            _replicas = None
+
+
+class ReplicaRouter:
+    """DATABASE_ROUTERS entry: replica reads inside replica_reads(), the primary otherwise."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {'default', *get_replicas().aliases}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication.
+        return False if db in get_replicas().aliases else None
+
+
+class ReplicaReadMixin:
+    """
+    Run the view's ``replica_actions`` inside replica_reads() unless the
+    client is pinned to the primary, and pin clients after a successful
+    write.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.action in self.replica_actions and request.method in SAFE_METHODS
+            and get_replicas().aliases and not is_pinned(request)
+        ):
+            self._replica_token = _replica.set(get_replicas().choose())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _replica.reset(token)
+            self._replica_token = None
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and get_replicas().aliases:
+            pin_to_primary(request, response)
+        return response
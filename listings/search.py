@@ -0,0 +1,346 @@
+"""
+In-memory location autocomplete and text search over listings.
+
+Each process keeps one SearchIndex:
+
+* locations are normalized (accents stripped, case folded, punctuation
+  dropped) and kept in a sorted list of word-boundary suffixes, so
+  ``"mal"`` and ``"ca"`` both find ``"Malibu, CA"`` with one bisect;
+* ``name`` and ``description`` are tokenized into an inverted index whose
+  postings are bucketed by term weight. A query walks the postings of its
+  rarest token best bucket first and stops once no remaining document can
+  enter the top results. Results are ranked by tf-idf; ties are broken in
+  favour of the listing indexed first.
+
+A query also stops after MAX_CANDIDATES documents, so for tokens that common
+the results are approximate: a better match past that point is missed.
+
+The index is built in a background thread when a web worker starts
+(warm_up(), called from wsgi.py and asgi.py with LISTING_SEARCH_WARM_UP) or
+on the first search; until it is ready get_index() returns None and the
+search endpoints answer 503. Listing saves and deletes in this process update
+it once committed (see listings.signals). Writes made by other processes are
+picked up at most every LISTING_SEARCH_SYNC_INTERVAL seconds by re-reading
+listings whose ``updated_at`` moved; deletions by comparing the listing count
+and, when it differs, the set of listing ids.
+"""
+import heapq
+import logging
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Listing
+
+
+logger = logging.getLogger(__name__)
+
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+MAX_CANDIDATES = 2000
+AUTOCOMPLETE_SCAN = 500
+# Rows committed late can carry an updated_at older than the last sync.
+SYNC_OVERLAP = timedelta(seconds=5)
+BUILD_CHUNK_SIZE = 5000
+
+_TOKEN = re.compile(r'\w+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_TOKEN.findall(text.casefold()))
+
+
+def tokenize(text):
+    # Interned, so the postings and every document share one copy of each word.
+    return [sys.intern(token) for token in normalize(text).split()]
+
+
+class SearchIndex:
+    """
+    Documents are numbered internally: postings hold small ints, which are
+    cheaper to store than the listings' UUIDs. Numbers only grow, so each
+    posting bucket is a list kept in indexing order by appending.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self.documents = {}
+        self.numbers = {}
+        self.postings = defaultdict(lambda: defaultdict(list))
+        self.locations = {}
+        self.location_keys = []
+        self.synced_at = None
+        # updated_at of rows already applied within the sync overlap window.
+        self.recent = {}
+        self._next_number = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def build(self, queryset=None):
+        """Load every listing, replacing the current contents."""
+        queryset = Listing.objects.all() if queryset is None else queryset
+        rows = queryset.order_by().values_list('pk', 'name', 'description', 'location')
+        with self._lock:
+            self._clear()
+            self.synced_at = timezone.now()
+            for row in rows.iterator(chunk_size=BUILD_CHUNK_SIZE):
+                self._add(*row)
+        return self
+
+    def sync(self):
+        """Pick up listings changed or deleted by other processes since the last sync."""
+        started = timezone.now()
+        # Queried before taking the lock, so searches are not held up by the database.
+        rows = list(Listing.objects.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP).values_list(
+            'pk', 'name', 'description', 'location', 'updated_at'
+        ))
+        count = 0
+        with self._lock:
+            for listing_id, name, description, location, updated_at in rows:
+                if self.recent.get(listing_id) != updated_at:
+                    self.update(listing_id, name, description, location)
+                    self.recent[listing_id] = updated_at
+                    count += 1
+            self.synced_at = started
+            horizon = started - SYNC_OVERLAP
+            self.recent = {pk: updated_at for pk, updated_at in self.recent.items() if updated_at >= horizon}
+            indexed = set(self.numbers)
+        if Listing.objects.count() != len(indexed):
+            # Only listings indexed before the query can be stale; newer ones were saved since.
+            deleted = indexed - set(Listing.objects.values_list('pk', flat=True))
+            for listing_id in deleted:
+                self.remove(listing_id)
+            count += len(deleted)
+        return count
+
+    def update(self, listing_id, name, description, location):
+        with self._lock:
+            self.remove(listing_id)
+            self._add(listing_id, name, description, location)
+
+    def remove(self, listing_id):
+        with self._lock:
+            number = self.numbers.pop(listing_id, None)
+            if number is None:
+                return
+            _, location_key, weights = self.documents.pop(number)
+            for token, weight in weights.items():
+                buckets = self.postings[token]
+                bucket = buckets[weight]
+                del bucket[bisect_left(bucket, number)]
+                if not buckets[weight]:
+                    del buckets[weight]
+                if not buckets:
+                    del self.postings[token]
+            self._release_location(location_key)
+
+    def _add(self, listing_id, name, description, location):
+        weights = defaultdict(int)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] += DESCRIPTION_WEIGHT
+        weights = dict(weights)
+
+        number = self._next_number
+        self._next_number += 1
+        for token, weight in weights.items():
+            self.postings[token][weight].append(number)
+
+        location_key = sys.intern(normalize(location))
+        self.documents[number] = (listing_id, location_key, weights)
+        self.numbers[listing_id] = number
+        if location_key in self.locations:
+            self.locations[location_key][1] += 1
+        elif location_key:
+            self.locations[location_key] = [location, 1]
+            for suffix in self._suffixes(location_key):
+                insort(self.location_keys, (suffix, location_key))
+
+    def _release_location(self, location_key):
+        entry = self.locations.get(location_key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.locations[location_key]
+            for suffix in self._suffixes(location_key):
+                index = bisect_left(self.location_keys, (suffix, location_key))
+                del self.location_keys[index]
+
+    @staticmethod
+    def _suffixes(location_key):
+        words = location_key.split()
+        return [' '.join(words[start:]) for start in range(len(words))]
+
+    def autocomplete(self, prefix, limit=10):
+        """Locations with a word starting with `prefix`, most listed first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            matches = {}
+            index = bisect_left(self.location_keys, (prefix,))
+            for suffix, location_key in self.location_keys[index:index + AUTOCOMPLETE_SCAN]:
+                if not suffix.startswith(prefix):
+                    break
+                label, count = self.locations[location_key]
+                matches[location_key] = {'location': label, 'count': count}
+        return sorted(matches.values(), key=lambda match: (-match['count'], match['location']))[:limit]
+
+    def search(self, query, limit=20):
+        """(listing_id, score) of listings matching every query token, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            if any(token not in self.postings for token in tokens):
+                return []
+            total = len(self.documents)
+            frequency = {token: sum(map(len, self.postings[token].values())) for token in tokens}
+            idf = {token: math.log(1 + total / frequency[token]) for token in tokens}
+            rarest = min(tokens, key=frequency.get)
+            others = [(token, idf[token]) for token in tokens if token != rarest]
+            # The most each other token can add to any document's score.
+            headroom = [token_idf * max(self.postings[token]) for token, token_idf in others]
+
+            best = []
+            budget = MAX_CANDIDATES
+            buckets = self.postings[rarest]
+            for weight in sorted(buckets, reverse=True):
+                base = idf[rarest] * weight
+                # Summed in the same order as the scores, so no score exceeds it.
+                bound = base
+                for most in headroom:
+                    bound += most
+                bucket = buckets[weight]
+                # Nothing in this or later buckets can beat the current top
+                # `limit`: lower numbers come first and win ties.
+                if budget <= 0 or (len(best) == limit and (bound, -bucket[0]) <= best[0]):
+                    break
+                for number in islice(bucket, budget):
+                    budget -= 1
+                    weights = self.documents[number][2]
+                    score = base
+                    for token, token_idf in others:
+                        if token not in weights:
+                            break
+                        score += token_idf * weights[token]
+                    else:
+                        if len(best) < limit:
+                            heapq.heappush(best, (score, -number))
+                        elif (score, -number) > best[0]:
+                            heapq.heapreplace(best, (score, -number))
+                        elif (bound, -number) <= best[0]:
+                            break
+            best.sort(reverse=True)
+            return [(self.documents[-number][0], round(score, 4)) for score, number in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_sync = 0.0
+_builder = None
+# Bumped by reset_index(), so a build started before a reset is discarded.
+_generation = 0
+
+
+def get_index():
+    """
+    The process-wide SearchIndex, kept in sync, or None while it is being
+    built; a build is started if none is running.
+    """
+    global _last_sync
+    with _index_lock:
+        index = _index
+        due = index is not None and (
+            time.monotonic() - _last_sync >= getattr(settings, 'LISTING_SEARCH_SYNC_INTERVAL', 2)
+        )
+        if due:
+            _last_sync = time.monotonic()
+    if index is None:
+        warm_up()
+        return None
+    if due:
+        # One request per interval syncs, outside the global lock.
+        index.sync()
+    return index
+
+
+def build_index():
+    """Build the index in the calling thread and make it this process's index."""
+    global _index, _last_sync
+    with _index_lock:
+        generation = _generation
+    index = SearchIndex().build()
+    with _index_lock:
+        if generation == _generation:
+            _index = index
+            _last_sync = time.monotonic()
+    return index
+
+
+def warm_up():
+    """Start building the index in a background thread, unless it is built or being built."""
+    global _builder
+    with _index_lock:
+        # A thread inherited through fork is not alive in the child.
+        if _index is not None or (_builder is not None and _builder.is_alive()):
+            return
+        _builder = threading.Thread(target=_build_in_background, name='search-index-build', daemon=True)
+        _builder.start()
+
+
+def _build_in_background():
+    start = time.perf_counter()
+    try:
+        index = build_index()
+    except Exception:
+        logger.exception('Building the search index failed')
+    else:
+        logger.info('Indexed %d listings in %.1fs', len(index), time.perf_counter() - start)
+    finally:
+        close_old_connections()
+
+
+def index_listing(listing):
+    """Apply a committed save to this process's index, if it has been built."""
+    if _index is not None:
+        _index.update(listing.pk, listing.name, listing.description, listing.location)
+
+
+def unindex_listing(listing_id):
+    if _index is not None:
+        _index.remove(listing_id)
+
+
+def reset_index():
+    global _index, _generation
+    with _index_lock:
+        _index = None
+        _generation += 1
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting.startswith('LISTING_SEARCH_'):
+        reset_index()
@@ -1,13 +1,71 @@
 from rest_framework import serializers
 from .models import User, Listing, Booking, Review
-
-class UserSerializer(serializers.ModelSerializer):
+from .instrumentation import TimedSerializerMixin
+
+
+def field_selection(fields, prefix=''):
+    """
+    The field names selected at one nesting level of a dotted ``fields`` set.
+
+    Returns None when every field at that level is selected, e.g. for
+    ``fields={'booking_id', 'property.name'}`` the ``property`` level
+    selects ``{'name'}`` and a plain ``fields={'property'}`` selects all.
+    """
+    if fields is None:
+        return None
+    if prefix:
+        if any(prefix == field or prefix.startswith(field + '.') for field in fields):
+            return None
+        fields = {field[len(prefix) + 1:] for field in fields if field.startswith(prefix + '.')}
+    return {field.split('.', 1)[0] for field in fields}
+
+
+def nights_between(checkin, checkout):
+    if checkin and checkout:
+        return (checkout - checkin).days
+    return 0
+
+
+class DynamicFieldsMixin:
+    """
+    Trim output to the ``fields`` and ``expand`` sets in the serializer context.
+
+    ``fields`` limits the representation to the named (dotted) fields and
+    ``expand`` opts in to ``expandable_fields``, which are left out otherwise.
+    """
+    expandable_fields = ()
+
+    @property
+    def field_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self.field_path
+        selected = field_selection(self.context.get('fields'), path)
+        expand = self.context.get('expand') or set()
+        for name in list(fields):
+            if selected is not None and name not in selected:
+                del fields[name]
+            elif name in self.expandable_fields and selected is None:
+                if (f'{path}.{name}' if path else name) not in expand:
+                    del fields[name]
+        return fields
+
+
+class UserSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['user_id', 'username', 'email', 'first_name', 'last_name', 'phone_number']
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     comment = serializers.CharField()
 
@@ -21,20 +79,38 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     host = UserSerializer(read_only=True)
     reviews = ReviewSerializer(many=True, read_only=True)
-    review_count = serializers.SerializerMethodField()
+
+    expandable_fields = ('reviews',)
+    # Always fetched: the primary key and the orderable columns that keyset
+    # pagination reads back from each row.
+    always_loaded = ('listing_id', 'created_at', 'pricepernight', 'avg_rating', 'review_count')
 
     class Meta:
         model = Listing
         fields = [
             'listing_id', 'host', 'name', 'description', 'location',
-            'pricepernight', 'created_at', 'updated_at', 'reviews', 'review_count'
+            'pricepernight', 'created_at', 'updated_at', 'reviews', 'review_count',
+            'avg_rating'
         ]
-
-    def get_review_count(self, obj):
-        return obj.reviews.count()
+        read_only_fields = ['review_count', 'avg_rating']
+
+    @classmethod
+    def loading_options(cls, fields=None, expand=(), prefix=''):
+        """Listing.objects.with_related() options covering a field selection."""
+        selected = field_selection(fields, prefix)
+        options = {
+            'host': selected is None or 'host' in selected,
+            'reviews': (f'{prefix}.reviews' if prefix else 'reviews') in expand
+                       or (selected is not None and 'reviews' in selected),
+            'columns': None,
+        }
+        if selected is not None:
+            concrete = {field.name for field in Listing._meta.concrete_fields}
+            options['columns'] = set(cls.always_loaded) | (selected & concrete)
+        return options
 
     def validate_pricepernight(self, value):
         if value <= 0:
@@ -42,33 +118,112 @@ class ListingSerializer(serializers.ModelSerializer):
         return value
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingDatesMixin:
+    """Check-in/check-out validation shared by the booking serializers."""
+
+    def validate(self, data):
+        checkin = data.get('checkin')
+        checkout = data.get('checkout')
+
+        if checkin and checkout:
+            if checkin >= checkout:
+                raise serializers.ValidationError("Check-out date must be after check-in date")
+
+            from datetime import date
+            if checkin < date.today():
+                raise serializers.ValidationError("Check-in date cannot be in the past")
+
+        return data
+
+
+class BookingSerializer(TimedSerializerMixin, BookingDatesMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     property = ListingSerializer(read_only=True)
+    property_id = serializers.PrimaryKeyRelatedField(
+        source='property', queryset=Listing.objects.select_related('host'), write_only=True
+    )
     user = UserSerializer(read_only=True)
     duration_nights = serializers.SerializerMethodField()
 
+    always_loaded = ('booking_id', 'created_at')
+    # Computed fields for the fast path's RowMapper: name -> (columns, function).
+    row_fields = {'duration_nights': (('checkin', 'checkout'), nights_between)}
+
     class Meta:
         model = Booking
         fields = [
-            'booking_id', 'property', 'user', 'checkin', 'checkout',
+            'booking_id', 'property', 'property_id', 'user', 'checkin', 'checkout',
             'total_price', 'status', 'created_at', 'duration_nights'
         ]
 
+    @classmethod
+    def loading_options(cls, fields=None, expand=()):
+        """Booking.objects.with_related() options covering a field selection."""
+        selected = field_selection(fields)
+        options = {
+            'user': selected is None or 'user' in selected,
+            'listing': False,
+            'columns': None,
+        }
+        if selected is None or 'property' in selected:
+            options['listing'] = ListingSerializer.loading_options(fields, expand, prefix='property')
+        if selected is not None:
+            concrete = {field.name for field in Booking._meta.concrete_fields}
+            columns = set(cls.always_loaded) | (selected & concrete)
+            if 'duration_nights' in selected:
+                columns |= {'checkin', 'checkout'}
+            options['columns'] = columns
+        return options
+
     def get_duration_nights(self, obj):
-        if obj.checkin and obj.checkout:
-            return (obj.checkout - obj.checkin).days
-        return 0
+        return nights_between(obj.checkin, obj.checkout)
+
+
+class BookingBatchItemSerializer(BookingDatesMixin, serializers.Serializer):
+    """One booking of a batch; listings and users are resolved in bulk by the caller."""
+    property = serializers.UUIDField()
+    user = serializers.UUIDField(required=False)
+    checkin = serializers.DateField()
+    checkout = serializers.DateField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    status = serializers.ChoiceField(choices=Booking.STATUS_CHOICES, default='pending')
+
+
+class AvailabilitySearchSerializer(serializers.Serializer):
+    checkin = serializers.DateField()
+    checkout = serializers.DateField()
+    location = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
 
     def validate(self, data):
-        checkin = data.get('checkin')
-        checkout = data.get('checkout')
+        if data['checkin'] >= data['checkout']:
+            raise serializers.ValidationError("Check-out date must be after check-in date")
+        return data
 
-        if checkin and checkout:
-            if checkin >= checkout:
-                raise serializers.ValidationError("Check-out date must be after check-in date")
 
-            from datetime import date
-            if checkin < date.today():
-                raise serializers.ValidationError("Check-in date cannot be in the past")
+class ListingTextSearchSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class LocationAutocompleteSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    limit = serializers.IntegerField(min_value=1, max_value=25, default=10)
 
+
+class ReviewSearchSerializer(serializers.Serializer):
+    rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    min_rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
+
+
+class ExportFilterSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    status = serializers.CharField(required=False)
+    host = serializers.UUIDField(required=False)
+
+    def validate(self, data):
+        if data.get('since') and data.get('until') and data['since'] > data['until']:
+            raise serializers.ValidationError("'since' must not be after 'until'")
         return data
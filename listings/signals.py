@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import search
+from .cache import bump_booking_list_version, bump_listing_version
+from .models import ArchivedBooking, Booking, Listing, Review
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def invalidate_listing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_listing_version(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=ArchivedBooking)
+def invalidate_booking_lists(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_booking_list_version()
+
+
+@receiver(post_save, sender=Listing)
+def index_listing(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: search.index_listing(instance))
+
+
+@receiver(post_delete, sender=Listing)
+def unindex_listing(sender, instance, **kwargs):
+    listing_id = instance.pk
+    transaction.on_commit(lambda: search.unindex_listing(listing_id))
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    property_id, rating = getattr(instance, '_loaded_rating', (None, None))
+    if property_id is None or rating is None:
+        previous = Review.objects.filter(pk=instance.pk).values_list('property_id', 'rating').first()
+        property_id, rating = previous or (None, None)
+    instance._previous_rating = (property_id, rating)
+
+
+@receiver(post_save, sender=Review)
+def add_rating(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created:
+        property_id, rating = getattr(instance, '_previous_rating', (None, None))
+        if property_id == instance.property_id and rating == instance.rating:
+            # Only the text changed; the listing still renders differently with its reviews expanded.
+            Listing.objects.touch(instance.property_id)
+            bump_listing_version(instance.property_id)
+            return
+        if property_id is not None:
+            Listing.objects.apply_review_delta(property_id, -1, -rating)
+            bump_listing_version(property_id)
+    Listing.objects.apply_review_delta(instance.property_id, 1, instance.rating)
+    bump_listing_version(instance.property_id)
+    instance._loaded_rating = (instance.property_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating(sender, instance, **kwargs):
+    Listing.objects.apply_review_delta(instance.property_id, -1, -instance.rating)
+    bump_listing_version(instance.property_id)
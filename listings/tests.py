@@ -1,3 +1,1675 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from base64 import urlsafe_b64encode
+import csv
+import json
+from io import StringIO
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from .async_views import AsyncInitiatePaymentView, AsyncVerifyPaymentView
+from .chapa import AsyncChapaClient, ChapaClient, ChapaError, CircuitBreaker, CircuitOpenError
+from .chapa_stub import StubChapaGateway
+from . import archive, chapa, exports, ids, reservations, routing, search, verification
+from .fastpath import get_mapper
+from .renderers import FastJSONRenderer
+from .serializers import BookingSerializer
+from .instrumentation import histograms
+from .management.commands.benchmark import QUERY_BUDGETS
+from .models import (
+    User, Listing, Booking, Review, Payment, PaymentVerification, ReplicaHeartbeat, ArchivedBooking, ArchivedPayment,
+)
+
+
+def make_user(username):
+    return User.objects.create(
+        username=username, email=f'{username}@example.com',
+        first_name=username.title(), last_name='Test',
+    )
+
+
+def make_listing(host, name='Listing', location='Malibu, CA', price='100.00'):
+    return Listing.objects.create(
+        host=host, name=name, description=f'{name} description',
+        location=location, pricepernight=Decimal(price),
+    )
+
+
+def make_booking(listing, user, checkin=None, nights=3, status='confirmed'):
+    checkin = checkin or date.today() + timedelta(days=10)
+    return Booking.objects.create(
+        property=listing, user=user, checkin=checkin,
+        checkout=checkin + timedelta(days=nights),
+        total_price=listing.pricepernight * nights, status=status,
+    )
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        # Response cache entries and the search index outlive each test's
+        # rolled-back data.
+        cache.clear()
+        search.reset_index()
+        self.client = APIClient()
+
+
+class QueryCountTests(APITestCase):
+    """The number of queries per page must not grow with the page size."""
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guests = [make_user(f'guest{i}') for i in range(3)]
+
+    def populate(self, count):
+        for i in range(count):
+            listing = make_listing(self.host, name=f'Listing {i}')
+            for guest in self.guests:
+                Review.objects.create(property=listing, user=guest, rating=4, comment='Nice')
+                make_booking(listing, guest)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_listing_list_query_count_is_constant(self):
+        self.populate(2)
+        small = self.count_queries('/api/listings/')
+        self.populate(10)
+        large = self.count_queries('/api/listings/')
+        self.assertEqual(small, large)
+
+    def test_booking_list_query_count_is_constant(self):
+        self.populate(2)
+        small = self.count_queries('/api/bookings/')
+        self.populate(10)
+        large = self.count_queries('/api/bookings/')
+        self.assertEqual(small, large)
+
+    def test_expanded_listing_list_query_count_is_constant(self):
+        self.populate(2)
+        small = self.count_queries('/api/listings/?expand=reviews')
+        self.populate(10)
+        large = self.count_queries('/api/listings/?expand=reviews')
+        self.assertEqual(small, large)
+
+    def test_review_count_is_rendered(self):
+        self.populate(1)
+        response = self.client.get('/api/listings/?expand=reviews')
+        row = response.json()['results'][0]
+        self.assertEqual(row['review_count'], 3)
+        self.assertEqual(len(row['reviews']), 3)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.listings = [make_listing(self.host, name=f'Listing {i}') for i in range(45)]
+
+    def test_page_number_paging_is_the_default(self):
+        body = self.client.get('/api/listings/').json()
+        self.assertEqual(body['count'], 45)
+        self.assertIn('page=2', body['next'])
+
+    def test_cursor_paging_walks_every_row_once(self):
+        seen = []
+        url = '/api/listings/?pagination=cursor'
+        while url:
+            body = self.client.get(url).json()
+            self.assertNotIn('count', body)
+            seen.extend(row['listing_id'] for row in body['results'])
+            url = body['next']
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(set(seen), {str(listing.listing_id) for listing in self.listings})
+
+    def test_cursor_page_skips_count_query(self):
+        first = self.client.get('/api/listings/?pagination=cursor').json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first['next'])
+        self.assertFalse(any('COUNT(*)' in q['sql'] for q in ctx.captured_queries))
+
+
+class AvailabilitySearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.checkin = date.today() + timedelta(days=10)
+        self.free = make_listing(self.host, name='Free', price='120.00')
+        self.booked = make_listing(self.host, name='Booked', price='120.00')
+        self.canceled = make_listing(self.host, name='Canceled', price='120.00')
+        self.elsewhere = make_listing(self.host, name='Elsewhere', location='Aspen, CO', price='120.00')
+        self.pricey = make_listing(self.host, name='Pricey', price='900.00')
+        make_booking(self.booked, self.guest, checkin=self.checkin - timedelta(days=1), nights=3)
+        make_booking(self.canceled, self.guest, checkin=self.checkin, nights=3, status='canceled')
+        # Checks out on the search checkin day, so it does not overlap.
+        make_booking(self.free, self.guest, checkin=self.checkin - timedelta(days=3), nights=3)
+
+    def search(self, **params):
+        params.setdefault('checkin', self.checkin.isoformat())
+        params.setdefault('checkout', (self.checkin + timedelta(days=2)).isoformat())
+        response = self.client.get('/api/listings/available/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['name'] for row in response.json()['results']}
+
+    def test_excludes_listings_with_overlapping_active_bookings(self):
+        self.assertEqual(self.search(), {'Free', 'Canceled', 'Elsewhere', 'Pricey'})
+
+    def test_filters_by_location_and_price(self):
+        self.assertEqual(self.search(location='Malibu', max_price='500'), {'Free', 'Canceled'})
+
+    def test_rejects_inverted_range(self):
+        response = self.client.get('/api/listings/available/', {
+            'checkin': self.checkin.isoformat(), 'checkout': self.checkin.isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class RatingAggregateTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guests = [make_user(f'guest{i}') for i in range(3)]
+        self.listing = make_listing(self.host)
+
+    def assertRatings(self, listing, count, total):
+        listing.refresh_from_db()
+        self.assertEqual((listing.review_count, listing.rating_sum), (count, total))
+        self.assertAlmostEqual(listing.avg_rating, total / count if count else 0)
+
+    def test_create_update_delete_keep_aggregates_in_sync(self):
+        first = Review.objects.create(property=self.listing, user=self.guests[0], rating=5, comment='Great')
+        Review.objects.create(property=self.listing, user=self.guests[1], rating=2, comment='Meh')
+        self.assertRatings(self.listing, 2, 7)
+
+        first.rating = 3
+        first.save()
+        self.assertRatings(self.listing, 2, 5)
+
+        reloaded = Review.objects.get(pk=first.pk)
+        reloaded.rating = 4
+        reloaded.save()
+        self.assertRatings(self.listing, 2, 6)
+
+        reloaded.delete()
+        self.assertRatings(self.listing, 1, 2)
+
+    def test_moving_a_review_updates_both_listings(self):
+        other = make_listing(self.host, name='Other')
+        review = Review.objects.create(property=self.listing, user=self.guests[0], rating=4, comment='Ok')
+        review.property = other
+        review.save()
+        self.assertRatings(self.listing, 0, 0)
+        self.assertRatings(other, 1, 4)
+
+    def test_listing_save_does_not_overwrite_aggregates(self):
+        stale = Listing.objects.get(pk=self.listing.pk)
+        Review.objects.create(property=self.listing, user=self.guests[0], rating=5, comment='Great')
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertRatings(self.listing, 1, 5)
+
+    def test_rebuild_ratings_command(self):
+        Review.objects.create(property=self.listing, user=self.guests[0], rating=5, comment='Great')
+        Review.objects.create(property=self.listing, user=self.guests[1], rating=3, comment='Ok')
+        Listing.objects.update(review_count=0, rating_sum=0, avg_rating=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRatings(self.listing, 2, 8)
+
+    def test_filter_and_sort_by_rating(self):
+        other = make_listing(self.host, name='Other')
+        Review.objects.create(property=self.listing, user=self.guests[0], rating=3, comment='Ok')
+        Review.objects.create(property=other, user=self.guests[0], rating=5, comment='Great')
+        body = self.client.get('/api/listings/?ordering=-avg_rating').json()
+        self.assertEqual([row['name'] for row in body['results']], ['Other', 'Listing'])
+        body = self.client.get('/api/listings/?min_rating=4').json()
+        self.assertEqual([row['name'] for row in body['results']], ['Other'])
+        self.assertEqual(self.client.get('/api/listings/?min_rating=abc').status_code, 400)
+
+
+class ResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.listing = make_listing(self.host)
+        self.url = f'/api/listings/{self.listing.pk}/'
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['name'], 'Listing')
+
+    def test_listing_write_invalidates_detail_and_list(self):
+        self.client.get(self.url)
+        self.client.get('/api/listings/')
+        self.listing.name = 'Renamed'
+        self.listing.save()
+        self.assertEqual(self.client.get(self.url).json()['name'], 'Renamed')
+        self.assertEqual(self.client.get('/api/listings/').json()['results'][0]['name'], 'Renamed')
+
+    def test_review_write_invalidates_listing(self):
+        self.client.get(self.url)
+        Review.objects.create(property=self.listing, user=self.guest, rating=5, comment='Great')
+        self.assertEqual(self.client.get(self.url).json()['review_count'], 1)
+
+    def test_other_listings_stay_cached(self):
+        other = make_listing(self.host, name='Other')
+        self.client.get(self.url)
+        other.name = 'Renamed'
+        other.save()
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+    def test_stats_endpoint_requires_staff(self):
+        self.assertEqual(self.client.get('/api/listings/cache-stats/').status_code, 403)
+        admin = make_user('admin')
+        admin.is_staff = True
+        admin.save()
+        self.client.force_authenticate(admin)
+        stats = self.client.get('/api/listings/cache-stats/').json()
+        self.assertEqual(set(stats), {'hits', 'misses', 'hit_ratio'})
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.listing = make_listing(self.host)
+        self.booking = make_booking(self.listing, self.guest)
+        self.url = f'/api/listings/{self.listing.pk}/'
+
+    def test_detail_sends_validators_and_answers_304(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+        modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(modified.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        list_etag = self.client.get('/api/listings/')['ETag']
+        self.assertNotEqual(self.client.get('/api/listings/?ordering=pricepernight')['ETag'], list_etag)
+
+        self.listing.name = 'Renamed'
+        self.listing.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/listings/')['ETag'], list_etag)
+
+        list_etag = self.client.get('/api/listings/')['ETag']
+        make_listing(self.host, name='Gone').delete()
+        self.assertEqual(self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        other = make_listing(self.host, name='Other')
+        list_etag = self.client.get('/api/listings/')['ETag']
+        other.delete()
+        self.assertEqual(self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_review_edits_change_expanded_listing(self):
+        review = Review.objects.create(property=self.listing, user=self.guest, rating=4, comment='Good')
+        url = f'{self.url}?expand=reviews'
+        etag = self.client.get(url)['ETag']
+        review.comment = 'Very good'
+        review.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['reviews'][0]['comment'], 'Very good')
+
+    def test_booking_304_skips_serialization(self):
+        for url in ['/api/bookings/', f'/api/bookings/{self.booking.pk}/']:
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0 if url == '/api/bookings/' else 1):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Bookings embed their listing.
+            self.listing.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_booking_writes_change_the_list_etag(self):
+        url = '/api/bookings/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Deleting the newest booking leaves MAX(updated_at) unchanged.
+        older = make_booking(self.listing, self.guest, checkin=date(2030, 1, 1))
+        self.booking.save()
+        etag = self.client.get(url)['ETag']
+        older.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        reservations.create_bookings([{
+            'property': str(self.listing.pk), 'checkin': '2031-01-01', 'checkout': '2031-01-03',
+        }], self.guest)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unknown_objects_are_not_found(self):
+        self.assertEqual(self.client.get('/api/listings/not-a-uuid/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/bookings/{self.listing.pk}/').status_code, 404)
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.listing = make_listing(self.host)
+        Review.objects.create(property=self.listing, user=self.guest, rating=5, comment='Great')
+        self.booking = make_booking(self.listing, self.guest)
+
+    def test_reviews_are_only_embedded_on_request(self):
+        row = self.client.get('/api/listings/').json()['results'][0]
+        self.assertNotIn('reviews', row)
+        self.assertIn('host', row)
+        detail = self.client.get(f'/api/listings/{self.listing.pk}/').json()
+        self.assertNotIn('reviews', detail)
+        detail = self.client.get(f'/api/listings/{self.listing.pk}/?expand=reviews').json()
+        self.assertEqual(len(detail['reviews']), 1)
+
+    def test_fields_limits_output_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/listings/?fields=listing_id,name')
+        self.assertEqual(set(response.json()['results'][0]), {'listing_id', 'name'})
+        listing_query = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('"description"', listing_query)
+        self.assertNotIn('listings_user', listing_query)
+
+    def test_nested_fields_and_expand_on_bookings(self):
+        response = self.client.get('/api/bookings/?fields=booking_id,duration_nights,property.name')
+        row = response.json()['results'][0]
+        self.assertEqual(row, {
+            'booking_id': str(self.booking.pk), 'duration_nights': 3, 'property': {'name': 'Listing'},
+        })
+        row = self.client.get('/api/bookings/').json()['results'][0]
+        self.assertNotIn('reviews', row['property'])
+        row = self.client.get('/api/bookings/?expand=property.reviews').json()['results'][0]
+        self.assertEqual(len(row['property']['reviews']), 1)
+
+    def test_nested_fields_reach_hosts_guests_and_reviews(self):
+        row = self.client.get('/api/listings/?fields=name,host.username').json()['results'][0]
+        self.assertEqual(row, {'name': 'Listing', 'host': {'username': 'host'}})
+
+        url = f'/api/listings/{self.listing.pk}/?fields=reviews.rating,reviews.user.username'
+        detail = self.client.get(url).json()
+        self.assertEqual(detail, {'reviews': [{'rating': 5, 'user': {'username': 'guest'}}]})
+
+        row = self.client.get('/api/bookings/?fields=user.email,property.host.user_id').json()['results'][0]
+        self.assertEqual(row, {
+            'user': {'email': 'guest@example.com'}, 'property': {'host': {'user_id': str(self.host.pk)}},
+        })
+
+
+class ListingReviewsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.listing = make_listing(self.host)
+        self.other = make_listing(self.host, name='Other')
+        for i in range(45):
+            Review.objects.create(
+                property=self.listing, user=make_user(f'guest{i}'), rating=i % 5 + 1, comment=f'Review {i}',
+            )
+        Review.objects.create(property=self.other, user=self.host, rating=1, comment='Elsewhere')
+        self.url = f'/api/listings/{self.listing.pk}/reviews/'
+
+    def walk(self, url):
+        rows = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            rows.extend(body['results'])
+            url = body['next']
+        return rows
+
+    def test_pages_through_every_review_newest_first(self):
+        rows = self.walk(self.url)
+        self.assertEqual(len(rows), 45)
+        self.assertEqual(len({row['review_id'] for row in rows}), 45)
+        self.assertEqual([row['created_at'] for row in rows], sorted((row['created_at'] for row in rows), reverse=True))
+
+    def test_sort_by_rating_and_filter(self):
+        rows = self.walk(self.url + '?sort=rating')
+        self.assertEqual(len(rows), 45)
+        self.assertEqual([row['rating'] for row in rows], sorted((row['rating'] for row in rows), reverse=True))
+        rows = self.walk(self.url + '?min_rating=4')
+        self.assertEqual({row['rating'] for row in rows}, {4, 5})
+        self.assertEqual(len(rows), 18)
+
+    def test_page_query_count_is_constant(self):
+        first = self.client.get(self.url).json()
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(first['next'])
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url + '?sort=oldest').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?cursor=garbage').status_code, 404)
+        self.assertEqual(self.client.get('/api/listings/not-a-uuid/reviews/').status_code, 404)
+
+    def test_rejects_tampered_cursors(self):
+        for position, sort in (
+            (['garbage', 'x'], 'newest'),
+            ([1, 2], 'newest'),
+            (['2026-01-01T00:00:00Z', 'not-a-uuid'], 'newest'),
+            (['five', '2026-01-01T00:00:00Z', str(self.listing.pk)], 'rating'),
+        ):
+            cursor = urlsafe_b64encode(json.dumps(position).encode()).decode('ascii')
+            response = self.client.get(f'{self.url}?sort={sort}&cursor={cursor}')
+            self.assertEqual(response.status_code, 404, position)
+
+
+class ListingFacetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        host = make_user('host')
+        for location, price, rating in [
+            ('Malibu, CA', '80.00', 5), ('Malibu, CA', '150.00', 4), ('Malibu, CA', '450.00', 2),
+            ('Aspen, CO', '120.00', 5), ('Aspen, CO', '600.00', 3), ('Boston, MA', '90.00', 0),
+        ]:
+            listing = make_listing(host, location=location, price=price)
+            Listing.objects.filter(pk=listing.pk).update(avg_rating=rating, review_count=int(rating > 0))
+
+    def facets(self, **params):
+        response = self.client.get('/api/listings/', {'facets': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_every_facet_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            facets = self.client.get('/api/listings/', {'facets': 'true', 'page_size': 1}).data['facets']
+        self.assertEqual(sum('GROUP BY' in query['sql'] for query in queries.captured_queries), 1)
+        self.assertEqual(facets['count'], 6)
+        self.assertEqual(facets['location'][0], {'value': 'Malibu, CA', 'count': 3})
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [2, 2, 0, 1, 1])
+        self.assertEqual(facets['price'][-1], {'min': 500, 'max': None, 'count': 1})
+        self.assertEqual([bucket['count'] for bucket in facets['rating']], [3, 4, 5, 5])
+
+    def test_facets_ignore_their_own_filter(self):
+        data = self.facets(location='Malibu', min_rating='4')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['results']), 2)
+        facets = data['facets']
+        # Other locations still show what selecting them would give.
+        self.assertEqual(facets['location'], [
+            {'value': 'Malibu, CA', 'count': 2}, {'value': 'Aspen, CO', 'count': 1},
+        ])
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 1, 0, 0, 0])
+        self.assertEqual([bucket['count'] for bucket in facets['rating']], [2, 2, 3, 3])
+
+    def test_filters_by_price_range(self):
+        data = self.facets(min_price='100', max_price='500')
+        self.assertEqual(data['facets']['count'], 3)
+        self.assertEqual(
+            sorted(Decimal(listing['pricepernight']) for listing in data['results']),
+            [Decimal('120.00'), Decimal('150.00'), Decimal('450.00')],
+        )
+        self.assertEqual(self.client.get('/api/listings/', {'min_price': '5', 'max_price': '1'}).status_code, 400)
+
+    def test_rejects_non_finite_numbers(self):
+        for name in ('min_price', 'max_price', 'min_rating'):
+            for value in ('NaN', 'nan', 'sNaN', 'Infinity', '-inf'):
+                response = self.client.get('/api/listings/', {name: value})
+                self.assertEqual(response.status_code, 400, (name, value))
+
+    def test_counts_are_cached_until_a_listing_changes(self):
+        self.facets()
+        with CaptureQueriesContext(connection) as queries:
+            self.facets(page=1)
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in queries.captured_queries))
+
+        make_listing(Listing.objects.first().host, location='Boston, MA')
+        self.assertEqual(self.facets(page=1)['facets']['count'], 7)
+
+
+class FastPathRenderingTests(APITestCase):
+    """The fast path must render exactly the bytes the serializers and JSONRenderer do."""
+
+    def setUp(self):
+        super().setUp()
+        host = make_user('host')
+        host.first_name = 'Zoë'
+        host.save()
+        guests = [make_user(f'guest{i}') for i in range(3)]
+        guests[0].phone_number = '+251 911'
+        guests[0].save()
+        for i in range(4):
+            listing = make_listing(host, name=f'Chalet \u2028 "{i}"', location='Zürich', price=f'{99 + i}.50')
+            for guest, rating in zip(guests, [5, 4, 4]):
+                Review.objects.create(property=listing, user=guest, rating=rating, comment='Nice')
+            make_booking(listing, guests[i % 3], nights=i + 1)
+
+    def assert_same_bytes(self, url):
+        cache.clear()
+        fast = self.client.get(url)
+        self.assertEqual(fast.status_code, 200, fast.content)
+        cache.clear()
+        with override_settings(FAST_PATH_RENDERING=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.content, JSONRenderer().render(slow.data))
+        return fast
+
+    def test_listing_pages_match(self):
+        response = self.assert_same_bytes('/api/listings/')
+        self.assertIn(b'\\u2028', response.content)
+        self.assert_same_bytes('/api/listings/?ordering=-avg_rating&pagination=cursor&page_size=2')
+        self.assert_same_bytes('/api/listings/?location=z%C3%BC&min_price=100&facets=true')
+        checkin = date.today() + timedelta(days=1)
+        self.assert_same_bytes(
+            f'/api/listings/available/?checkin={checkin}&checkout={checkin + timedelta(days=2)}'
+        )
+
+    def test_booking_pages_match(self):
+        self.assertIsNotNone(get_mapper(BookingSerializer))
+        self.assert_same_bytes('/api/bookings/')
+        self.assert_same_bytes('/api/bookings/?pagination=cursor')
+
+    def test_listing_page_skips_per_row_queries(self):
+        # ETag validators, page count, page rows.
+        with self.assertNumQueries(3):
+            self.client.get('/api/listings/')
+
+    def test_field_selection_uses_the_serializers(self):
+        response = self.client.get('/api/listings/?fields=name,reviews')
+        self.assertEqual(len(response.json()['results'][0]['reviews']), 3)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'naïve \u2029 "quoted"', 'number': 4.333333333333333, 'big': 2 ** 70, 1: None,
+            'when': timezone.now(), 'day': date(2025, 1, 2), 'price': Decimal('10.50'),
+            'id': Listing().pk, 'rows': [{'nested': True}], 'values': (1, 2),
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = 'application/json; indent=2'
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+
+    def test_renderer_matches_json_renderer_on_floats(self):
+        floats = [
+            0.0, -0.0, 4.25, 0.1 + 0.2, 1e-4, 9.999e-5, 1e-5, 1.5e-7, 5e-324, 1e15,
+            9999999999999998.0, 1e16, -1.5e16, 1e22, 1.7976931348623157e308,
+        ]
+        rows = [{'avg_rating': value, 'price': Decimal(repr(value))} for value in floats]
+        for row in rows:
+            self.assertEqual(FastJSONRenderer().render(row), JSONRenderer().render(row))
+        self.assertEqual(FastJSONRenderer().render(rows), JSONRenderer().render(rows))
+        self.assertEqual(FastJSONRenderer().render({2.5: 1, None: 2}), JSONRenderer().render({2.5: 1, None: 2}))
+        for value in [float('nan'), float('inf'), -float('inf')]:
+            with self.assertRaises(ValueError):
+                JSONRenderer().render([{'avg_rating': value}])
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render([{'avg_rating': value}])
+
+
+class ListingSearchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = make_user('host')
+        self.beach = make_listing(self.host, name='Beach house', location='Malibu, CA')
+        self.beach.description = 'Quiet house with an ocean view'
+        self.beach.save()
+        self.cabin = make_listing(self.host, name='Mountain cabin', location='Aspen, CO')
+        self.cabin.description = 'Cosy cabin near the beach trail'
+        self.cabin.save()
+        make_listing(self.host, name='Loft', location='Málaga, Spain')
+        search.build_index()
+
+    def test_normalizes_text(self):
+        self.assertEqual(search.normalize('  Málaga,  SPAIN! '), 'malaga spain')
+        self.assertEqual(search.tokenize('Beach-house #2'), ['beach', 'house', '2'])
+
+    def test_autocompletes_any_word_of_a_location(self):
+        response = self.client.get('/api/listings/autocomplete/', {'q': 'MAL'})
+        self.assertEqual(
+            [match['location'] for match in response.data['results']],
+            ['Malibu, CA', 'Málaga, Spain'],
+        )
+        response = self.client.get('/api/listings/autocomplete/', {'q': 'co'})
+        self.assertEqual(response.data['results'], [{'location': 'Aspen, CO', 'count': 1}])
+
+    def test_ranks_name_matches_above_description_matches(self):
+        response = self.client.get('/api/listings/search/', {'q': 'beach'})
+        self.assertEqual(
+            [result['listing_id'] for result in response.data['results']],
+            [str(self.beach.pk), str(self.cabin.pk)],
+        )
+        self.assertGreater(response.data['results'][0]['score'], response.data['results'][1]['score'])
+
+        response = self.client.get('/api/listings/search/', {'q': 'beach ocean'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(self.client.get('/api/listings/search/').status_code, 400)
+
+    def test_follows_saves_and_deletes(self):
+        index = search.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cabin.name = 'Alpine chalet'
+            self.cabin.save()
+            make_listing(self.host, name='Chalet', location='Zermatt, CH')
+        self.assertEqual(len(index.search('chalet')), 2)
+        self.assertEqual(index.search('mountain'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cabin.delete()
+        self.assertEqual(len(index.search('chalet')), 1)
+        self.assertEqual(index.autocomplete('aspen'), [])
+
+    def test_breaks_ties_in_indexing_order(self):
+        index = search.SearchIndex()
+        matches = []
+        for position in range(30):
+            # Spread the matches out, as on a real index.
+            for _ in range(position * 7):
+                index.update(uuid.uuid4(), 'Filler', '', 'Nowhere')
+            matches.append(uuid.uuid4())
+            index.update(matches[-1], 'Beach hut', 'Sandy', 'Nowhere')
+        self.assertEqual([pk for pk, _ in index.search('beach', limit=5)], matches[:5])
+        self.assertEqual([pk for pk, _ in index.search('hut sandy', limit=5)], matches[:5])
+
+        # Re-indexed, a listing goes to the back of its ties.
+        index.update(matches[0], 'Beach hut', 'Sandy', 'Nowhere')
+        self.assertEqual([pk for pk, _ in index.search('beach', limit=5)], matches[1:6])
+
+    @override_settings(LISTING_SEARCH_SYNC_INTERVAL=0)
+    def test_syncs_writes_from_other_processes(self):
+        # Changing the setting dropped the index built in setUp.
+        search.build_index()
+        # Neither write fires signals, as if made by another process.
+        Listing.objects.filter(pk=self.beach.pk).update(name='Surf shack', updated_at=timezone.now())
+        Listing.objects.filter(pk=self.cabin.pk).delete()
+        response = self.client.get('/api/listings/search/', {'q': 'surf'})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get('/api/listings/search/', {'q': 'cabin'})
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(search.get_index().search('cabin'), [])
+        self.assertEqual(self.client.get('/api/listings/autocomplete/', {'q': 'aspen'}).data['results'], [])
+
+    def test_answers_503_until_the_index_is_built(self):
+        search.reset_index()
+        with mock.patch.object(search, 'warm_up') as warm_up:
+            response = self.client.get('/api/listings/search/', {'q': 'beach'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        warm_up.assert_called_once()
+
+    def test_warm_up_builds_in_the_background(self):
+        search.reset_index()
+        # The build thread has its own connection, which cannot see this test's rows.
+        with mock.patch.object(search.SearchIndex, 'build', lambda index: index):
+            search.warm_up()
+            search._builder.join(timeout=10)
+        self.assertIsNotNone(search.get_index())
+
+
+class ChapaClientTests(TestCase):
+
+    def setUp(self):
+        self.gateway = StubChapaGateway().start()
+        self.addCleanup(self.gateway.stop)
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault('backoff_factor', 0)
+        client = ChapaClient('test-key', base_url=self.gateway.base_url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_initialize_and_verify(self):
+        client = self.make_client()
+        result = client.initialize({'tx_ref': 'tx-1', 'amount': '10'})
+        self.assertEqual(result['data']['tx_ref'], 'tx-1')
+        self.gateway.transactions['tx-1'] = 'failed'
+        self.assertEqual(client.verify('tx-1')['data']['status'], 'failed')
+
+    def test_verify_is_retried_but_initialize_is_not(self):
+        client = self.make_client(max_retries=2)
+        self.gateway.failures = 2
+        self.assertEqual(client.verify('tx-1')['status'], 'success')
+        self.assertEqual(len(self.gateway.requests), 3)
+
+        self.gateway.failures = 1
+        with self.assertRaises(ChapaError):
+            client.initialize({'tx_ref': 'tx-2'})
+        self.assertEqual(len(self.gateway.requests), 4)
+
+    def test_read_timeout_is_enforced(self):
+        self.gateway.delay = 0.5
+        client = self.make_client(read_timeout=0.05, max_retries=0)
+        with self.assertRaises(ChapaError):
+            client.verify('tx-1')
+
+    def test_circuit_opens_after_repeated_failures(self):
+        now = [0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+        client = self.make_client(max_retries=0, breaker=breaker)
+        self.gateway.failures = 2
+        for _ in range(2):
+            with self.assertRaises(ChapaError):
+                client.verify('tx-1')
+        with self.assertRaises(CircuitOpenError):
+            client.verify('tx-1')
+        self.assertEqual(len(self.gateway.requests), 2)
+
+        now[0] = 31
+        self.assertEqual(client.verify('tx-1')['status'], 'success')
+        self.assertEqual(breaker.state, 'closed')
+
+
+@skipUnless(chapa.httpx, 'httpx is not installed')
+class AsyncChapaClientTests(TestCase):
+
+    def setUp(self):
+        self.gateway = StubChapaGateway().start()
+        self.addCleanup(self.gateway.stop)
+
+    async def test_verify_is_retried_but_initialize_is_not(self):
+        client = AsyncChapaClient('test-key', base_url=self.gateway.base_url, max_retries=2, backoff_factor=0)
+        try:
+            self.gateway.failures = 2
+            self.assertEqual((await client.verify('tx-1'))['status'], 'success')
+            self.assertEqual(len(self.gateway.requests), 3)
+
+            self.gateway.failures = 1
+            with self.assertRaises(ChapaError):
+                await client.initialize({'tx_ref': 'tx-2'})
+            self.assertEqual(len(self.gateway.requests), 4)
+        finally:
+            await client.aclose()
+
+    async def test_connection_limits_reach_the_pool(self):
+        client = AsyncChapaClient('test-key', base_url=self.gateway.base_url, pool_size=7, max_connections=42)
+        try:
+            pool = client.client._transport._pool
+            self.assertEqual((pool._max_connections, pool._max_keepalive_connections), (42, 7))
+        finally:
+            await client.aclose()
+
+    async def test_cancelled_trial_call_releases_the_circuit(self):
+        clock = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: clock[0])
+        breaker.record_failure()
+        clock[0] = 11.0
+        self.gateway.delay = 1
+        client = AsyncChapaClient('test-key', base_url=self.gateway.base_url, breaker=breaker)
+        try:
+            call = asyncio.ensure_future(client.verify('tx-1'))
+            await asyncio.sleep(0.2)
+            self.assertTrue(breaker.trial_in_flight)
+            call.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await call
+            self.assertFalse(breaker.trial_in_flight)
+            self.assertEqual(breaker.state, 'half-open')
+        finally:
+            await client.aclose()
+
+
+class PaymentViewTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.gateway = StubChapaGateway().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(CHAPA_BASE_URL=self.gateway.base_url, CHAPA_RETRY_BACKOFF=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.guest = make_user('guest')
+        self.booking = make_booking(make_listing(make_user('host')), self.guest)
+
+    def test_initiate_creates_pending_payment(self):
+        self.client.force_authenticate(self.guest)
+        response = self.client.post(f'/payments/initiate/{self.booking.pk}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        payment = Payment.objects.get(booking=self.booking)
+        self.assertEqual(payment.status, 'Pending')
+        self.assertIn(payment.transaction_id, response.json()['checkout_url'])
+
+    def test_initiate_reports_gateway_errors(self):
+        self.client.force_authenticate(self.guest)
+        self.gateway.failures = 1
+        response = self.client.post(f'/payments/initiate/{self.booking.pk}/')
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(Payment.objects.exists())
+
+    def make_payment(self, tx_ref):
+        return Payment.objects.create(
+            booking=self.booking, user=self.guest, amount=self.booking.total_price, transaction_id=tx_ref,
+        )
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0)
+    def test_verify_webhook_queues_and_workers_settle(self):
+        payment = self.make_payment('tx-ok')
+        failed = self.make_payment('tx-bad')
+        self.gateway.transactions['tx-bad'] = 'failed'
+        for tx_ref in ['tx-ok', 'tx-bad', 'tx-ok', 'tx-ok']:
+            response = self.client.get(f'/payments/verify/?tx_ref={tx_ref}')
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.gateway.requests, [])
+
+        with self.assertNumQueries(2):
+            verification.get_queue().drain()
+        payment.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((payment.status, failed.status), ('Completed', 'Failed'))
+        # Repeated callbacks for tx-ok were verified once.
+        self.assertEqual(len(self.gateway.requests), 2)
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0, PAYMENT_VERIFICATION_MAX_ATTEMPTS=2)
+    def test_unreachable_gateway_is_retried(self):
+        payment = self.make_payment('tx-ok')
+        self.gateway.failures = 4  # 1 request + 3 retries
+        self.client.get('/payments/verify/?tx_ref=tx-ok')
+        with self.assertLogs('listings.verification', 'WARNING'):
+            verification.get_queue().drain()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'Completed')
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0, PAYMENT_VERIFICATION_MAX_ATTEMPTS=3)
+    def test_rate_limited_and_pending_answers_are_retried(self):
+        limited = self.make_payment('tx-limited')
+        pending = self.make_payment('tx-pending')
+        self.gateway.failure_status = 429
+        self.gateway.failures = 1
+        self.gateway.transactions['tx-pending'] = 'pending'
+        self.client.get('/payments/verify/?tx_ref=tx-limited')
+        self.client.get('/payments/verify/?tx_ref=tx-pending')
+        with self.assertLogs('listings.verification', 'INFO'):
+            verification.get_queue().drain()
+        limited.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual((limited.status, pending.status), ('Completed', 'Pending'))
+        # tx-pending was asked on every attempt, then given up on without failing it.
+        self.assertEqual(sum(path.endswith('tx-pending') for _, path, _ in self.gateway.requests), 3)
+
+    @override_settings(PAYMENT_VERIFICATION_QUEUE='database')
+    def test_database_queue(self):
+        payment = self.make_payment('tx-ok')
+        for _ in range(3):
+            self.client.get('/payments/verify/?tx_ref=tx-ok')
+        self.assertEqual(PaymentVerification.objects.count(), 1)
+        call_command('process_payment_verifications', '--once', stdout=StringIO())
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'Completed')
+        self.assertFalse(PaymentVerification.objects.exists())
+
+    def test_database_queue_claims_rows_before_calling_the_gateway(self):
+        self.make_payment('tx-ok')
+        verification_queue = verification.DatabaseVerificationQueue(max_attempts=2)
+        verification_queue.enqueue('tx-ok')
+
+        def verify_batch(tx_refs):
+            # The claim is committed: no row lock is held during gateway calls.
+            row = PaymentVerification.objects.get(tx_ref='tx-ok')
+            self.assertEqual(row.attempts, 1)
+            self.assertGreater(row.available_at, timezone.now())
+            self.assertFalse(verification_queue.claim())
+            return list(tx_refs)
+
+        with mock.patch.object(verification, 'verify_batch', side_effect=verify_batch):
+            self.assertEqual(verification_queue.process_batch(), 1)
+        row = PaymentVerification.objects.get(tx_ref='tx-ok')
+        self.assertEqual(row.attempts, 1)
+
+        # Gives up after max_attempts.
+        PaymentVerification.objects.update(available_at=timezone.now())
+        with mock.patch.object(verification, 'verify_batch', side_effect=lambda tx_refs: list(tx_refs)):
+            self.assertEqual(verification_queue.process_batch(), 1)
+        self.assertFalse(PaymentVerification.objects.exists())
+
+
+@override_settings(CHAPA_RETRY_BACKOFF=0)
+class AsyncPaymentViewTests(TestCase):
+
+    def setUp(self):
+        self.gateway = StubChapaGateway().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(CHAPA_BASE_URL=self.gateway.base_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.guest = make_user('guest')
+        self.listing = make_listing(make_user('host'))
+        self.booking = make_booking(self.listing, self.guest)
+
+    async def initiate(self, booking, user=None):
+        request = APIRequestFactory().post(f'/payments/initiate/{booking.pk}/')
+        if user is not None:
+            force_authenticate(request, user)
+        return await AsyncInitiatePaymentView.as_view()(request, booking_id=booking.pk)
+
+    async def test_initiate_creates_pending_payment(self):
+        response = await self.initiate(self.booking, self.guest)
+        self.assertEqual(response.status_code, 200, response.content)
+        payment = await Payment.objects.aget(booking=self.booking)
+        self.assertEqual(payment.status, 'Pending')
+        self.assertIn(payment.transaction_id, json.loads(response.content)['checkout_url'])
+
+    async def test_errors_match_the_sync_view(self):
+        response = await self.initiate(self.booking)
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('detail', json.loads(response.content))
+
+        stranger = await sync_to_async(make_user)('stranger')
+        self.assertEqual((await self.initiate(self.booking, stranger)).status_code, 404)
+
+        self.gateway.failures = 1
+        self.assertEqual((await self.initiate(self.booking, self.guest)).status_code, 502)
+        self.assertFalse(await Payment.objects.aexists())
+
+    async def test_slow_gateway_calls_overlap(self):
+        self.gateway.delay = 0.2
+        bookings = [
+            await sync_to_async(make_booking)(self.listing, self.guest, checkin=date.today() + timedelta(days=30 + 5 * i))
+            for i in range(10)
+        ]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(self.initiate(booking, self.guest) for booking in bookings))
+        elapsed = time.perf_counter() - start
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertLess(elapsed, 10 * self.gateway.delay / 2)
+        self.assertEqual(await Payment.objects.acount(), 10)
+
+    async def test_verify_queues_the_transaction(self):
+        with override_settings(PAYMENT_VERIFICATION_QUEUE='database'):
+            response = await AsyncVerifyPaymentView.as_view()(APIRequestFactory().get('/payments/verify/?tx_ref=tx-1'))
+            self.assertEqual(response.status_code, 202)
+            self.assertTrue(await PaymentVerification.objects.filter(tx_ref='tx-1').aexists())
+
+
+class ReconcilePaymentsTests(TestCase):
+
+    def setUp(self):
+        self.gateway = StubChapaGateway().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(CHAPA_BASE_URL=self.gateway.base_url, CHAPA_MAX_RETRIES=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        guest = make_user('guest')
+        booking = make_booking(make_listing(make_user('host')), guest)
+        for i in range(25):
+            Payment.objects.create(booking=booking, user=guest, amount=10, transaction_id=f'tx-{i}')
+        Payment.objects.create(booking=booking, user=guest, amount=10, transaction_id='tx-fresh')
+        Payment.objects.exclude(transaction_id='tx-fresh').update(created_at=date(2020, 1, 1))
+        for i in range(0, 25, 5):
+            self.gateway.transactions[f'tx-{i}'] = 'failed'
+
+    def test_reconciles_stale_pending_payments(self):
+        out = StringIO()
+        call_command('reconcile_payments', '--chunk-size', '10', '--concurrency', '4', stdout=out)
+        statuses = dict(Payment.objects.values_list('transaction_id', 'status'))
+        self.assertEqual(statuses.pop('tx-fresh'), 'Pending')
+        self.assertEqual(sum(status == 'Failed' for status in statuses.values()), 5)
+        self.assertEqual(sum(status == 'Completed' for status in statuses.values()), 20)
+        self.assertIn('25/25 verified', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        call_command('reconcile_payments', '--dry-run', stdout=StringIO())
+        self.assertEqual(Payment.objects.exclude(status='Pending').count(), 0)
+
+    def test_rate_limited_and_pending_answers_leave_payments_pending(self):
+        self.gateway.failure_status = 429
+        self.gateway.failures = 100
+        out = StringIO()
+        call_command('reconcile_payments', '--concurrency', '4', stdout=out)
+        self.assertEqual(Payment.objects.exclude(status='Pending').count(), 0)
+        self.assertIn('unverified 25', out.getvalue())
+
+        self.gateway.failures = 0
+        self.gateway.transactions['tx-1'] = 'pending'
+        self.gateway.transactions['tx-2'] = 'pending'
+        call_command('reconcile_payments', '--concurrency', '4', stdout=StringIO())
+        pending = Payment.objects.filter(status='Pending').values_list('transaction_id', flat=True)
+        self.assertEqual(set(pending), {'tx-fresh', 'tx-1', 'tx-2'})
+
+    def test_never_overwrites_a_settled_payment(self):
+        Payment.objects.filter(transaction_id='tx-0').update(status='Completed')
+        Payment.objects.filter(transaction_id='tx-1').update(status='Failed')
+        self.assertEqual(verification.apply_outcomes({'Failed': ['tx-0', 'tx-2'], 'Completed': ['tx-1']}), 1)
+        statuses = dict(Payment.objects.values_list('transaction_id', 'status'))
+        self.assertEqual((statuses['tx-0'], statuses['tx-1'], statuses['tx-2']), ('Completed', 'Failed', 'Failed'))
+
+    def test_rate_limit_does_not_close_a_half_open_circuit(self):
+        clock = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: clock[0])
+        breaker.record_failure()
+        clock[0] = 11.0
+        self.gateway.failure_status = 429
+        self.gateway.failures = 1
+        client = ChapaClient('test-key', base_url=self.gateway.base_url, max_retries=0, breaker=breaker)
+        with self.assertRaises(ChapaError):
+            client.verify('tx-1')
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertFalse(breaker.trial_in_flight)
+
+
+class BookingBatchTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.guest = make_user('guest')
+        self.client.force_authenticate(self.guest)
+        self.listing = make_listing(make_user('host'))
+        self.start = date.today() + timedelta(days=30)
+
+    def item(self, offset, nights=2, listing=None, **extra):
+        checkin = self.start + timedelta(days=offset)
+        return {
+            'property': str((listing or self.listing).pk),
+            'checkin': checkin.isoformat(),
+            'checkout': (checkin + timedelta(days=nights)).isoformat(),
+            **extra,
+        }
+
+    def post(self, items):
+        return self.client.post('/api/bookings/batch/', items, format='json')
+
+    def test_reports_per_item_results(self):
+        make_booking(self.listing, make_user('other'), checkin=self.start, nights=2)
+        response = self.post([
+            self.item(0),                        # overlaps an existing booking
+            self.item(2),
+            self.item(3),                        # overlaps the previous item
+            self.item(3, status='canceled'),     # canceled bookings hold no dates
+            self.item(10, nights=0),             # invalid dates
+            self.item(20, listing=Listing(pk='00000000-0000-0000-0000-000000000000')),
+        ])
+        self.assertEqual(response.status_code, 200)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['error', 'created', 'error', 'created', 'error', 'error'])
+        self.assertEqual(response.data['created'], 2)
+        self.assertIn('property', response.data['results'][5]['errors'])
+
+        booking = Booking.objects.get(pk=response.data['results'][1]['booking_id'])
+        self.assertEqual(booking.user, self.guest)
+        self.assertEqual(booking.total_price, Decimal('200.00'))
+
+    def test_only_staff_book_for_other_users(self):
+        other = make_user('other')
+        response = self.post([self.item(0, user=str(other.pk))])
+        self.assertEqual(response.data['results'][0]['status'], 'error')
+
+        self.guest.is_staff = True
+        self.guest.save()
+        response = self.post([self.item(0, user=str(other.pk))])
+        self.assertEqual(response.data['results'][0]['status'], 'created')
+        self.assertEqual(Booking.objects.get().user, other)
+
+    def test_large_batch_uses_constant_queries(self):
+        listings = [make_listing(self.listing.host, name=f'Listing {i}') for i in range(10)]
+        items = [self.item(offset * 3, listing=listings[offset % 10]) for offset in range(1000)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(items)
+        self.assertEqual(response.data['created'], 1000)
+        # bulk_create may split the INSERT to stay under the backend's parameter limit.
+        reads = [query for query in queries.captured_queries if not query['sql'].startswith('INSERT')]
+        self.assertLessEqual(len(reads), 5)
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.post({'property': 'x'}).status_code, 400)
+        with override_settings(BOOKING_BATCH_MAX_SIZE=2):
+            self.assertEqual(self.post([self.item(i * 5) for i in range(3)]).status_code, 400)
+
+
+class ReservationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.guest = make_user('guest')
+        self.client.force_authenticate(self.guest)
+        self.listing = make_listing(make_user('host'))
+        self.checkin = date.today() + timedelta(days=30)
+
+    def book(self, offset=0, nights=2):
+        checkin = self.checkin + timedelta(days=offset)
+        return self.client.post('/api/bookings/', {
+            'property_id': str(self.listing.pk),
+            'checkin': checkin.isoformat(),
+            'checkout': (checkin + timedelta(days=nights)).isoformat(),
+            'total_price': '200.00',
+        }, format='json')
+
+    def test_create_rejects_overlapping_dates(self):
+        self.assertEqual(self.book().status_code, 201)
+        self.assertEqual(self.book(offset=1).status_code, 409)
+        self.assertEqual(self.book(offset=2).status_code, 201)
+        self.assertEqual(Booking.objects.get(checkin=self.checkin).user, self.guest)
+
+    def test_update_cannot_move_onto_booked_dates(self):
+        first = self.book().data['booking_id']
+        self.book(offset=5)
+        moved = (self.checkin + timedelta(days=6)).isoformat()
+        response = self.client.patch(f'/api/bookings/{first}/', {'checkout': moved}, format='json')
+        self.assertEqual(response.status_code, 409)
+        # Changing a booking's own dates does not conflict with itself.
+        moved = (self.checkin + timedelta(days=4)).isoformat()
+        response = self.client.patch(f'/api/bookings/{first}/', {'checkout': moved}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    """
+    Concurrent reservations from several threads, each on its own connection.
+    On sqlite the database itself serializes writers; on MySQL the listing
+    row lock is what keeps the dates exclusive.
+    """
+
+    def test_concurrent_reservations_never_double_book(self):
+        out = StringIO()
+        call_command(
+            'stress_reservations', '--threads', '4', '--listings', '2',
+            '--requests', '60', '--days', '5', stdout=out,
+        )
+        self.assertIn('No double bookings', out.getvalue())
+        self.assertEqual(Listing.objects.count(), 0)
+
+    def test_retries_lock_errors(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('deadlock detected')
+            return 'done'
+
+        with mock.patch.object(reservations, 'RETRY_BACKOFF', 0):
+            self.assertEqual(reservations.run_with_retry(flaky), 'done')
+        self.assertEqual(len(calls), 3)
+
+
+class ExportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        self.client.force_authenticate(self.admin)
+
+        self.host = make_user('host')
+        other_host = make_user('other')
+        guest = make_user('guest')
+        self.listing = make_listing(self.host, name='Beach house')
+        for i in range(5):
+            make_booking(self.listing, guest, status='confirmed' if i % 2 else 'canceled')
+        make_booking(make_listing(other_host), guest)
+        Booking.objects.filter(status='canceled').update(created_at=date(2024, 1, 15))
+
+    def read(self, response):
+        self.assertFalse(response.has_header('Content-Length'))
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_bookings_as_ndjson(self):
+        response = self.client.get('/api/exports/bookings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(list(rows[0]), list(exports.EXPORTS['bookings']['columns']))
+
+    def test_filters_by_host_status_and_date(self):
+        response = self.client.get('/api/exports/bookings/', {'host': self.host.pk, 'status': 'confirmed'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['property_name'] for row in rows}, {'Beach house'})
+
+        response = self.client.get('/api/exports/bookings/', {'since': '2024-01-01', 'until': '2024-01-31'})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual({row['status'] for row in rows}, {'canceled'})
+        self.assertEqual(len(rows), 3)
+
+    @override_settings(TIME_ZONE='America/New_York')
+    def test_date_bounds_are_whole_local_days_on_the_bare_column(self):
+        first, last, after = Booking.objects.filter(status='canceled')[:3]
+        new_york = timezone.get_default_timezone()
+        for booking, moment in [
+            (first, datetime(2024, 1, 1, 0, 0)),
+            (last, datetime(2024, 1, 31, 23, 59, 59)),
+            (after, datetime(2024, 2, 1, 0, 0)),
+        ]:
+            Booking.objects.filter(pk=booking.pk).update(created_at=timezone.make_aware(moment, new_york))
+
+        queryset = exports.export_queryset('bookings', since=date(2024, 1, 1), until=date(2024, 1, 31))
+        self.assertEqual(set(queryset.values_list('pk', flat=True)), {first.pk, last.pk})
+        self.assertIn('"created_at" >=', str(queryset.query))
+
+    def test_streams_listings_as_csv(self):
+        response = self.client.get('/api/exports/listings/', {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(self.read(response).splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['pricepernight'], '100.00')
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/api/exports/users/').status_code, 404)
+        self.assertEqual(self.client.get('/api/exports/bookings/', {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(self.host)
+        self.assertEqual(self.client.get('/api/exports/bookings/').status_code, 403)
+
+    def test_reads_rows_in_keyset_chunks(self):
+        queryset = exports.export_queryset('bookings')
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exports.iter_rows('bookings', queryset, chunk_size=2))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len({row['booking_id'] for row in rows}), 6)
+        self.assertEqual(len(queries), 4)
+
+    def test_command_writes_rows_to_stdout(self):
+        out, err = StringIO(), StringIO()
+        call_command('export_data', 'payments', stdout=out, stderr=err)
+        self.assertEqual(out.getvalue(), '')
+        Payment.objects.create(
+            booking=Booking.objects.first(), user=self.admin, amount=10, transaction_id='tx-1',
+        )
+        call_command('export_data', 'payments', '--output', 'csv', '--chunk-size', '1', stdout=out, stderr=err)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        self.assertIn('Successfully exported 1 payments', err.getvalue())
+
+    def test_command_rejects_a_malformed_host(self):
+        with self.assertRaisesMessage(CommandError, '--host must be a user id'):
+            call_command('export_data', 'bookings', '--host', 'not-a-uuid', stdout=StringIO())
+        out = StringIO()
+        call_command('export_data', 'bookings', '--host', str(self.host.pk), stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+
+class ReadReplicaTests(TransactionTestCase):
+    """Replicas are SQLite snapshots of the test database, so later writes are never replicated."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.host = make_user('host')
+        self.guest = make_user('guest')
+        self.listing = make_listing(self.host, name='Replicated')
+        make_booking(self.listing, self.guest)
+        ReplicaHeartbeat.objects.create(pk=1, beat_at=timezone.now())
+        self.replica = self.add_replica('replica_test')
+        self.fresh = make_listing(self.host, name='Fresh')
+        override = override_settings(DATABASE_REPLICAS=[self.replica])
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def add_replica(self, alias, path=None):
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+            self.addCleanup(os.remove, path)
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            connection.connection.backup(target)
+            target.close()
+        connections.settings[alias] = {**connection.settings_dict, 'NAME': path}
+        patcher = mock.patch.object(type(self), 'databases', type(self).databases | {alias})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        def remove():
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        self.addCleanup(remove)
+        return alias
+
+    def listing_names(self):
+        return {listing['name'] for listing in self.client.get('/api/listings/').json()['results']}
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(self.listing_names(), {'Replicated'})
+        self.assertEqual(self.client.get(f'/api/listings/{self.fresh.pk}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/listings/{self.listing.pk}/').status_code, 200)
+
+        admin = make_user('admin')
+        admin.is_staff = True
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/exports/listings/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Replicated'])
+
+    def test_writers_read_from_the_primary(self):
+        self.client.force_authenticate(self.guest)
+        checkin = date.today() + timedelta(days=30)
+        response = self.client.post('/api/bookings/', {
+            'property_id': str(self.fresh.pk),
+            'checkin': checkin.isoformat(),
+            'checkout': (checkin + timedelta(days=2)).isoformat(),
+            'total_price': '200.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('primary_pin', response.cookies)
+        self.assertEqual(self.client.get('/api/bookings/').json()['count'], 2)
+
+        # Pinned per user too, for clients without the cookie.
+        other_device = APIClient()
+        other_device.force_authenticate(self.guest)
+        self.assertEqual(other_device.get('/api/bookings/').json()['count'], 2)
+        self.assertEqual(APIClient().get('/api/bookings/').json()['count'], 1)
+
+    def test_lagging_or_failing_replicas_fall_back_to_the_primary(self):
+        ReplicaHeartbeat.objects.using(self.replica).update(beat_at=timezone.now() - timedelta(minutes=1))
+        with self.assertLogs('listings.routing', 'WARNING'):
+            self.assertEqual(self.listing_names(), {'Replicated', 'Fresh'})
+        self.assertFalse(routing.get_replicas().status()[self.replica]['healthy'])
+
+        broken = self.add_replica('replica_broken', path='/nonexistent/replica.sqlite3')
+        with override_settings(DATABASE_REPLICAS=[broken]):
+            with self.assertLogs('listings.routing', 'WARNING'):
+                self.assertIsNone(routing.get_replicas().choose())
+            self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+
+
+class TimeOrderedIdTests(APITestCase):
+
+    def test_uuid7_keys_are_version_7_and_increase(self):
+        keys = [ids.uuid7() for _ in range(10000)]
+        self.assertEqual({key.version for key in keys}, {7})
+        self.assertEqual({key.variant for key in keys}, {uuid.RFC_4122})
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertAlmostEqual(keys[-1].int >> 80, time.time() * 1000, delta=5000)
+
+    def test_new_rows_get_time_ordered_keys_when_enabled(self):
+        host = make_user('host')
+        old = make_listing(host, name='Old')
+        self.assertEqual(old.pk.version, 4)
+        with override_settings(TIME_ORDERED_IDS=True):
+            new = make_listing(host, name='New')
+            booking = make_booking(new, host)
+        self.assertEqual(new.pk.version, 7)
+        self.assertEqual(booking.pk.version, 7)
+
+        # Both kinds of keys are served and looked up the same way.
+        listings = self.client.get('/api/listings/').json()['results']
+        self.assertEqual({listing['listing_id'] for listing in listings}, {str(old.pk), str(new.pk)})
+        self.assertEqual(self.client.get(f'/api/listings/{new.pk}/').status_code, 200)
+
+
+class ArchiveTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.guest = make_user('guest')
+        self.listing = make_listing(make_user('host'))
+        old = date.today() - timedelta(days=200)
+        self.completed = make_booking(self.listing, self.guest, checkin=old, status='completed')
+        self.canceled = make_booking(self.listing, self.guest, checkin=old + timedelta(days=5), status='canceled')
+        self.unpaid = make_booking(self.listing, self.guest, checkin=old + timedelta(days=10), status='completed')
+        self.confirmed = make_booking(self.listing, self.guest, checkin=old + timedelta(days=15))
+        self.recent = make_booking(self.listing, self.guest, checkin=date.today() - timedelta(days=5), status='completed')
+        self.payment = self.pay(self.completed, 'Completed')
+        self.pay(self.unpaid, 'Pending')
+
+    def pay(self, booking, status):
+        return Payment.objects.create(
+            booking=booking, user=self.guest, amount=booking.total_price,
+            transaction_id=f'tx-{booking.pk}', status=status,
+        )
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_bookings', '--older-than', '90', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_settled_bookings_with_their_payments(self):
+        self.assertIn('2 bookings', self.archive('--dry-run'))
+        self.assertEqual(ArchivedBooking.objects.count(), 0)
+
+        self.assertIn('archived 2 bookings and 1 payments', self.archive('--batch-size', '1'))
+        self.assertEqual(
+            set(ArchivedBooking.objects.values_list('pk', flat=True)), {self.completed.pk, self.canceled.pk},
+        )
+        self.assertEqual(
+            set(Booking.objects.values_list('pk', flat=True)), {self.unpaid.pk, self.confirmed.pk, self.recent.pk},
+        )
+        archived = ArchivedBooking.objects.get(pk=self.completed.pk)
+        self.assertEqual(
+            (archived.property_id, archived.user_id, archived.total_price, archived.created_at),
+            (self.listing.pk, self.guest.pk, self.completed.total_price, self.completed.created_at),
+        )
+        self.assertEqual(list(archived.payments.values_list('pk', flat=True)), [self.payment.pk])
+        self.assertFalse(Payment.objects.filter(pk=self.payment.pk).exists())
+
+        # Deleting an archived booking takes its payments along.
+        archived.delete()
+        self.assertFalse(ArchivedPayment.objects.exists())
+
+    def test_skips_bookings_that_changed_since_selection(self):
+        self.pay(self.canceled, 'Pending')
+        cutoff = archive.archive_cutoff(90)
+        self.assertEqual(archive.archive_bookings([self.completed.pk, self.canceled.pk], cutoff), (1, 1))
+        self.assertTrue(Booking.objects.filter(pk=self.canceled.pk).exists())
+
+    def test_bookings_api_includes_archived_bookings_on_request(self):
+        self.archive()
+        self.assertEqual(self.client.get('/api/bookings/').json()['count'], 3)
+        self.assertEqual(self.client.get(f'/api/bookings/{self.completed.pk}/').status_code, 404)
+
+        body = self.client.get('/api/bookings/?include_archived=true').json()
+        self.assertEqual(body['count'], 5)
+        expected = sorted(
+            [self.completed, self.canceled, self.unpaid, self.confirmed, self.recent],
+            key=lambda booking: (booking.created_at, booking.pk), reverse=True,
+        )
+        self.assertEqual([row['booking_id'] for row in body['results']], [str(booking.pk) for booking in expected])
+        archived = {row['booking_id']: row['archived'] for row in body['results']}
+        self.assertTrue(archived[str(self.completed.pk)])
+        self.assertFalse(archived[str(self.recent.pk)])
+        self.assertEqual(body['results'][0]['property']['listing_id'], str(self.listing.pk))
+
+        response = self.client.get(f'/api/bookings/{self.completed.pk}/?include_archived=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'completed')
+        revalidated = self.client.get(
+            f'/api/bookings/{self.completed.pk}/?include_archived=true', HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get('/api/bookings/?include_archived=true&pagination=cursor').status_code, 400)
+
+    def test_archived_list_answers_conditional_requests(self):
+        self.archive()
+        url = '/api/bookings/?include_archived=true'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], self.client.get('/api/bookings/')['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # Archiving changes the combined list's tag, though it lists the same rows.
+        Booking.objects.filter(pk=self.recent.pk).update(checkout=date.today() - timedelta(days=100))
+        self.archive()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class ApiDocsTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'openapi.json')
+        settings_override = override_settings(API_SCHEMA_PATH=self.path, API_DOCS=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_serves_the_generated_schema(self):
+        self.assertEqual(self.client.get('/openapi.json').status_code, 404)
+
+        out = StringIO()
+        call_command('generate_openapi_schema', stdout=out)
+        self.assertIn(self.path, out.getvalue())
+        response = self.client.get('/openapi.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/api/listings/', response.json()['paths'])
+        self.assertEqual(self.client.get('/openapi.json', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_builds_the_schema_when_docs_are_enabled(self):
+        with override_settings(API_DOCS=True):
+            response = self.client.get('/openapi.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(self.path))
+
+
+@override_settings(PERFORMANCE_INSTRUMENTATION=True)
+class PerformanceInstrumentationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        histograms.reset()
+        self.host = make_user('host')
+        self.listing = make_listing(self.host)
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';', 1)[0].strip(), part.split(';', 1)[1])
+            for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_reports_queries_and_timings_in_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/listings/{self.listing.pk}/')
+        self.assertEqual(response.status_code, 200)
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'serializer', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+
+    def test_logs_one_line_per_request(self):
+        with self.assertLogs('listings.performance', level='INFO') as logs:
+            self.client.get('/api/listings/')
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertIn('endpoint="GET listing-list"', record.getMessage())
+        self.assertEqual(record.performance['status'], 200)
+        self.assertGreater(record.performance['queries'], 0)
+
+    def test_metrics_endpoint_reports_percentiles(self):
+        for _ in range(3):
+            self.client.get('/api/listings/')
+        admin = make_user('admin')
+        admin.is_staff = True
+        admin.save()
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/metrics/')
+        self.assertTrue(response.data['enabled'])
+        endpoint = response.data['endpoints']['GET listing-list']
+        self.assertEqual(endpoint['count'], 3)
+        self.assertEqual(set(endpoint['total_ms']), {'p50', 'p95', 'p99'})
+        self.assertLessEqual(endpoint['db_ms']['p50'], endpoint['total_ms']['p50'])
+
+        self.client.force_authenticate(self.host)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(PERFORMANCE_INSTRUMENTATION=False)
+    def test_disabled_by_default(self):
+        response = self.client.get('/api/listings/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(histograms.snapshot(), {})
+
+
+class BenchmarkTests(TestCase):
+
+    def test_api_benchmark_stays_within_query_budgets(self):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command(
+            'benchmark', 'api', '--listings', '20', '40', '--repeat', '2', '--json', path, '--label', 'test',
+            stdout=StringIO(),
+        )
+        with open(path) as results:
+            report = json.load(results)
+        self.assertEqual(report['label'], 'test')
+        self.assertEqual([run['listings'] for run in report['runs']], [20, 40])
+        for run in report['runs']:
+            self.assertEqual(set(run['results']), set(QUERY_BUDGETS))
+            for name, summary in run['results'].items():
+                self.assertLessEqual(summary['queries'], QUERY_BUDGETS[name], name)
+        # Everything generated is rolled back.
+        self.assertFalse(Listing.objects.exists())
+
+    def test_gateway_benchmark_overlaps_gateway_waits_under_asgi(self):
+        out = StringIO()
+        call_command(
+            'benchmark', 'gateway', '--listings', '5', '--concurrency', '16', '--wsgi-threads', '2',
+            '--gateway-delay', '0.2', stdout=out,
+        )
+        per_second = {
+            line.split(':')[0]: float(line.split('per_second=')[1].split(',')[0])
+            for line in out.getvalue().splitlines() if line.startswith('gateway.')
+        }
+        self.assertGreater(per_second['gateway.asgi'], per_second['gateway.wsgi'])
+        self.assertEqual(Payment.objects.count(), 0)
+
+    def test_inserts_benchmark_compares_key_kinds(self):
+        out = StringIO()
+        call_command('benchmark', 'inserts', '--listings', '5', '--rows', '2000', stdout=out)
+        self.assertIn('inserts.uuid4: rows=2000', out.getvalue())
+        self.assertIn('inserts.uuid7: rows=2000', out.getvalue())
+        self.assertFalse(Booking.objects.exists())
+
+
+class FastSeedTests(TestCase):
+
+    def seed(self, *args):
+        call_command(
+            'seed', '--fast', '--seed', '42', '--users', '12', '--listings', '20',
+            '--bookings', '150', '--reviews', '60', '--batch-size', '50', *args, stdout=StringIO(),
+        )
+
+    def test_creates_requested_rows_with_consistent_ratings(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(Listing.objects.count(), 20)
+        self.assertEqual(Booking.objects.count(), 150)
+        self.assertEqual(Review.objects.count(), 60)
+        self.assertFalse(Booking.objects.filter(user=F('property__host')).exists())
+        self.assertEqual(sum(Listing.objects.values_list('review_count', flat=True)), 60)
+
+    def test_same_seed_reproduces_the_same_rows(self):
+        self.seed()
+        first = sorted(Booking.objects.values_list('booking_id', 'property_id', 'user_id', 'checkin'))
+        self.seed('--clear')
+        second = sorted(Booking.objects.values_list('booking_id', 'property_id', 'user_id', 'checkin'))
+        self.assertEqual(first, second)
+
+    @override_settings(TIME_ORDERED_IDS=True)
+    def test_uses_time_ordered_keys_when_enabled(self):
+        self.seed()
+        for model in [User, Listing, Booking, Review]:
+            self.assertEqual({pk.version for pk in model.objects.values_list('pk', flat=True)}, {7})
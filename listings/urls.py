@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ListingViewSet, BookingViewSet, InitiatePaymentView, VerifyPaymentView 
+from .views import ListingViewSet, BookingViewSet, ExportView, PerformanceMetricsView, InitiatePaymentView, VerifyPaymentView 
+from .async_views import AsyncInitiatePaymentView, AsyncVerifyPaymentView
+
+# Under ASGI (see asgi.py) payments await the Chapa gateway without holding a thread.
+if settings.ASYNC_PAYMENT_VIEWS:
+    InitiatePaymentView, VerifyPaymentView = AsyncInitiatePaymentView, AsyncVerifyPaymentView
 
 router = DefaultRouter()
 router.register(r'listings', ListingViewSet)
@@ -8,6 +14,8 @@ router.register(r'bookings', BookingViewSet)
 
 urlpatterns = [
     path('api/', include(router.urls)),
-    path('payments/initiate/<int:booking_id>/', InitiatePaymentView.as_view(), name="initiate-payment"),
+    path('api/exports/<str:resource>/', ExportView.as_view(), name="export"),
+    path('api/metrics/', PerformanceMetricsView.as_view(), name="performance-metrics"),
+    path('payments/initiate/<uuid:booking_id>/', InitiatePaymentView.as_view(), name="initiate-payment"),
     path('payments/verify/', VerifyPaymentView.as_view(), name="verify-payment"),
 ]
@@ -0,0 +1,270 @@
+"""
+Asynchronous Chapa payment verification.
+
+The verify webhook only enqueues the tx_ref and returns. Workers drain the
+queue in batches: each transaction is verified against the gateway and the
+outcomes are written with one ``UPDATE ... WHERE transaction_id IN (...)``
+per status. A tx_ref that is already queued is not queued again, so callback
+storms for the same payment cost a single verification.
+
+Two queues are available through ``PAYMENT_VERIFICATION_QUEUE``:
+
+* ``inprocess`` (default): a thread-safe queue drained by worker threads in
+  the web process. Queued work is lost if the process exits; the
+  reconcile_payments command picks those payments up later.
+* ``database``: rows in PaymentVerification, drained by the
+  process_payment_verifications command from any number of processes.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import chapa
+from .models import Payment, PaymentVerification
+
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CHUNK_SIZE = 500
+
+
+def payment_status(result):
+    """
+    Map a Chapa verify response onto a Payment status, or None unless the
+    gateway reported the transaction as definitely succeeded or failed (a
+    pending transaction, an error body, an unknown tx_ref).
+    """
+    data = result.get('data') or {}
+    if result.get('status') != 'success':
+        return None
+    return {'success': 'Completed', 'failed': 'Failed'}.get(data.get('status'))
+
+
+def apply_outcomes(outcomes):
+    """
+    Write {status: [tx_ref, ...]} with one UPDATE per status and chunk.
+    Only Pending payments change: one settled since it was picked up (e.g.
+    by a webhook during a reconcile run) keeps its status.
+    """
+    updated = 0
+    for new_status, tx_refs in outcomes.items():
+        for start in range(0, len(tx_refs), UPDATE_CHUNK_SIZE):
+            chunk = tx_refs[start:start + UPDATE_CHUNK_SIZE]
+            updated += Payment.objects.filter(transaction_id__in=chunk, status='Pending').update(status=new_status)
+    return updated
+
+
+def verify_batch(tx_refs, client=None):
+    """
+    Verify transactions against Chapa and apply the outcomes.
+
+    Returns the tx_refs the gateway gave no definitive answer for (errors,
+    rate limits, transactions still pending), to be retried.
+    """
+    client = client or chapa.get_client()
+    outcomes = {'Completed': [], 'Failed': []}
+    unverified = []
+    for tx_ref in dict.fromkeys(tx_refs):
+        try:
+            result = client.verify(tx_ref)
+        except chapa.ChapaError as exc:
+            logger.warning('Could not verify %s: %s', tx_ref, exc)
+            unverified.append(tx_ref)
+            continue
+        new_status = payment_status(result)
+        if new_status is None:
+            logger.info('No definitive status for %s yet: %s', tx_ref, result)
+            unverified.append(tx_ref)
+            continue
+        outcomes[new_status].append(tx_ref)
+    apply_outcomes(outcomes)
+    return unverified
+
+
+class InProcessVerificationQueue:
+    def __init__(self, workers=2, batch_size=100, batch_wait=0.05, max_attempts=5, retry_delay=1.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def enqueue(self, tx_ref):
+        """Queue a transaction; returns False if it is already waiting."""
+        with self._lock:
+            if tx_ref in self._pending:
+                return False
+            self._pending.add(tx_ref)
+        self._queue.put((tx_ref, 0))
+        self._start_workers()
+        return True
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _start_workers(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name='payment-verification', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self, block):
+        batch = []
+        try:
+            batch.append(self._queue.get(block=block))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get(timeout=self.batch_wait) if block else self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _process(self, batch):
+        unverified = set(verify_batch([tx_ref for tx_ref, _ in batch]))
+        with self._lock:
+            for tx_ref, attempts in batch:
+                if tx_ref in unverified and attempts + 1 < self.max_attempts:
+                    self._queue.put((tx_ref, attempts + 1))
+                else:
+                    if tx_ref in unverified:
+                        logger.error('Giving up on verifying %s after %d attempts', tx_ref, attempts + 1)
+                    self._pending.discard(tx_ref)
+        return unverified
+
+    def _work(self):
+        while True:
+            batch = self._next_batch(block=True)
+            try:
+                unverified = self._process(batch)
+            except Exception:
+                logger.exception('Payment verification batch failed')
+                with self._lock:
+                    self._pending.difference_update(tx_ref for tx_ref, _ in batch)
+                unverified = True
+            finally:
+                close_old_connections()
+            if unverified:
+                time.sleep(self.retry_delay)
+
+    def drain(self):
+        """Process everything queued right now in the calling thread."""
+        processed = 0
+        for _ in range(self.max_attempts):
+            batch = self._next_batch(block=False)
+            while batch:
+                self._process(batch)
+                processed += len(batch)
+                batch = self._next_batch(block=False)
+            if not len(self):
+                break
+        return processed
+
+
+class DatabaseVerificationQueue:
+    """
+    Rows are claimed in a short transaction that pushes their available_at
+    ``claim_timeout`` seconds ahead, so the gateway is called with no
+    transaction open and no row locked: webhooks enqueueing the same tx_ref
+    never wait on a verification in progress. Rows of a worker that dies are
+    claimed again once the claim runs out.
+    """
+
+    def __init__(self, batch_size=100, max_attempts=5, retry_delay=30, claim_timeout=300):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.claim_timeout = claim_timeout
+
+    def enqueue(self, tx_ref):
+        # The unique tx_ref makes repeated callbacks collapse into one row.
+        PaymentVerification.objects.bulk_create([PaymentVerification(tx_ref=tx_ref)], ignore_conflicts=True)
+        return True
+
+    def __len__(self):
+        return PaymentVerification.objects.count()
+
+    def claim(self):
+        """Due rows, up to batch_size, taken out of other workers' reach; their attempts are counted."""
+        with transaction.atomic():
+            rows = list(
+                PaymentVerification.objects.select_for_update(skip_locked=True)
+                .filter(available_at__lte=timezone.now())
+                .order_by('available_at')[:self.batch_size]
+            )
+            PaymentVerification.objects.filter(pk__in=[row.pk for row in rows]).update(
+                attempts=F('attempts') + 1,
+                available_at=timezone.now() + timedelta(seconds=self.claim_timeout),
+            )
+        for row in rows:
+            row.attempts += 1
+        return rows
+
+    def process_batch(self):
+        """Claim, verify and settle one batch of due rows; returns the number claimed."""
+        rows = self.claim()
+        if not rows:
+            return 0
+        unverified = set(verify_batch([row.tx_ref for row in rows]))
+
+        done = [row.pk for row in rows if row.tx_ref not in unverified or row.attempts >= self.max_attempts]
+        PaymentVerification.objects.filter(pk__in=done).delete()
+        PaymentVerification.objects.filter(pk__in=[row.pk for row in rows if row.pk not in done]).update(
+            available_at=timezone.now() + timedelta(seconds=self.retry_delay),
+        )
+        return len(rows)
+
+    def drain(self):
+        processed = 0
+        while True:
+            claimed = self.process_batch()
+            if not claimed:
+                return processed
+            processed += claimed
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """The process-wide verification queue selected by PAYMENT_VERIFICATION_QUEUE."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            backend = getattr(settings, 'PAYMENT_VERIFICATION_QUEUE', 'inprocess')
+            batch_size = getattr(settings, 'PAYMENT_VERIFICATION_BATCH_SIZE', 100)
+            max_attempts = getattr(settings, 'PAYMENT_VERIFICATION_MAX_ATTEMPTS', 5)
+            if backend == 'database':
+                _queue = DatabaseVerificationQueue(batch_size=batch_size, max_attempts=max_attempts)
+            elif backend == 'inprocess':
+                _queue = InProcessVerificationQueue(
+                    workers=getattr(settings, 'PAYMENT_VERIFICATION_WORKERS', 2),
+                    batch_size=batch_size,
+                    max_attempts=max_attempts,
+                )
+            else:
+                raise ImproperlyConfigured(f'Unknown PAYMENT_VERIFICATION_QUEUE: {backend!r}')
+        return _queue
+
+
+@receiver(setting_changed)
+def reset_queue(setting, **kwargs):
+    global _queue
+    if setting.startswith('PAYMENT_VERIFICATION_'):
+        with _queue_lock:
+            _queue = None
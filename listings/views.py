@@ -1,21 +1,346 @@
-import requests
 from rest_framework import viewsets
-from .models import Listing, Booking, Payment
-from .serializers import ListingSerializer, BookingSerializer
+from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from .models import ArchivedBooking, Listing, Booking, Payment, Review
+from .serializers import (
+    ListingSerializer, BookingSerializer, ReviewSerializer,
+    AvailabilitySearchSerializer, ReviewSearchSerializer, ExportFilterSerializer,
+    ListingTextSearchSerializer, LocationAutocompleteSerializer,
+)
+from .pagination import FlexiblePagination, ReviewPagination
+from .filters import ListingFilter, StableOrderingFilter
+from .facets import listing_facets
+from .fastpath import FastPathMixin
+from .conditional import ConditionalGetMixin, latest
+from .routing import ReplicaReadMixin, read_database
+from . import archive, chapa, exports, reservations, verification
+from .search import get_index as get_search_index
+from .instrumentation import histograms as performance_histograms
+from .cache import (
+    BOOKING_LIST_VERSION_KEY, LIST_VERSION_KEY, CachedResponseMixin, cached_validators, get_version, listing_version_key,
+    stats as response_cache_stats,
+)
 from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 
 
+class SearchIndexUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The search index is still being built; retry shortly.'
+    default_code = 'search_index_unavailable'
+    wait = 1  # Sent as Retry-After.
 
-class ListingViewSet(viewsets.ModelViewSet):
+
+def parse_field_list(value):
+    return {part.strip() for part in value.split(',') if part.strip()} if value else set()
+
+
+class SparseFieldsMixin:
+    """
+    Read ``?fields=`` and ``?expand=`` on GET requests.
+
+    The selection is handed to the serializer (see DynamicFieldsMixin) and to
+    get_queryset, so only the requested columns and relations are loaded.
+    """
+    def get_field_selection(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return None, set()
+        fields = parse_field_list(request.query_params.get('fields')) or None
+        expand = parse_field_list(request.query_params.get('expand'))
+        return fields, expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_field_selection()
+        return context
+
+
+class ListingViewSet(ReplicaReadMixin, ConditionalGetMixin, CachedResponseMixin, FastPathMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
+    pagination_class = FlexiblePagination
+    filter_backends = [ListingFilter, StableOrderingFilter]
+    ordering_fields = ['created_at', 'pricepernight', 'avg_rating', 'review_count']
+    ordering = ['-created_at', '-pk']
+
+    def get_queryset(self):
+        fields, expand = self.get_field_selection()
+        return super().get_queryset().with_related(**ListingSerializer.loading_options(fields, expand))
+
+    def wants_facets(self):
+        # ?facets=true adds location, price and rating counts to the list.
+        return self.action == 'list' and self.request.query_params.get('facets') in ('1', 'true')
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.wants_facets():
+            response.data['facets'] = listing_facets(ListingFilter.parse(self.request))
+        return response
+
+    def list_validators(self):
+        return cached_validators(LIST_VERSION_KEY, self.request, self.query_list_validators)
+
+    def query_list_validators(self):
+        queryset = Listing.objects.all()
+        # Facet counts cover every listing, not only the filtered ones.
+        if not self.wants_facets():
+            queryset = self.filter_queryset(queryset)
+        stats = queryset.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        return stats['last_modified'], stats['count']
+
+    def object_validators(self, pk):
+        def query():
+            updated_at = Listing.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+            return None if updated_at is None else (updated_at,)
+        return cached_validators(listing_version_key(pk), self.request, query)
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """Listings free for the whole checkin-checkout range, optionally filtered by location and price."""
+        params = AvailabilitySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        search = params.validated_data
+
+        # Location and price are applied by ListingFilter.
+        queryset = self.filter_queryset(self.get_queryset()).available(search['checkin'], search['checkout'])
+        return self.list_response(queryset)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Locations with a word starting with ``?q=``, served from the in-memory search index."""
+        params = LocationAutocompleteSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        return Response({'results': self.search_index().autocomplete(query['q'], query['limit'])})
 
-class BookingViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Listings whose name and description contain every word of ``?q=``, best match first."""
+        params = ListingTextSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        index = self.search_index()
+        ranked = index.search(query['q'], query['limit'])
+        queryset = self.get_queryset().filter(pk__in=[listing_id for listing_id, _ in ranked])
+        mapper = self.get_row_mapper()
+        if mapper is not None:
+            listings = {row['listing_id']: row for row in queryset.prefetch_related(None).values(*mapper.columns)}
+        else:
+            listings = {listing.pk: listing for listing in queryset}
+        for listing_id, _ in ranked:
+            if listing_id not in listings:
+                # Deleted by another process since the index last synced.
+                index.remove(listing_id)
+        ranked = [(listing_id, score) for listing_id, score in ranked if listing_id in listings]
+
+        rows = [listings[listing_id] for listing_id, _ in ranked]
+        results = mapper.map_rows(rows) if mapper is not None else self.get_serializer(rows, many=True).data
+        for data, (_, score) in zip(results, ranked):
+            data['score'] = score
+        return Response({'count': len(results), 'results': results})
+
+    def search_index(self):
+        index = get_search_index()
+        if index is None:
+            raise SearchIndexUnavailable()
+        return index
+
+    @action(detail=True, methods=['get'])
+    def reviews(self, request, pk=None):
+        """A listing's reviews, newest (?sort=newest) or highest rated (?sort=rating) first."""
+        return self.cached_response(listing_version_key(pk), self.list_reviews, request, pk=pk)
+
+    def list_reviews(self, request, pk=None):
+        params = ReviewSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        search = params.validated_data
+
+        listing = get_object_or_404(Listing.objects.only('pk'), pk=pk)
+        queryset = Review.objects.filter(property=listing).select_related('user')
+        if 'rating' in search:
+            queryset = queryset.filter(rating=search['rating'])
+        if 'min_rating' in search:
+            queryset = queryset.filter(rating__gte=search['min_rating'])
+
+        paginator = ReviewPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ReviewSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """Hit/miss counters of this process's listing response cache."""
+        return Response(response_cache_stats.snapshot())
+
+class BookingViewSet(ReplicaReadMixin, ConditionalGetMixin, FastPathMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
+    pagination_class = FlexiblePagination
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get_queryset(self):
+        fields, expand = self.get_field_selection()
+        return super().get_queryset().with_related(
+            **BookingSerializer.loading_options(fields, expand)
+        ).order_by('-created_at')
+
+    def include_archived(self):
+        # ?include_archived=true adds archived bookings (listings.archive) to list and retrieve.
+        return (
+            self.action in ('list', 'retrieve')
+            and self.request.query_params.get('include_archived') in ('1', 'true')
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+        if isinstance(self.paginator.get_paginator(request), self.paginator.cursor_class):
+            raise ValidationError({'include_archived': 'Archived bookings are paged by page number only.'})
+        return self.conditional_response(self.list_validators(), self.list_with_archive, request, *args, **kwargs)
+
+    def list_with_archive(self, request, *args, **kwargs):
+        page = self.paginate_queryset(archive.booking_keys())
+        fields, expand = self.get_field_selection()
+        rows = archive.load_bookings(page, **BookingSerializer.loading_options(fields, expand))
+        data = self.get_serializer([booking for booking, _ in rows], many=True).data
+        for item, (_, archived) in zip(data, rows):
+            item['archived'] = archived
+        return self.get_paginated_response(data)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            if not self.include_archived():
+                raise
+        fields, expand = self.get_field_selection()
+        queryset = ArchivedBooking.objects.with_related(**BookingSerializer.loading_options(fields, expand))
+        return get_object_or_404(queryset, pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+
+    def list_validators(self):
+        def query():
+            # Indexed MAX()es only: deletions and archiving show up through
+            # the version, which every booking and listing write bumps.
+            # Every booking embeds its listing.
+            validators = [
+                latest(
+                    Booking.objects.aggregate(last_modified=Max('updated_at'))['last_modified'],
+                    Listing.objects.aggregate(last_modified=Max('updated_at'))['last_modified'],
+                ),
+                get_version(BOOKING_LIST_VERSION_KEY),
+            ]
+            if self.include_archived():
+                archived = ArchivedBooking.objects.aggregate(last_modified=Max('archived_at'))
+                validators[0] = latest(validators[0], archived['last_modified'])
+            return tuple(validators)
+        return cached_validators(BOOKING_LIST_VERSION_KEY, self.request, query)
+
+    def object_validators(self, pk):
+        row = Booking.objects.filter(pk=pk).values_list('updated_at', 'property__updated_at').first()
+        if row is None and self.include_archived():
+            row = ArchivedBooking.objects.filter(pk=pk).values_list('archived_at', 'property__updated_at').first()
+        return None if row is None else (latest(*row),)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        booking = reservations.reserve(
+            data['property'].pk, self.request.user, data['checkin'], data['checkout'],
+            status=data.get('status', 'pending'), total_price=data['total_price'],
+        )
+        # The listing was loaded with its host during validation; reuse it for the response.
+        booking.property = data['property']
+        serializer.instance = booking
+
+    def perform_update(self, serializer):
+        booking = serializer.instance
+        data = {
+            'property': booking.property, 'checkin': booking.checkin,
+            'checkout': booking.checkout, 'status': booking.status,
+            **serializer.validated_data,
+        }
+        reservations.hold(
+            data['property'].pk, data['checkin'], data['checkout'], data['status'],
+            lambda pricepernight: serializer.save(), exclude=booking.pk,
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def batch(self, request):
+        """
+        Create up to BOOKING_BATCH_MAX_SIZE bookings from a list of
+        ``{property, checkin, checkout[, user, total_price, status]}`` items,
+        reporting success or errors per item.
+        """
+        items = request.data
+        max_size = getattr(settings, 'BOOKING_BATCH_MAX_SIZE', 1000)
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of bookings'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > max_size:
+            return Response(
+                {'error': f'A batch may contain at most {max_size} bookings'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = reservations.create_bookings(items, request.user)
+        created = sum(result['status'] == 'created' for result in results)
+        return Response({'created': created, 'failed': len(results) - created, 'results': results})
+
+
+class ExportView(APIView):
+    """
+    Stream every matching row of bookings, listings or payments as NDJSON
+    (default) or CSV, e.g. ``/api/exports/bookings/?output=csv&since=2025-01-01``.
+    Rows are read from a replica when one is healthy (listings.routing).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, resource):
+        if resource not in exports.EXPORTS:
+            raise Http404
+        params = ExportFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = dict(params.validated_data)
+        output = options.pop('output')
+
+        queryset = exports.export_queryset(resource, **options).using(read_database(request))
+        rows = exports.iter_rows(resource, queryset)
+        response = StreamingHttpResponse(
+            exports.render(resource, rows, output),
+            content_type=exports.FORMATS[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{resource}.{output}"'
+        return response
+
+
+class PerformanceMetricsView(APIView):
+    """p50/p95/p99 request, DB and serializer times per endpoint, for this process."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.PERFORMANCE_INSTRUMENTATION,
+            'endpoints': performance_histograms.snapshot(),
+        })
+
+
+def payment_request(user, booking):
+    """The Chapa initialize payload for a booking's payment."""
+    callback_url = "http://127.0.0.1:8000/api/payments/verify/"
+    return {
+        "amount": str(booking.total_price),
+        "currency": "ETB",
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "tx_ref": f"{user.pk}-{booking.pk}",
+        "callback_url": callback_url,
+    }
 
 
 class InitiatePaymentView(APIView):
@@ -23,29 +348,15 @@ class InitiatePaymentView(APIView):
 
     def post(self, request, booking_id):
         try:
-            booking = Booking.objects.get(id=booking_id, user=request.user)
+            booking = Booking.objects.get(booking_id=booking_id, user=request.user)
             amount = booking.total_price  # Adjust based on your Booking model
-            callback_url = "http://127.0.0.1:8000/api/payments/verify/"
-
-            headers = {
-                "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}",
-                "Content-Type": "application/json",
-            }
-            data = {
-                "amount": str(amount),
-                "currency": "ETB",
-                "email": request.user.email,
-                "first_name": request.user.first_name,
-                "last_name": request.user.last_name,
-                "tx_ref": f"{request.user.id}-{booking.id}",
-                "callback_url": callback_url,
-            }
-            response = requests.post(
-                "https://api.chapa.co/v1/transaction/initialize",
-                json=data,
-                headers=headers,
-            )
-            result = response.json()
+            data = payment_request(request.user, booking)
+            try:
+                result = chapa.get_client().initialize(data)
+            except chapa.CircuitOpenError:
+                return Response({"error": "Payment gateway unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            except chapa.ChapaError:
+                return Response({"error": "Payment gateway error"}, status=status.HTTP_502_BAD_GATEWAY)
             if result["status"] == "success":
                 checkout_url = result["data"]["checkout_url"]
                 transaction_id = result["data"]["tx_ref"]
@@ -70,28 +381,6 @@ class VerifyPaymentView(APIView):
         if not tx_ref:
             return Response({"error": "Missing tx_ref"}, status=status.HTTP_400_BAD_REQUEST)
 
-        headers = {
-            "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}",
-        }
-        response = requests.get(
-            f"https://api.chapa.co/v1/transaction/verify/{tx_ref}",
-            headers=headers,
-        )
-        result = response.json()
-
-        if result["status"] == "success" and result["data"]["status"] == "success":
-            try:
-                payment = Payment.objects.get(transaction_id=tx_ref)
-                payment.status = "Completed"
-                payment.save()
-                return Response({"message": "Payment verified successfully"}, status=status.HTTP_200_OK)
-            except Payment.DoesNotExist:
-                return Response({"error": "Payment record not found"}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            try:
-                payment = Payment.objects.get(transaction_id=tx_ref)
-                payment.status = "Failed"
-                payment.save()
-            except Payment.DoesNotExist:
-                pass
-            return Response({"error": "Payment verification failed"}, status=status.HTTP_400_BAD_REQUEST)
+        # Verified against Chapa by the verification workers, not in this request.
+        verification.get_queue().enqueue(tx_ref)
+        return Response({"message": "Payment verification queued"}, status=status.HTTP_202_ACCEPTED)